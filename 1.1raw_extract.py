@@ -1,23 +1,87 @@
 # pdf_extractor.py
+import hashlib
+import os
+import sys
 import fitz  # PyMuPDF
 from typing import Optional
+from extract_common import (MAX_EXTRACT_WORKERS, atomic_output, expand_pdf_paths, iter_page_ranges, run_many,
+                            sibling_output_paths)
 
-def extract_text_from_pdf(pdf_filepath: str) -> Optional[str]:
+EXTRACT_CACHE_DIR = ".cache" # Extracted text, keyed by the PDF's content hash (see _pdf_cache_path)
+# Join words hyphenated across line breaks. Off by default: it also drops the
+# hyphen from office symbols like "AF/A4-" when they wrap at a line end.
+DEHYPHENATE_TEXT = False
+# TEXTFLAGS_TEXT are the flags get_text("text") uses (whitespace and ligatures preserved)
+TEXT_FLAGS = fitz.TEXTFLAGS_TEXT | (fitz.TEXT_DEHYPHENATE if DEHYPHENATE_TEXT else 0)
+
+def extract_page_range(pdf_filepath: str, start: int, end: int) -> bytes:
+    """
+    Extracts the text of pages [start, end) from a PDF file as UTF-8 bytes.
+    Runs in a worker process, so it opens its own Document (they can't be pickled).
+    Pages are written into one growing bytearray instead of a list of page strings
+    that would later be joined into a second full copy.
+    """
+    # Opening by path (not from a bytes stream) lets MuPDF read the file on demand
+    # instead of copying all of it into memory; filetype skips content sniffing.
+    doc = fitz.open(pdf_filepath, filetype="pdf")
+    try:
+        buf = bytearray()
+        for i, page in enumerate(doc.pages(start, end)):
+            if i:
+                buf += b"\n"
+            # Build the TextPage once and extract from it directly
+            text_page = page.get_textpage(flags=TEXT_FLAGS)
+            buf += text_page.extractText().encode("utf-8")
+            text_page = None  # Release MuPDF's page structure before the next page
+        return bytes(buf)
+    finally:
+        doc.close()
+
+def _pdf_cache_path(pdf_filepath: str) -> str:
+    """
+    Cache file for a PDF, named by the SHA-256 of its bytes, the text flags used and
+    the PyMuPDF/MuPDF versions, since an upgrade can change the extracted text.
+    """
+    digest = hashlib.sha256()
+    with open(pdf_filepath, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(f"flags={TEXT_FLAGS};pymupdf={fitz.VersionBind};mupdf={fitz.VersionFitz}".encode("ascii"))
+    return os.path.join(EXTRACT_CACHE_DIR, f"{digest.hexdigest()}.txt")
+
+def _extract_pdf_bytes(pdf_filepath: str, max_workers: int = MAX_EXTRACT_WORKERS) -> bytes:
+    return b"\n".join(iter_page_ranges(pdf_filepath, extract_page_range, max_workers, pages_per_task=None))
+
+def extract_text_from_pdf(pdf_filepath: str, max_workers: int = MAX_EXTRACT_WORKERS) -> Optional[str]:
     """
     Extracts all text content from a PDF file.
+    Pages are split into one contiguous batch per worker and extracted in parallel
+    processes, since MuPDF's parsing is CPU-bound and holds the GIL.
+    The result is cached in EXTRACT_CACHE_DIR by content hash, so re-running on an
+    unchanged PDF skips extraction entirely.
     Args:
         pdf_filepath (str): The path to the PDF file.
+        max_workers (int): The most worker processes to use for this file.
     Returns:
         str: The extracted text content from all pages, or None if an error occurs.
     """
     try:
-        doc = fitz.open(pdf_filepath)
-        full_text = []
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            full_text.append(page.get_text("text"))  # "text" for plain text extraction
-        doc.close()
-        return "\n".join(full_text)
+        cache_path = _pdf_cache_path(pdf_filepath)
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                print(f"Using cached extraction: {cache_path}")
+                return cache_file.read().decode("utf-8")
+        except FileNotFoundError:
+            pass
+
+        text_bytes = _extract_pdf_bytes(pdf_filepath, max_workers)
+        try:
+            os.makedirs(EXTRACT_CACHE_DIR, exist_ok=True)
+            with atomic_output(cache_path, 'wb') as cache_file:
+                cache_file.write(text_bytes)
+        except OSError as e:
+            print(f"Warning: could not write extraction cache: {e}")
+        return text_bytes.decode("utf-8")
     except FileNotFoundError:
         print(f"Error: PDF file not found at {pdf_filepath}")
         return None
@@ -33,21 +97,37 @@ def save_text_to_file(text_content: str, output_filepath: str) -> None:
         output_filepath (str): The path to the output text file.
     """
     try:
-        with open(output_filepath, 'w', encoding='utf-8') as file:
-            file.write(text_content)
+        # Written atomically so an interrupted run never leaves a truncated file behind
+        with atomic_output(output_filepath, 'wb') as file:
+            file.write(text_content.encode('utf-8'))
         print(f"Successfully saved extracted text to: {output_filepath}")
     except Exception as e:
         print(f"Error saving text to file: {e}")
 
+def run_one(input_pdf_path: str, output_raw_text_path: str, max_workers: int = MAX_EXTRACT_WORKERS) -> bool:
+    """Extracts one PDF to a text file. Returns True on success."""
+    print(f"Attempting to extract text from: {input_pdf_path}")
+    extracted_pdf_text = extract_text_from_pdf(input_pdf_path, max_workers)
+
+    if extracted_pdf_text:
+        print(f"Successfully extracted text from {input_pdf_path}. Total characters: {len(extracted_pdf_text)}")
+        save_text_to_file(extracted_pdf_text, output_raw_text_path)
+        return True
+    print(f"Failed to extract text from {input_pdf_path}.")
+    return False
+
+# Run with no arguments to extract input_pdf_path below, or pass PDF paths or glob
+# patterns (e.g. python 1.1raw_extract.py "pdfs/*.pdf"). Several PDFs are extracted in
+# parallel, one per process, each to "<pdf name>_raw_extracted_text.txt" next to it.
 if __name__ == "__main__":
     input_pdf_path = "Copy of dafi36-2110-1.pdf"  # <---  INPUT
     output_raw_text_path = "raw_extracted_text.txt"
 
-    print(f"Attempting to extract text from: {input_pdf_path}")
-    extracted_pdf_text = extract_text_from_pdf(input_pdf_path)
+    pdf_paths = expand_pdf_paths(sys.argv[1:], input_pdf_path)
 
-    if extracted_pdf_text:
-        print(f"Successfully extracted text from PDF. Total characters: {len(extracted_pdf_text)}")
-        save_text_to_file(extracted_pdf_text, output_raw_text_path)
+    if len(pdf_paths) == 1:
+        run_one(pdf_paths[0], output_raw_text_path)
+    elif pdf_paths:
+        run_many(run_one, pdf_paths, sibling_output_paths(pdf_paths, output_raw_text_path))
     else:
-        print(f"Failed to extract text from {input_pdf_path}.")
\ No newline at end of file
+        print(f"No PDF files matched: {' '.join(sys.argv[1:])}")
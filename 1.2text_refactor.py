@@ -1,12 +1,26 @@
 # text_reformatter.py
-import re
-from typing import Optional
+import mmap
+from typing import Optional, Union
 
-def read_text_from_file(filepath: str) -> Optional[str]:
-    """Reads content from a text file."""
+from pipeline import iter_header_blocks
+
+# Folds every line break inside a section block to a space in one pass
+NEWLINE_TABLE = bytes.maketrans(b"\n\r\f", b"   ")
+
+def read_text_from_file(filepath: str) -> Optional[Union[mmap.mmap, bytes]]:
+    """
+    Memory-maps a text file read-only instead of reading it into a str.
+    The mapping behaves like a bytes object, so the byte regexes below scan it
+    directly and pages are faulted in lazily as the scan walks the file.
+    """
     try:
-        with open(filepath, 'r', encoding='utf-8') as file:
-            content = file.read()
+        with open(filepath, 'rb') as file:
+            try:
+                content = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # mmap refuses empty files
+                return b""
+        if hasattr(content, 'madvise'): # Not available on Windows
+            content.madvise(mmap.MADV_SEQUENTIAL)
         return content
     except FileNotFoundError:
         print(f"Error: File not found at {filepath}")
@@ -15,50 +29,40 @@ def read_text_from_file(filepath: str) -> Optional[str]:
         print(f"Error reading file: {e}")
         return None
 
-def reformat_raw_text_to_single_line_sections(raw_text: str) -> str:
+def reformat_raw_text_to_single_line_sections(raw_text: Union[str, bytes, mmap.mmap], spans: Optional[dict] = None) -> str:
     
     if not raw_text:
         return ""
+    if isinstance(raw_text, str):
+        raw_text = raw_text.encode('utf-8')
 
-    # This regex identifies the start of each section line (header).
-    # It should match the numerical patterns you're interested in (e.g., 1.2.3. or A1.1.1.).
-    # This pattern looks for at least two numerical components (e.g., X.Y).
-    section_header_pattern = re.compile(
-        r"^(?:A\d{1,2}(?:\.\d{1,2}){1,3}\.?|\d{1,2}(?:\.\d{1,2}){1,3}\.?)\s*.*$",
-        re.MULTILINE
-    )
-    
+    # Section header lines (e.g., 1.2.3. or A1.1.1., at least two numerical components)
+    # come from the shared single-sweep scanner in pipeline.py as (start, end) spans.
+    # Pass `spans` from scan_header_spans() to reuse a scan made elsewhere.
     reformatted_output_lines = []
-    matches = list(section_header_pattern.finditer(raw_text))
-    
-    if not matches:
+    found_sections = False
+
+    # Each block runs from a section's header line to the start of the next section's
+    # header line, and includes the header and all content lines of the section.
+    # Blocks are sliced one at a time as the spans stream in.
+    for (block_start, _), block_end in iter_header_blocks(raw_text, "reformat", spans):
+        if not found_sections:
+            found_sections = True
+            # Handle text before the first match (if any)
+            if block_start > 0:
+                pre_section_text = raw_text[0:block_start]
+                cleaned_pre_section_text = pre_section_text.translate(NEWLINE_TABLE).decode('utf-8').strip()
+                if cleaned_pre_section_text:
+                     reformatted_output_lines.append(cleaned_pre_section_text)
+
+        section_line = raw_text[block_start:block_end].translate(NEWLINE_TABLE).decode('utf-8').strip() # Fold line breaks within block
+        if section_line:
+            reformatted_output_lines.append(section_line)
+
+    if not found_sections:
         # If no specific section markers are found, make the entire text a single line.
         print("No section markers found for reformatting; entire text will be one line.")
-        return raw_text.replace('\n', ' ').strip()
-
-    last_block_end = 0
-    # Handle text before the first match (if any)
-    if matches[0].start() > 0:
-        pre_section_text = raw_text[0:matches[0].start()]
-        cleaned_pre_section_text = pre_section_text.replace('\n', ' ').strip()
-        if cleaned_pre_section_text:
-             reformatted_output_lines.append(cleaned_pre_section_text)
-    
-    for i, match in enumerate(matches):
-        current_block_start = match.start() # Start of the current section's header line
-        
-        current_block_end = len(raw_text)
-        if i + 1 < len(matches):
-            current_block_end = matches[i+1].start() # End is start of next section's header line
-            
-
-        # This block includes the header and all content lines of the current section
-        # Extract the text for the current section
-        section_text_block = raw_text[current_block_start:current_block_end]
-        single_line_section = section_text_block.replace('\n', ' ').strip() # Replace newlines within block
-        
-        if single_line_section:
-            reformatted_output_lines.append(single_line_section)
+        return raw_text[:].translate(NEWLINE_TABLE).decode('utf-8').strip()
             
     return "\n".join(reformatted_output_lines) # Each "section" is now a single line, separated by newlines.
 
@@ -87,6 +91,8 @@ if __name__ == "__main__":
         print("Reformatting text...")
         reformatted_content = reformat_raw_text_to_single_line_sections(raw_text)
         save_text_to_file(reformatted_content, output_reformatted_path)
+        if isinstance(raw_text, mmap.mmap):
+            raw_text.close()
         # print(f"\nSample of reformatted text:\n{reformatted_content[:500]}...")
     else:
         print(f"Failed to read raw text from {input_raw_text_path}.")
\ No newline at end of file
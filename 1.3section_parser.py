@@ -1,29 +1,86 @@
 # section_parser.py
+import csv
+import itertools
+import mmap
 import re
-import pandas as pd
-from typing import List, Dict, Optional, Any
+import sys
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
-# --- Pydantic Model  ---
+from pipeline import iter_header_blocks, iter_header_spans, iter_lines_containing, scan_header_spans
+
+# Page markers left by earlier extraction runs, e.g. "--- PAGE 12 ---"
+PAGE_MARKER_PATTERN = re.compile(rb"--- PAGE \d+ ---\n?")
+
+@dataclass(slots=True, frozen=True)
+class SectionData:
+    section_number: str
+    section_title: str
+    content: str
+    level: int
+    parent_number: Optional[str] = None
+    ancestry: Tuple[str, ...] = ()
+
+# --- Pydantic Validation (Optional) ---
+# Only used by --validate; one adapter is built for the dataclass and reused.
 try:
-    from pydantic import BaseModel
-    class SectionData(BaseModel):
-        section_number: str
-        section_title: str
-        content: str
-        level: int
-        parent_number: Optional[str] = None
-        ancestry: List[str] = []
+    from pydantic import TypeAdapter
+    SECTION_ADAPTER = TypeAdapter(SectionData)
     USE_PYDANTIC = True
 except ImportError:
     
     USE_PYDANTIC = False 
-# --- End Pydantic Model ---
+# --- End Pydantic Validation ---
+
+# --- Header Tokenizer Extension (Optional) ---
+# Built from _headerparse.pyx with `python setup.py build_ext --inplace`.
+try:
+    from _headerparse import parse_headers
+    USE_HEADERPARSE = True
+except ImportError:
+    USE_HEADERPARSE = False
+# --- End Header Tokenizer Extension ---
+
+# --- Numba (Optional) ---
+# Used to find the dot positions of every section number in one compiled loop.
+try:
+    import numpy as np
+    from numba import njit
+
+    @njit(cache=True)
+    def _section_dot_offsets(buf, starts, ends, max_parts):
+        # For each section number buf[starts[i]:ends[i]], record its level and the
+        # offset of every '.' relative to the start of the number (-1 padded).
+        n = starts.shape[0]
+        levels = np.empty(n, np.int16)
+        dots = np.full((n, max_parts), -1, np.int32)
+        for i in range(n):
+            level = 1
+            for j in range(starts[i], ends[i]):
+                if buf[j] == 46: # '.'
+                    dots[i, level - 1] = j - starts[i]
+                    level += 1
+            levels[i] = level
+        return levels, dots
+    USE_NUMBA = True
+except ImportError:
+    USE_NUMBA = False
+# --- End Numba ---
 
-def read_text_from_file(filepath: str) -> Optional[str]:
-    """Reads content from a text file."""
+def read_text_from_file(filepath: str) -> Optional[Union[mmap.mmap, bytes]]:
+    """
+    Memory-maps a text file read-only instead of reading it into a str.
+    The mapping behaves like a bytes object, so the byte regexes below scan it
+    directly and pages are faulted in lazily as the scan walks the file.
+    """
     try:
-        with open(filepath, 'r', encoding='utf-8') as file:
-            content = file.read()
+        with open(filepath, 'rb') as file:
+            try:
+                content = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError: # mmap refuses empty files
+                return b""
+        if hasattr(content, 'madvise'): # Not available on Windows
+            content.madvise(mmap.MADV_SEQUENTIAL)
         return content
     except FileNotFoundError:
         print(f"Error: File not found at {filepath}")
@@ -36,15 +93,18 @@ def get_hierarchy_info(section_number_str: str) -> Dict[str, Any]:
     
     #Derives level, parent_number, and ancestry from a section number string.
     
-    parts = section_number_str.split('.')
-    level = len(parts)
+    # Count and slice at the dots instead of split/join, so no parts list is built.
+    # Ancestors are interned so every section under "1.2" shares one "1.2" string.
+    level = section_number_str.count('.') + 1
     parent_number = None
     ancestry = []
 
-    if level > 1:
-        parent_number = ".".join(parts[:-1])
-        for i in range(1, level): # Create all ancestor strings
-            ancestry.append(".".join(parts[:i]))
+    dot = section_number_str.find('.')
+    while dot != -1: # Create all ancestor strings
+        ancestry.append(sys.intern(section_number_str[:dot]))
+        dot = section_number_str.find('.', dot + 1)
+    if ancestry:
+        parent_number = ancestry[-1]
             
     return {
         "level": level,
@@ -52,127 +112,170 @@ def get_hierarchy_info(section_number_str: str) -> Dict[str, Any]:
         "ancestry": ancestry
     }
 
-def extract_sections_with_hierarchy(full_content_text: str) -> List[Any]: # Returns List of Pydantic objects or Dicts
+def get_hierarchy_info_batch(section_numbers: List[str]) -> List[Dict[str, Any]]:
+    """
+    Same as get_hierarchy_info() for a whole list of section numbers. With numba
+    installed, levels and dot positions for all numbers come from one compiled pass
+    and each ancestor is a slice up to one of those dots; otherwise it falls back
+    to calling get_hierarchy_info() per number.
+    """
+    if not USE_NUMBA or not section_numbers:
+        return [get_hierarchy_info(number) for number in section_numbers]
+
+    # Section numbers only contain ASCII digits, 'A' and dots, so byte offsets are
+    # character offsets.
+    buf = np.frombuffer("".join(section_numbers).encode('ascii'), dtype=np.uint8)
+    lengths = np.fromiter((len(number) for number in section_numbers), dtype=np.int64, count=len(section_numbers))
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    max_parts = max(number.count('.') for number in section_numbers) + 1
+    levels, dots = _section_dot_offsets(buf, starts, ends, max_parts)
+
+    hierarchy_infos = []
+    for number, level, dot_row in zip(section_numbers, levels.tolist(), dots.tolist()):
+        ancestry = [sys.intern(number[:dot]) for dot in dot_row[:level - 1]]
+        hierarchy_infos.append({
+            "level": level,
+            "parent_number": ancestry[-1] if ancestry else None,
+            "ancestry": ancestry
+        })
+    return hierarchy_infos
+
+def iter_sections_with_hierarchy(full_content_text: Union[str, bytes, mmap.mmap], spans: Optional[dict] = None) -> Iterator[SectionData]:
     """
     Extracts ALL sections identified by numerical or A-prefixed numerical section numbers
     (e.g., 1., 1.2, A1.1.1), including their title, content, and hierarchical information.
     This parser expects content to potentially span multiple lines after the header line.
+    The scan runs on bytes; only the captured number/title/content slices are decoded.
+    Pass `spans` from pipeline.scan_header_spans() to reuse a header scan made elsewhere.
+    Sections are yielded one at a time as SectionData records.
     """
-    sections_found = []
     if not full_content_text:
-        return sections_found
+        return
+    if isinstance(full_content_text, str):
+        full_content_text = full_content_text.encode('utf-8')
 
-    cleaned_text = re.sub(r"--- PAGE \d+ ---\n?", "", full_content_text)
+    # Only pay for a full copy when page markers are actually present
+    if b"--- PAGE " in full_content_text:
+        cleaned_text = PAGE_MARKER_PATTERN.sub(b"", full_content_text)
+        spans = None # Offsets of a scan of the original text no longer line up with the cleaned text
+    else:
+        cleaned_text = full_content_text
     # cleaned_text = re.sub(r"\\s?", "", cleaned_text) # If source markers are problematic
 
-    # Refined Regex:
-    # Looks for A?X. (e.g., 1., A1.) followed by optional .Y.Z.W patterns
-    # This pattern requires the first numerical component to be followed by a dot.
-    section_pattern = re.compile(
-        r"^(?P<number>(?:A?\d{1,2}\.(?:\d{1,2}\.?)*))\s*(?P<title>.*?)$",
-        re.MULTILINE
-    )
-    # Breakdown of number part: (?:A?\d{1,2}\.(?:\d{1,2}\.?)*)
-    # A?             - Optional 'A'
-    # \d{1,2}\.      - One or two digits FOLLOWED BY A LITERAL DOT (e.g., "1.", "12.", "A1.").
-    # (?:\d{1,2}\.?)* - Optionally, more groups of (one/two digits and an optional trailing dot for that subgroup).
-    #                  This allows matching "1.1", "1.1.2", "1.1.2." etc.
-
-    matches = list(section_pattern.finditer(cleaned_text))
-
-    if not matches:
+    # Section headers come from the shared single-sweep scanner in pipeline.py.
+    # Number part: A?X. (e.g., 1., A1.) followed by optional .Y.Z.W patterns; the first
+    # numerical component must be followed by a dot. Each span is
+    # (start, end, number_start, number_end, title_start, title_end).
+    if spans is None:
+        if USE_HEADERPARSE:
+            spans = {"section": parse_headers(cleaned_text)}
+        else:
+            spans = scan_header_spans(cleaned_text)
+
+    # Strip trailing dots from the captured section numbers for cleaner output; they
+    # are interned so they are the same objects as the ancestors that refer to them
+    section_numbers = [
+        sys.intern(cleaned_text[number_start:number_end].decode('utf-8').strip().rstrip('.'))
+        for _, _, number_start, number_end, _, _ in iter_header_spans(cleaned_text, "section", spans)
+    ]
+
+    if not section_numbers:
         print("No section headers found with the defined pattern (e.g., 1., 2.1., A1.1).")
-        return []
+        return
 
-    for i, current_match in enumerate(matches):
-        # Strip trailing dots from the captured section number for cleaner output
-        section_number_raw = current_match.group("number").strip().rstrip('.')
-        section_title_raw = current_match.group("title").strip() # Title is the rest of the header line
-        
-        hierarchy_info = get_hierarchy_info(section_number_raw)
+    hierarchy_infos = get_hierarchy_info_batch(section_numbers)
+
+    # Content runs from the end of each header line to the start of the next header;
+    # blocks are sliced one at a time as the spans stream in.
+    for i, (current_match, content_end_index) in enumerate(iter_header_blocks(cleaned_text, "section", spans)):
+        _, content_start_index, _, _, title_start, title_end = current_match
+        section_number_raw = section_numbers[i]
+        section_title_raw = cleaned_text[title_start:title_end].decode('utf-8').strip() # Title is the rest of the header line
         
-        content_start_index = current_match.end() # Content starts *after* the header line
-        content_end_index = len(cleaned_text)
-        if i + 1 < len(matches):
-            content_end_index = matches[i+1].start() # Content ends at start of *next* header
+        hierarchy_info = hierarchy_infos[i]
         
-        content_raw = cleaned_text[content_start_index:content_end_index].strip()
-
-        current_section_data = {
-            "section_number": section_number_raw,
-            "section_title": section_title_raw,
-            "content": content_raw,
-            "level": hierarchy_info["level"],
-            "parent_number": hierarchy_info["parent_number"],
-            "ancestry": hierarchy_info["ancestry"]
-        }
-
-        if USE_PYDANTIC:
-            try:
-                sections_found.append(SectionData(**current_section_data))
-            except Exception as e: # Pydantic ValidationError
-                 print(f"Pydantic validation error for section '{section_number_raw}': {e} - storing as dict.")
-                 sections_found.append(current_section_data) # Fallback to dict
-        else:
-            sections_found.append(current_section_data)
-            
-    return sections_found
+        content_raw = cleaned_text[content_start_index:content_end_index].decode('utf-8').strip()
+
+        yield SectionData(
+            section_number=section_number_raw,
+            section_title=section_title_raw,
+            content=content_raw,
+            level=hierarchy_info["level"],
+            parent_number=hierarchy_info["parent_number"],
+            ancestry=tuple(hierarchy_info["ancestry"])
+        )
+
+def extract_sections_with_hierarchy(full_content_text: Union[str, bytes, mmap.mmap], spans: Optional[dict] = None) -> List[SectionData]:
+    """Collects iter_sections_with_hierarchy() into a list."""
+    return list(iter_sections_with_hierarchy(full_content_text, spans))
 
 # Main execution block to read a text file, extract sections, and save to CSV
 # This is designed to process all sections found by the regex in the input text file.
+# Rows are written to the CSV as each section is parsed; pass --validate to check
+# every section against the SectionData schema with Pydantic first, and --diag to
+# also list the lines containing '/' (what 1.4.1test.py reports) from the same mapping.
 if __name__ == "__main__":
     # This script will now process ALL sections found by the regex
     input_text_path = "reformatted_single_line_sections.txt"  # <--- INPUT: Text file 
     output_csv_path = "all_sections_with_hierarchy.csv" # Output CSV for all sections
+    validate_sections = "--validate" in sys.argv[1:]
+    run_diagnostics = "--diag" in sys.argv[1:]
+    column_order = ["section_number", "level", "parent_number", "ancestry", "section_title", "content"]
 
     print(f"Attempting to read and parse all sections from: {input_text_path}")
     document_text = read_text_from_file(input_text_path)
 
-    if document_text:
-        all_extracted_data = extract_sections_with_hierarchy(document_text)
-
-        if all_extracted_data:
-            print(f"\nExtracted {len(all_extracted_data)} sections with hierarchy:\n")
-            # Example: Print info for the first few sections
-            for section_info_item in all_extracted_data[:5]: # Print first 5 as a sample
-                num = section_info_item.section_number if USE_PYDANTIC else section_info_item['section_number']
-                title = section_info_item.section_title if USE_PYDANTIC else section_info_item['section_title']
-                lvl = section_info_item.level if USE_PYDANTIC else section_info_item['level']
-                parent = section_info_item.parent_number if USE_PYDANTIC else section_info_item['parent_number']
-                
-                print(f"  Number: {num}, Level: {lvl}, Parent: {parent}")
-                print(f"  Title: {title[:70]}...") # Truncate title for display
-                print("-" * 40)
-            
-            # Saving all extracted sections to a CSV file
-            if USE_PYDANTIC:
-                # Filter out any non-Pydantic objects if a mix occurred due to validation errors
-                pydantic_objects = [s for s in all_extracted_data if isinstance(s, SectionData)]
-                data_for_df = [section.model_dump() for section in pydantic_objects]
-                if len(data_for_df) < len(all_extracted_data): # If there were fallbacks to dict
-                    print("Warning: Some sections had Pydantic validation errors and were processed as dictionaries.")
-                    data_for_df = [] # Rebuild ensuring all are dicts
-                    for item in all_extracted_data:
-                        if isinstance(item, SectionData): data_for_df.append(item.model_dump())
-                        else: data_for_df.append(item)
-            else:
-                data_for_df = all_extracted_data
-            
-            if data_for_df:
+    try:
+        if document_text and run_diagnostics:
+            print("--- Searching for lines with '/' ---")
+            found_line = False
+            for line_number, line_start, line_end in iter_lines_containing(document_text, b"/"):
+                print(f"Line {line_number}: {document_text[line_start:line_end].decode('utf-8').strip()}")
+                found_line = True
+            if not found_line:
+                print("No lines containing '/' were found in the file.")
+            print("--- End of search ---")
+
+        if document_text:
+            sections = iter_sections_with_hierarchy(document_text)
+            first_section = next(sections, None)
+
+            if first_section is not None:
+                if validate_sections and not USE_PYDANTIC:
+                    print("Warning: --validate needs pydantic (pip install pydantic); writing sections unvalidated.")
+                section_count = 0
                 try:
-                    df = pd.DataFrame(data_for_df)
-                    column_order = ["section_number", "level", "parent_number", "ancestry", "section_title", "content"]
-                    for col in column_order: # Ensure all desired columns are present
-                        if col not in df.columns:
-                            df[col] = None
-                    df = df[column_order] # Order them
-                    df.to_csv(output_csv_path, index=False, encoding='utf-8')
-                    print(f"\nAll extracted section data saved to {output_csv_path}")
-                except Exception as e:
-                    print(f"\nCould not save to CSV: {e}. Ensure pandas is installed (pip install pandas).")
+                    with open(output_csv_path, 'w', newline='', encoding='utf-8') as csv_file:
+                        writer = csv.writer(csv_file, lineterminator='\n')
+                        writer.writerow(column_order)
+                        print("\nExtracting sections with hierarchy:\n")
+                        for section_info_item in itertools.chain([first_section], sections):
+                            if validate_sections and USE_PYDANTIC:
+                                try:
+                                    SECTION_ADAPTER.validate_python(asdict(section_info_item))
+                                except Exception as e: # Pydantic ValidationError
+                                    print(f"Pydantic validation error for section '{section_info_item.section_number}': {e} - writing as parsed.")
+
+                            if section_count < 5: # Print first 5 as a sample
+                                print(f"  Number: {section_info_item.section_number}, Level: {section_info_item.level}, Parent: {section_info_item.parent_number}")
+                                print(f"  Title: {section_info_item.section_title[:70]}...") # Truncate title for display
+                                print("-" * 40)
+
+                            # Ancestry keeps its Python list repr so the CSV matches earlier runs
+                            writer.writerow([
+                                section_info_item.section_number, section_info_item.level, section_info_item.parent_number,
+                                str(list(section_info_item.ancestry)), section_info_item.section_title, section_info_item.content
+                            ])
+                            section_count += 1
+                    print(f"\nExtracted {section_count} sections; all section data saved to {output_csv_path}")
+                except OSError as e:
+                    print(f"\nCould not save to CSV: {e}")
             else:
-                print("\nNo valid data to save to CSV (possibly all Pydantic validations failed or no sections extracted).")
+                print(f"No sections were extracted from '{input_text_path}'.")
         else:
-            print(f"No sections were extracted from '{input_text_path}'.")
-    else:
-        print(f"Could not read the document from '{input_text_path}'.")
\ No newline at end of file
+            print(f"Could not read the document from '{input_text_path}'.")
+    finally:
+        # The mapping keeps the file open until it is closed
+        if isinstance(document_text, mmap.mmap):
+            document_text.close()
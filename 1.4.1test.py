@@ -1,20 +1,28 @@
 # --- Diagnostic Script ---
 # Purpose: To find and print any line containing a '/' from your input file.
+# The same report is available as `python 1.3section_parser.py --diag`, which reuses
+# the mapping that script already has open instead of reading the file again.
+import mmap
+
+from pipeline import iter_lines_containing
 
 input_filename = 'reformatted_single_line_sections.txt' # Make sure this is your correct filename
 
 try:
-    with open(input_filename, 'r', encoding='utf-8') as file:
+    with open(input_filename, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as text:
         print("--- Searching for lines with '/' ---")
         found_line = False
-        for i, line in enumerate(file):
-            if '/' in line:
-                print(f"Line {i+1}: {line.strip()}") # .strip() cleans up extra whitespace for readability
-                found_line = True
+        for line_number, line_start, line_end in iter_lines_containing(text, b"/"):
+            print(f"Line {line_number}: {text[line_start:line_end].decode('utf-8').strip()}") # .strip() cleans up extra whitespace for readability
+            found_line = True
         
         if not found_line:
             print("No lines containing '/' were found in the file.")
         print("--- End of search ---")
 
 except FileNotFoundError:
-    print(f"Error: The input file '{input_filename}' was not found.")
\ No newline at end of file
+    print(f"Error: The input file '{input_filename}' was not found.")
+except ValueError: # mmap refuses empty files
+    print("--- Searching for lines with '/' ---")
+    print("No lines containing '/' were found in the file.")
+    print("--- End of search ---")
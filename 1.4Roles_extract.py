@@ -1,15 +1,37 @@
+import mmap
 import re
 
+# --- Regex engine ---
+# RE2 compiles these patterns to a linear-time DFA. Set USE_RE2 = False to force
+# the stdlib `re` engine; `re` is also used whenever google-re2 isn't installed.
+USE_RE2 = True
+try:
+    import re2
+except ImportError:
+    re2 = None
+regex_engine = re2 if (USE_RE2 and re2 is not None) else re
+# --- End Regex engine ---
+
+# Compiled once at import. The chapter markers flexibly find "Chapter X" with spaces,
+# dashes, or newlines; the em dash is a multi-byte sequence in UTF-8, so it is matched
+# as an alternative.
+START_MARKER = regex_engine.compile(r"(?i)Chapter(?:[\s-]|—)+1".encode('utf-8'))
+END_MARKER = regex_engine.compile(r"(?i)Chapter(?:[\s-]|—)+4".encode('utf-8'))
+# Role name followed by its parenthesised abbreviation, e.g. "Unit Commander (CC)".
+# No ^/$ anchors, so no MULTILINE flag is needed. Runs on bytes like the markers.
+ROLE_PATTERN = regex_engine.compile(rb'(?i)([A-Za-z\s.,-]+?)\s+\(([A-Za-z0-9/-]+)\)')
+
 def find_and_extract_roles_section(text):
     """
     Dynamically finds the 'Roles and Responsibilities' chapter from the TOC,
     then extracts the content of that entire chapter for parsing.
 
     Args:
-        text (str): The full text of the policy document.
+        text (bytes or mmap.mmap): The full text of the policy document. The chapter
+            markers are searched on the raw bytes and the chapter is returned undecoded.
 
     Returns:
-        str or None: The text of the relevant chapter, or None if not found.
+        bytes or None: The raw UTF-8 bytes of the relevant chapter, or None if not found.
     """
 
     # # containing "roles and responsibilities", and captures the main chapter number.
@@ -29,17 +51,17 @@ def find_and_extract_roles_section(text):
     # start_marker = re.compile(fr"(?i)Chapter[\s—-]+{chapter_number}")
     # end_marker = re.compile(fr"(?i)Chapter[\s—-]+{next_chapter_number}")
 
-    start_marker = re.compile(fr"(?i)Chapter[\s—-]+1")
-    end_marker = re.compile(fr"(?i)Chapter[\s—-]+4")
+    if isinstance(text, str):
+        text = text.encode('utf-8')
 
     # 3. Find the start and end positions of the chapter content
-    start_match = start_marker.search(text)
+    start_match = START_MARKER.search(text)
     if not start_match:
         print(f"Error: Found Chapter 1 in TOC, but could not find the chapter heading in the document body.")
         return None
 
     # Search for the end marker *after* the start marker
-    end_match = end_marker.search(text, pos=start_match.end())
+    end_match = END_MARKER.search(text, pos=start_match.end())
 
     if not end_match:
         
@@ -53,17 +75,13 @@ def find_and_extract_roles_section(text):
 
 
 
-import re
-
 def parse_roles_from_text(section_text):
     
+    if isinstance(section_text, str):
+        section_text = section_text.encode('utf-8')
 
-    role_pattern = re.compile(
-        r'([A-Za-z\s.,-]+?)\s+\(([A-Za-z0-9/-]+)\)', 
-        re.MULTILINE | re.IGNORECASE
-    )
-    
-    found_roles = role_pattern.findall(section_text)
+    # Only the captured role names and abbreviations are decoded
+    found_roles = [(role.decode('utf-8'), abbr.decode('utf-8')) for role, abbr in ROLE_PATTERN.findall(section_text)]
 
     print(f"Found {found_roles} roles and abbreviations in the section text.")
 
@@ -101,14 +119,19 @@ def save_roles_to_txt(roles_dict, output_filename):
 def process_policy_document(input_filename, output_filename):
     """Main function to orchestrate the document processing."""
     try:
-        with open(input_filename, 'r', encoding='utf-8') as file:
-            full_text = file.read()
+        with open(input_filename, 'rb') as file:
+            # Map the file instead of reading it; only the roles chapter gets decoded
+            full_text = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
     except FileNotFoundError:
         print(f"Error: The input file '{input_filename}' was not found.")
         return
+    except ValueError:
+        print(f"Error: The input file '{input_filename}' is empty.")
+        return
 
     # Step 1: Dynamically find and extract the correct chapter's content
-    roles_chapter_text = find_and_extract_roles_section(full_text)
+    with full_text:
+        roles_chapter_text = find_and_extract_roles_section(full_text)
 
     if not roles_chapter_text:
         print("Processing stopped because the relevant section could not be found.")
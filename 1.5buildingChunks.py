@@ -1,13 +1,46 @@
-import re
-import json # Used for cleanly formatting the list of preceding headers
+import itertools
+import mmap
+import json # Fallback JSON encoder when orjson is not installed
 
-def parse_document_into_chunks(text):
+try:
+    import orjson
+    USE_ORJSON = True
+except ImportError:
+    USE_ORJSON = False
+
+from pipeline import iter_header_spans
+
+def iter_split_parts(text, spans=None):
+    """
+    Yields what splitting the text on the chunk header pattern (e.g. "2.2.3. ") would
+    give, [before, header1, content1, header2, ...], one decoded part at a time from
+    the shared scanner's spans instead of materializing the whole list.
+
+    Args:
+        text (bytes or mmap.mmap): The full text of the policy document.
+        spans (dict, optional): Header spans from pipeline.scan_header_spans().
+
+    Yields:
+        str: The next part of the split.
+    """
+    content_start = 0
+    for header_start, header_end, number_start, number_end in iter_header_spans(text, "chunk", spans):
+        yield text[content_start:header_start].decode('utf-8')
+        yield text[number_start:number_end].decode('utf-8')
+        content_start = header_end
+    yield text[content_start:].decode('utf-8')
+
+
+def parse_document_into_chunks(text, spans=None):
     """
     Parses a full document text into a list of structured "chunks" based on
     numbered section headers.
 
     Args:
-        text (str): The full text of the policy document.
+        text (bytes or mmap.mmap): The full text of the policy document. It is split
+            as raw bytes and each part is decoded on its own.
+        spans (dict, optional): Header spans from pipeline.scan_header_spans(), to reuse
+            a scan made elsewhere instead of rescanning the text.
 
     Returns:
         list: A list of dictionaries, where each dictionary represents a chunk.
@@ -15,25 +48,22 @@ def parse_document_into_chunks(text):
     print("Parsing document into structured chunks...")
     
     
-    header_pattern = re.compile(r"^\s*(\d+(?:\.\d+)*\.)\s+", re.MULTILINE)
-
-    
-    parts = header_pattern.split(text)
+    if isinstance(text, str):
+        text = text.encode('utf-8')
 
-    
-    if parts and parts[0].strip() == "":
-        parts = parts[1:]
+    parts = iter_split_parts(text, spans)
+    first_part = next(parts)
+    if first_part.strip() != "":
+        parts = itertools.chain([first_part], parts)
 
     chunks = []
     header_stack = [] #  hierarchy, e.g., ['2.', '2.2.', '2.2.3.']
     
     
-    for i in range(0, len(parts), 2):
-        if i + 1 >= len(parts):
-            continue
-
-        header = parts[i].strip()
-        content = parts[i+1].strip()
+    # Consume the parts two at a time; zip() drops a trailing unpaired part.
+    for header, content in zip(parts, parts):
+        header = header.strip()
+        content = content.strip()
 
         
         current_depth = header.count('.')
@@ -59,9 +89,17 @@ def parse_document_into_chunks(text):
     return chunks
 
 
+def _json_bytes(value):
+    """Compact JSON as UTF-8 bytes; the stdlib fallback is set up to match orjson's output."""
+    if USE_ORJSON:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode('utf-8')
+
+
 def save_chunks_to_txt(chunks, output_filename, source_filename=""):
     """
     Saves the list of structured chunks to a human-readable text file.
+    The whole file is built in memory and written with a single write() call.
 
     Args:
         chunks (list): The list of chunk dictionaries.
@@ -69,29 +107,25 @@ def save_chunks_to_txt(chunks, output_filename, source_filename=""):
         source_filename (str): The name of the source file to reference in the output.
     """
     print(f"Saving chunks to '{output_filename}'...")
+    # The 'role' field from your diagram seems to represent the source.
+    # We use the source filename here for context.
+    role = _json_bytes(f"Source: {source_filename}")
+
+    # Every value is encoded as a JSON literal, so quotes and newlines in the text
+    # are escaped. Chunks are separated by "---" lines, as before.
+    blocks = [
+        b'{\n'
+        b'    "id": ' + _json_bytes(chunk["id"]) + b',\n'
+        b'    "role": ' + role + b',\n'
+        b'    "header": ' + _json_bytes(chunk["header"]) + b',\n'
+        b'    "text": ' + _json_bytes(chunk["text"]) + b',\n'
+        b'    "preceding_header_ids": ' + _json_bytes(chunk["preceding_header_ids"]) + b'\n'
+        b'}\n'
+        for chunk in chunks
+    ]
     try:
-        with open(output_filename, 'w', encoding='utf-8') as file:
-            for i, chunk in enumerate(chunks):
-                file.write("{\n")
-                file.write(f'    "id": "{chunk["id"]}",\n')
-                # The 'role' field from your diagram seems to represent the source.
-                # We use the source filename here for context.
-                file.write(f'    "role": "Source: {source_filename}",\n')
-                file.write(f'    "header": "{chunk["header"]}",\n')
-                
-                # Use json.dumps to ensure the text is a valid JSON string literal
-                # This handles newlines and quotes correctly.
-                formatted_text = json.dumps(chunk["text"])
-                file.write(f'    "text": {formatted_text},\n')
-                
-                # Format the list of preceding headers
-                preceding_list_str = json.dumps(chunk["preceding_header_ids"])
-                file.write(f'    "preceding_header_ids": {preceding_list_str}\n')
-                file.write("}\n")
-                
-                # Add a separator between chunks, unless it's the last one
-                if i < len(chunks) - 1:
-                    file.write("\n---\n\n")
+        with open(output_filename, 'wb') as file:
+            file.write(b"\n---\n\n".join(blocks))
 
         return f"Successfully exported the chunks to '{output_filename}'"
     except IOError as e:
@@ -102,14 +136,18 @@ def save_chunks_to_txt(chunks, output_filename, source_filename=""):
 def process_policy_document(input_filename, output_filename):
     """Main function to orchestrate the document processing."""
     try:
-        with open(input_filename, 'r', encoding='utf-8') as file:
-            full_text = file.read()
+        with open(input_filename, 'rb') as file:
+            full_text = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
     except FileNotFoundError:
         print(f"Error: The input file '{input_filename}' was not found.")
         return
+    except ValueError:
+        print(f"Error: The input file '{input_filename}' is empty.")
+        return
 
     # Step 1: Parse the document into structured chunks
-    extracted_chunks = parse_document_into_chunks(full_text)
+    with full_text:
+        extracted_chunks = parse_document_into_chunks(full_text)
 
     if not extracted_chunks:
         print("No chunks were parsed from the document.")
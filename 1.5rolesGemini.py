@@ -1,7 +1,58 @@
+import argparse
+import asyncio
+import datetime
+import functools
+import glob
+import hashlib
 import json
 import google.generativeai as genai
+import mmap
 import os
+import random
+import re
+import sqlite3
+import textwrap
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv # NEW: Import load_dotenv
+from google.api_core import exceptions as google_exceptions
+
+try:
+    import orjson
+    USE_ORJSON = True
+except ImportError:
+    USE_ORJSON = False
+
+# uvloop is a faster drop-in event loop on Linux/macOS; asyncio's own loop is used otherwise
+try:
+    import uvloop
+    USE_UVLOOP = True
+except ImportError:
+    USE_UVLOOP = False
+
+# Aho-Corasick (pyahocorasick) finds every role name in a chunk in one pass; without it
+# the local role match falls back to one alternation regex.
+try:
+    import ahocorasick
+    USE_AHOCORASICK = True
+except ImportError:
+    USE_AHOCORASICK = False
+
+# The newer google-genai SDK provides Batch Mode and one client whose HTTP connection
+# pool is shared by every request; without it every chunk is sent through
+# google.generativeai.
+try:
+    from google import genai as google_genai
+    from google.genai import errors as genai_errors
+    from google.genai import types as genai_types
+    USE_GENAI_CLIENT = True
+except ImportError:
+    USE_GENAI_CLIENT = False
+# Batch Mode (google-genai only) is opt-in with --batch: a job can take up to 24 hours,
+# and the run waits for it before writing anything.
+USE_BATCH_MODE = False
 
 # --- Configuration ---
 # NEW: Load environment variables from .env file
@@ -9,7 +60,8 @@ load_dotenv()
 
 try:
     # UPDATED: Access the API key from environment variables (now loaded from .env)
-    genai.configure(api_key=os.environ["GEMINI_API_KEY"]) 
+    # One gRPC channel is kept open and shared by every request (when google-genai is not installed)
+    genai.configure(api_key=os.environ["GEMINI_API_KEY"], transport="grpc")
 except KeyError:
     print("Error: GEMINI_API_KEY not found. Please ensure it's set in your .env file or as an environment variable.")
     exit()
@@ -17,14 +69,156 @@ except KeyError:
 # Initialize the Gemini model
 # CHANGED: Model name to 'gemini-1.5-flash' for wider availability and good context window.
 # If you explicitly have access to 'gemini-2.0-flash', keep it as is.
-model = genai.GenerativeModel('gemini-1.5-flash')
+MODEL_NAME = 'gemini-1.5-flash'
+model = genai.GenerativeModel(MODEL_NAME)
+
+# Short chunks are asked of a smaller, cheaper model first and only escalated to
+# MODEL_NAME when it answers "Role not found" or a role that is not in the roles list.
+# Set CHEAP_MODEL_NAME to None to send everything to MODEL_NAME.
+CHEAP_MODEL_NAME = 'gemini-1.5-flash-8b'
+CHEAP_MODEL_MAX_TEXT_CHARS = 1500
+models_by_name = {MODEL_NAME: model}
+if CHEAP_MODEL_NAME:
+    models_by_name[CHEAP_MODEL_NAME] = genai.GenerativeModel(CHEAP_MODEL_NAME)
+
+# The answer is a single role name, so output is capped and no reasoning is needed.
+ROLE_MAX_OUTPUT_TOKENS = 32
+REQUEST_TIMEOUT_SECONDS = 15
+# Thinking models (Gemini 2.5/3) reason by default, which dominates latency for a
+# lookup like this. Set to 'minimal' (Gemini 3) when MODEL_NAME is one of them; older
+# models reject thinking_config. Only the google-genai client can send it.
+THINKING_LEVEL = None
+# Constrained decoding: single-chunk answers must be one of the role numbers or
+# "Role not found" (a text/x.enum response), so the answer cannot drift into prose.
+# This also drops the "role not in the list" answers the prompt otherwise allows, so
+# it is off by default. Group answers always use the JSON schema below.
+ENUM_ROLE_ANSWERS = False
+
+# Rate limits, overload and timeouts are retried with exponential backoff (with jitter,
+# so the concurrent calls do not retry in lockstep). A rate limit also pauses every other
+# call for the same delay, instead of each one running into the 429 on its own. A chunk
+# whose retries run out keeps an empty role, so the next run picks it up again.
+MAX_API_ATTEMPTS = 6
+RETRY_BASE_DELAY_SECONDS = 0.5
+RETRY_MAX_DELAY_SECONDS = 30
+RETRYABLE_API_ERRORS = (
+    google_exceptions.ResourceExhausted,   # 429
+    google_exceptions.ServiceUnavailable,  # 503
+    google_exceptions.DeadlineExceeded,    # 504 / request timeout
+    google_exceptions.InternalServerError  # 500
+)
+RETRYABLE_STATUS_CODES = {429, 500, 503, 504} # The same errors from the google-genai client
+rate_limited_until = 0.0 # time.monotonic() before which no new request is sent
+
+# Explicit context caching: the shared prompt prefix is stored once as a CachedContent
+# (as the system instruction) and each request sends only its chunk-specific tail.
+# Gemini only caches at least PREFIX_CACHE_MIN_TOKENS tokens (estimated here at ~4
+# characters per token), and 1.5 models need a versioned name such as
+# 'gemini-1.5-flash-002'; if creation fails the full prompts are sent instead.
+USE_PREFIX_CACHE = True
+PREFIX_CACHE_MIN_TOKENS = 2048
+PREFIX_CACHE_TTL_SECONDS = 3600
+prefix_cache = None # {'prefix', 'name', 'cache', 'model'} while a cache is active
+
+# Several role-less chunks are sent in one prompt and answered as one JSON array, which
+# spreads the shared instructions over the group. Chunks the answer misses are asked
+# one at a time. 1 sends every chunk on its own.
+CHUNKS_PER_PROMPT = 5
+GROUP_MAX_OUTPUT_TOKENS_PER_CHUNK = 48 # Room for {"id": ..., "role": ...} per chunk
+GROUP_ANSWER_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {"id": {"type": "STRING"}, "role": {"type": "STRING"}},
+        "required": ["id", "role"]
+    }
+}
+# Markdown code fences the model may wrap a JSON answer in (older models, or no schema)
+CODE_FENCE_PATTERN = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+
+# A chunk object starts with '{' at the beginning of a line (after any indentation).
+# Bytes pattern: it scans the memory-mapped chunks file without decoding it.
+CHUNK_START_PATTERN = re.compile(rb"^[ \t]*\{", re.MULTILINE)
+
+# Batch Mode: role-less chunks are submitted as one asynchronous job (half price, no
+# per-request round trip) once there are at least this many; smaller runs stay synchronous.
+BATCH_MODE_MIN_REQUESTS = 20
+BATCH_POLL_SECONDS = 30
+BATCH_REQUESTS_PATH = 'role_batch_requests.jsonl'
+BATCH_DONE_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+# Requests in flight at once on the synchronous path. Each call spends nearly all
+# of its time waiting on the network, so they all run as coroutines on one event
+# loop over one shared client connection, bounded by a semaphore.
+MAX_CONCURRENT_REQUESTS = 32
+# Older google-generativeai releases have no generate_content_async; their blocking
+# call runs on this one shared pool instead (threads are started only when needed,
+# and the GIL is released while they wait on the network).
+sync_call_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix="gemini")
+# Output chunks go through a large write buffer, which is flushed and fsynced every
+# this many chunks and at the end. Answers are in the role cache as soon as they
+# arrive, so chunks lost from the buffer in a crash cost no API calls on the rerun.
+OUTPUT_FSYNC_EVERY_CHUNKS = 100
+OUTPUT_BUFFER_BYTES = 1 << 20
+
+# The roles list is numbered in the prompt and the model answers with just the number,
+# a couple of output tokens instead of a full role name; worked examples show the format.
+ROLE_ANSWER_BY_INDEX = True
+
+# Chunks whose text opens with a known role (by name or abbreviation) as its subject,
+# e.g. "The CFM will ...", and names no other role take that role directly; the rest
+# go to Gemini. A role named later in the text ("In partnership with the AETC/TPM, ...")
+# is usually an object, not the chunk's role, so this only decides the clear cases.
+# Off by default; turn it on with --local-match.
+LOCAL_ROLE_MATCHING = False
+# Words that may come before the role at the start of the chunk text
+SUBJECT_LEAD_WORDS = ("", "the")
+
+# Chunks either side of each chunk whose text is included in its prompt as context.
+# Only this many chunks either side are held while the input file is read.
+CONTEXT_WINDOW_SIZE = 2
+# Neighbouring chunks only hint at the section a chunk belongs to, so their text is
+# shortened to about this many characters (at a word boundary); None keeps it whole.
+CONTEXT_MAX_CHARS = 200
+
+# Role-less chunks with the same text and the same neighbouring text in their context
+# window (after collapsing whitespace) are sent once; the answer for the first one is
+# copied to the rest (see chunk_dedup_key).
+DEDUPLICATE_CHUNK_TEXT = True
+
+# Roles returned by the model, one SQLite row per prompt, keyed by a SHA-256 of the
+# prompt version, model, temperature and full prompt text. Re-runs (and repeated
+# prompts) skip the API. Bump ROLE_PROMPT_VERSION when the way answers are read
+# changes without the prompt text changing; rows older than the TTL are dropped.
+ROLE_CACHE_PATH = os.path.join('.cache', 'roles.sqlite')
+ROLE_PROMPT_VERSION = 1
+ROLE_CACHE_TTL_SECONDS = 7 * 24 * 3600
+
+# Created once: Batch Mode and every per-chunk call reuse its connection pool
+if USE_GENAI_CLIENT:
+    genai_client = google_genai.Client(api_key=os.environ["GEMINI_API_KEY"])
+
+
+def loads_json(text):
+    """Parses JSON with orjson when available (its errors subclass json.JSONDecodeError)."""
+    return orjson.loads(text) if USE_ORJSON else json.loads(text)
+
+def dumps_chunk(chunk, pretty=False):
+    """
+    Serializes an output chunk (or a Batch Mode request line) as UTF-8 JSON bytes:
+    compact (one line, for NDJSON output) unless pretty is set. The stdlib fallback produces the same bytes as orjson.
+    """
+    if USE_ORJSON:
+        return orjson.dumps(chunk, option=orjson.OPT_INDENT_2) if pretty else orjson.dumps(chunk)
+    if pretty:
+        return json.dumps(chunk, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(chunk, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
 
 
 def load_roles_data(file_path):
     """Loads the roles data from a JSON file."""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(file_path, 'rb') as f:
+            return loads_json(f.read())
     except FileNotFoundError:
         print(f"Error: Roles data file not found at {file_path}")
         return []
@@ -41,22 +235,323 @@ def load_system_prompt_template(file_path):
         print(f"Error: System prompt file not found at {file_path}")
         return ""
 
-def format_roles_for_prompt(roles_list):
-    """Formats the list of roles into a readable string for the prompt."""
+def get_role_names(roles_list):
+    """Returns the role names in list order; entries may use 'name' or 'Role' keys."""
+    return [role.get("name") or role.get("Role") for role in roles_list if role.get("name") or role.get("Role")]
+
+def format_roles_for_prompt(roles_list, numbered=False):
+    """
+    Formats the list of roles into a readable string for the prompt. When numbered,
+    each line starts with the role's index in get_role_names() ("0) name (abbr)").
+    """
     formatted_roles = []
     for role in roles_list:
-        name = role.get("name")
-        abbreviation = role.get("abbreviation", "")
+        name = role.get("name") or role.get("Role")
+        abbreviation = role.get("abbreviation") or role.get("Abbreviation") or ""
         if name: # Ensure name exists
+            bullet = f"{len(formatted_roles)})" if numbered else "-"
             if abbreviation:
-                formatted_roles.append(f"- {name} ({abbreviation})")
+                formatted_roles.append(f"{bullet} {name} ({abbreviation})")
             else:
-                formatted_roles.append(f"- {name}")
+                formatted_roles.append(f"{bullet} {name}")
     return "\n".join(formatted_roles)
 
+def build_answer_by_index_instructions(roles_list):
+    """
+    Builds the answer-format instructions and worked examples that ask the model for
+    the number of the role in the numbered list instead of its full name.
+    """
+    named_roles = [role for role in roles_list if role.get("name") or role.get("Role")]
+    if not named_roles:
+        return ""
+    examples = []
+    for index, role in enumerate(named_roles[:2]):
+        term = role.get("abbreviation") or role.get("Abbreviation") or role.get("name") or role.get("Role")
+        examples.append(f'Text: "The {term} reviews the request and forwards it for approval."\nAnswer: {index}')
+    examples.append('Text: "This instruction implements Department of Defense policy."\nAnswer: Role not found')
+    return (
+        "Answer format: reply with ONLY the number in front of the matching role in the list above. "
+        "If the role is clearly identifiable but not in the list, reply with the role as it appears in the text. "
+        "If no role can be identified, reply \"Role not found\".\n\n"
+        "Examples:\n" + "\n\n".join(examples)
+    )
+
+def build_role_answer_schema(role_names):
+    """
+    The enum schema for a single-chunk answer when ENUM_ROLE_ANSWERS is on: the index
+    of each numbered role, or "Role not found". None when answers are not numbered.
+    """
+    if not ENUM_ROLE_ANSWERS or not role_names:
+        return None
+    return {"type": "STRING", "enum": [str(index) for index in range(len(role_names))] + ["Role not found"]}
+
+def resolve_role_answer(answer_text, role_names):
+    """
+    Maps a numbered answer back to the role name. Answers that are not a valid index
+    (a role outside the list, "Role not found") are returned unchanged.
+    """
+    number = answer_text.rstrip(".")
+    if role_names and number.isdigit() and int(number) < len(role_names):
+        return role_names[int(number)]
+    return answer_text
+
+
+def iter_role_terms(roles_list):
+    """Yields (term, role name) for every role name and abbreviation in the roles list."""
+    for role in roles_list:
+        name = role.get("name") or role.get("Role")
+        if not name:
+            continue
+        for term in (name, role.get("abbreviation") or role.get("Abbreviation")):
+            if term:
+                yield term, name
+
+def build_role_matcher(roles_list):
+    """
+    Builds a matcher for the literal role names and abbreviations in the roles list.
+
+    Args:
+        roles_list (list): Role dictionaries ('name'/'abbreviation' or 'Role'/'Abbreviation').
+
+    Returns:
+        tuple: (automaton or compiled regex, dict of matched term -> role name), or None
+               if the list holds no terms.
+    """
+    role_by_term = {}
+    for term, name in iter_role_terms(roles_list):
+        role_by_term.setdefault(term, name)
+    if not role_by_term:
+        return None
+
+    if USE_AHOCORASICK:
+        automaton = ahocorasick.Automaton()
+        for term in role_by_term:
+            automaton.add_word(term, term)
+        automaton.make_automaton()
+        return automaton, role_by_term
+    # Longest terms first, so "AF/REG" wins over "AF/RE" at the same position
+    terms = sorted(role_by_term, key=len, reverse=True)
+    pattern = re.compile(r"(?<![\w/])(?:" + "|".join(map(re.escape, terms)) + r")(?![\w/])")
+    return pattern, role_by_term
+
+def _is_whole_term(text, start, end):
+    # A term must not run into a neighbouring word or office symbol ("AETC" in "AETC/TPM")
+    before = text[start - 1] if start > 0 else " "
+    after = text[end] if end < len(text) else " "
+    return not (before.isalnum() or before in "_/" or after.isalnum() or after in "_/")
+
+def match_role_locally(role_matcher, text):
+    """
+    Returns the role when the text opens with it as the subject (see SUBJECT_LEAD_WORDS)
+    and names no other role, or None otherwise (those chunks are left for Gemini).
+    """
+    if role_matcher is None or not text:
+        return None
+    matcher, role_by_term = role_matcher
+    if USE_AHOCORASICK:
+        # iter_long reports the leftmost-longest non-overlapping matches
+        matches = [(end - len(term) + 1, term) for end, term in matcher.iter_long(text)
+                   if _is_whole_term(text, end - len(term) + 1, end + 1)]
+    else:
+        matches = [(match.start(), match.group()) for match in matcher.finditer(text)]
+    if not matches or text[:matches[0][0]].strip().lower() not in SUBJECT_LEAD_WORDS:
+        return None
+    matched_roles = {role_by_term[term] for _, term in matches}
+    return matched_roles.pop() if len(matched_roles) == 1 else None
+
+
+_role_cache_db = None
+
+def _open_role_cache():
+    """
+    Opens the role cache database once per run (WAL, so readers never block the writer)
+    and drops the rows that have outlived ROLE_CACHE_TTL_SECONDS.
+    """
+    global _role_cache_db
+    if _role_cache_db is None:
+        os.makedirs(os.path.dirname(ROLE_CACHE_PATH), exist_ok=True)
+        db = sqlite3.connect(ROLE_CACHE_PATH)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("CREATE TABLE IF NOT EXISTS roles "
+                   "(key TEXT PRIMARY KEY, role TEXT NOT NULL, created_at REAL NOT NULL DEFAULT 0)")
+        if "created_at" not in {row[1] for row in db.execute("PRAGMA table_info(roles)")}:
+            # Caches from before the TTL; their rows are keyed without a prompt version anyway
+            db.execute("ALTER TABLE roles ADD COLUMN created_at REAL NOT NULL DEFAULT 0")
+        with db:
+            db.execute("DELETE FROM roles WHERE created_at < ?", (time.time() - ROLE_CACHE_TTL_SECONDS,))
+        _role_cache_db = db
+    return _role_cache_db
+
+def _role_cache_key(prompt_text, temperature_value, model_name=None):
+    return hashlib.sha256(
+        f"{ROLE_PROMPT_VERSION}\0{model_name or MODEL_NAME}\0{temperature_value}\0{prompt_text}".encode('utf-8')
+    ).hexdigest()
+
+def get_cached_role(prompt_text, temperature_value, model_name=None):
+    """Returns the role cached for this exact prompt and model, or None if it was never answered (or expired)."""
+    try:
+        row = _open_role_cache().execute(
+            "SELECT role FROM roles WHERE key = ? AND created_at >= ?",
+            (_role_cache_key(prompt_text, temperature_value, model_name), time.time() - ROLE_CACHE_TTL_SECONDS)
+        ).fetchone()
+    except (OSError, sqlite3.Error) as e:
+        print(f"Warning: could not read the role cache: {e}")
+        return None
+    return row[0] if row else None
+
+def cache_role(prompt_text, temperature_value, role, model_name=None):
+    """Stores a role the model actually returned. API failures must not be cached."""
+    try:
+        with _open_role_cache() as db: # Commits on success
+            db.execute("INSERT OR REPLACE INTO roles (key, role, created_at) VALUES (?, ?, ?)",
+                       (_role_cache_key(prompt_text, temperature_value, model_name), role, time.time()))
+    except (OSError, sqlite3.Error) as e:
+        print(f"Warning: could not cache role: {e}")
+
+
+def is_transient_api_error(error):
+    """True for rate-limit, overload and timeout errors from either Gemini SDK."""
+    if isinstance(error, RETRYABLE_API_ERRORS + (asyncio.TimeoutError,)):
+        return True
+    return USE_GENAI_CLIENT and isinstance(error, genai_errors.APIError) and error.code in RETRYABLE_STATUS_CODES
+
+def is_rate_limit_error(error):
+    """True for a 429 (quota or rate limit) from either Gemini SDK."""
+    if isinstance(error, google_exceptions.ResourceExhausted):
+        return True
+    return USE_GENAI_CLIENT and isinstance(error, genai_errors.APIError) and error.code == 429
+
+
+def create_prefix_cache(prompt_prefix):
+    """
+    Stores the shared prompt prefix as an explicit CachedContent for MODEL_NAME, so the
+    requests that follow are billed for it at the cached rate and upload only their tail.
+    Does nothing when the prefix is too short to cache; failures are reported and the
+    full prompts are sent as before.
+    """
+    global prefix_cache
+    if not USE_PREFIX_CACHE or len(prompt_prefix) // 4 < PREFIX_CACHE_MIN_TOKENS:
+        return
+    try:
+        if USE_GENAI_CLIENT:
+            cache = genai_client.caches.create(
+                model=MODEL_NAME,
+                config=genai_types.CreateCachedContentConfig(
+                    system_instruction=prompt_prefix,
+                    ttl=f"{PREFIX_CACHE_TTL_SECONDS}s",
+                    display_name="role-extraction-prefix"
+                )
+            )
+            prefix_cache = {'prefix': prompt_prefix, 'name': cache.name, 'cache': cache, 'model': None}
+        else:
+            cache = genai.caching.CachedContent.create(
+                model=MODEL_NAME,
+                system_instruction=prompt_prefix,
+                ttl=datetime.timedelta(seconds=PREFIX_CACHE_TTL_SECONDS),
+                display_name="role-extraction-prefix"
+            )
+            prefix_cache = {'prefix': prompt_prefix, 'name': cache.name, 'cache': cache,
+                            'model': genai.GenerativeModel.from_cached_content(cache)}
+        print(f"Cached the shared prompt prefix as {cache.name}.")
+    except Exception as e:
+        print(f"Could not create an explicit cache for the prompt prefix; sending full prompts: {e}")
+
+def delete_prefix_cache():
+    """Deletes the explicit prefix cache, if one was created, instead of waiting for its TTL."""
+    global prefix_cache
+    if prefix_cache is None:
+        return
+    try:
+        if USE_GENAI_CLIENT:
+            genai_client.caches.delete(name=prefix_cache['name'])
+        else:
+            prefix_cache['cache'].delete()
+    except Exception as e:
+        print(f"Warning: could not delete the prompt prefix cache {prefix_cache['name']}: {e}")
+    prefix_cache = None
+
+
+async def generate_text(prompt_text, temperature_value, model_name=None, max_output_tokens=ROLE_MAX_OUTPUT_TOKENS,
+                        response_schema=None):
+    """
+    Sends one prompt to Gemini and returns the stripped response text. Transient errors
+    are retried with backoff; the last error is raised once the attempts run out, and
+    any other error is raised straight away. A response_schema of type ARRAY/OBJECT asks
+    for JSON; one with an enum asks for exactly one of its values as plain text.
+    """
+    global rate_limited_until
+    # With an explicit prefix cache only the tail after the prefix is sent (same model only)
+    use_prefix_cache = (prefix_cache is not None and (model_name or MODEL_NAME) == MODEL_NAME
+                        and prompt_text.startswith(prefix_cache['prefix']))
+    if use_prefix_cache:
+        prompt_text = prompt_text[len(prefix_cache['prefix']):]
+    response_mime_type = None
+    if response_schema is not None:
+        response_mime_type = "text/x.enum" if "enum" in response_schema else "application/json"
+    # NEW: Create a GenerationConfig object
+    if USE_GENAI_CLIENT:
+        generation_config = genai_types.GenerateContentConfig(
+            temperature=temperature_value,
+            candidate_count=1,
+            max_output_tokens=max_output_tokens,
+            response_mime_type=response_mime_type,
+            response_schema=response_schema,
+            thinking_config=genai_types.ThinkingConfig(thinking_level=THINKING_LEVEL) if THINKING_LEVEL else None,
+            cached_content=prefix_cache['name'] if use_prefix_cache else None,
+            http_options=genai_types.HttpOptions(timeout=REQUEST_TIMEOUT_SECONDS * 1000) # milliseconds
+        )
+    else:
+        generation_config = genai.GenerationConfig(
+            temperature=temperature_value,
+            candidate_count=1,
+            max_output_tokens=max_output_tokens,
+            response_mime_type=response_mime_type,
+            response_schema=response_schema,
+            # You can add other parameters here if needed, e.g., top_p, top_k
+            # top_p=0.95, 
+            # top_k=60,   
+        )
+
+    for attempt in range(MAX_API_ATTEMPTS):
+        pause = rate_limited_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        try:
+            # CHANGED: Pass generation_config to generate_content
+            if USE_GENAI_CLIENT:
+                response = await genai_client.aio.models.generate_content(
+                    model=model_name or MODEL_NAME,
+                    contents=prompt_text,
+                    config=generation_config
+                )
+            else:
+                role_model = prefix_cache['model'] if use_prefix_cache else models_by_name[model_name or MODEL_NAME]
+                request = dict(
+                    contents=[
+                        {"role": "user", "parts": [{"text": prompt_text}]}
+                    ],
+                    generation_config=generation_config,
+                    request_options={"timeout": REQUEST_TIMEOUT_SECONDS}
+                )
+                if hasattr(role_model, "generate_content_async"):
+                    response = await role_model.generate_content_async(**request)
+                else:
+                    response = await asyncio.get_running_loop().run_in_executor(
+                        sync_call_executor, functools.partial(role_model.generate_content, **request)
+                    )
+            return (response.text or "").strip()
+        except Exception as e:
+            if not is_transient_api_error(e) or attempt == MAX_API_ATTEMPTS - 1:
+                raise
+            delay = min(RETRY_MAX_DELAY_SECONDS, RETRY_BASE_DELAY_SECONDS * 2 ** attempt)
+            if is_rate_limit_error(e):
+                rate_limited_until = max(rate_limited_until, time.monotonic() + delay / 2)
+            await asyncio.sleep(random.uniform(delay / 2, delay))
+
 
 # CHANGED: Function signature to accept temperature_value
-def extract_role_string_with_gemini(full_context_prompt_text, roles_data, temperature_value): 
+async def extract_role_string_with_gemini(full_context_prompt_text, temperature_value, model_name=None, role_names=None):
     """
     Uses the Gemini API to extract *only* the 'role' string from a given text chunk JSON,
     incorporating external system prompt, roles data, and contextual information.
@@ -64,38 +559,586 @@ def extract_role_string_with_gemini(full_context_prompt_text, roles_data, temper
     Args:
         full_context_prompt_text (str): The complete prompt text including system instructions, roles data,
                                          and the current chunk plus its surrounding context.
-        roles_data (list): The list of dictionaries containing role names and abbreviations. (Used by format_roles_for_prompt)
         temperature_value (float): The temperature setting for the model.
+        model_name (str): Which model to ask (default MODEL_NAME).
+        role_names (list): The numbered roles list, when the prompt asks for an index.
 
     Returns:
-        str: The extracted role string, or "Role not found" if not identified or an error occurs.
+        str: The extracted role string, or "Role not found" if not identified or a
+             non-transient error occurs. None if transient errors outlasted every retry.
+        Answers are served from and saved to the role cache; errors are not cached.
     """
-    
-    # NEW: Create a GenerationConfig object
-    generation_config = genai.GenerationConfig(
-        temperature=temperature_value,
-        # You can add other parameters here if needed, e.g., top_p, top_k, max_output_tokens
-        # top_p=0.95, 
-        # top_k=60,   
-        # max_output_tokens=100 
-    )
+    cached_role = get_cached_role(full_context_prompt_text, temperature_value, model_name)
+    if cached_role is not None:
+        return cached_role
 
     try:
-        # CHANGED: Pass generation_config to generate_content
-        response = model.generate_content(
-            contents=[
-                {"role": "user", "parts": [{"text": full_context_prompt_text}]}
-            ],
-            generation_config=generation_config
+        identified_role = resolve_role_answer(
+            await generate_text(full_context_prompt_text, temperature_value, model_name,
+                                response_schema=build_role_answer_schema(role_names)), role_names
         )
-        return response.text.strip()
     except Exception as e:
+        if is_transient_api_error(e):
+            print(f"Error calling Gemini API, giving up after {MAX_API_ATTEMPTS} attempts: {e}")
+            return None # Left empty so a later run retries it
         print(f"Error calling Gemini API: {e}")
         return "Role not found" # Default if API call fails
+    cache_role(full_context_prompt_text, temperature_value, identified_role, model_name)
+    return identified_role
+
+
+def build_prompt_prefix(system_prompt_template, roles_data):
+    """
+    Builds the part of every prompt that does not depend on the chunk: the system prompt
+    with the roles list, the answer format and the request layout. Everything chunk
+    specific follows it, so Gemini's implicit context caching can reuse the whole prefix
+    across the burst of requests.
+    """
+    answer_instructions = build_answer_by_index_instructions(roles_data) if ROLE_ANSWER_BY_INDEX else ""
+    group_instructions = (
+        "When several JSON chunks are given, reply with ONLY a JSON array holding one object per chunk, "
+        "in the same order: [{\"id\": \"<the chunk's id>\", \"role\": \"<its answer>\"}]. "
+        "Each answer follows the format above.\n"
+    ) if CHUNKS_PER_PROMPT > 1 else ""
+    return (
+        "\n" + system_prompt_template.replace("<ROLES_LIST>", format_roles_for_prompt(roles_data, numbered=ROLE_ANSWER_BY_INDEX)) + "\n\n"
+        + (answer_instructions + "\n\n" if answer_instructions else "") +
+        "Each request gives contextual information from surrounding document chunks between the "
+        "START CONTEXT and END CONTEXT markers, followed by the specific JSON chunk to analyze. "
+        "Extract its role, filling the 'role' field if empty.\n"
+        + group_instructions +
+        "\n--- START CONTEXT ---\n"
+    )
+
+def shorten_context_text(text):
+    """Cuts a neighbouring chunk's text to CONTEXT_MAX_CHARS at a word boundary."""
+    if CONTEXT_MAX_CHARS is None or len(text) <= CONTEXT_MAX_CHARS:
+        return text
+    return textwrap.shorten(text, width=CONTEXT_MAX_CHARS, placeholder=" …")
+
+def format_context_tail(index, chunk):
+    """
+    Formats a neighbouring chunk as "<id>: <text shortened to CONTEXT_MAX_CHARS>", the
+    part of its context line that does not depend on its position. "" if it has no text.
+    """
+    context_text = shorten_context_text(chunk.get("text", ""))
+    return f"{chunk.get('id', index)}: {context_text}" if context_text else ""
+
+def build_context_lines(chunk_id, current_text, preceding_tails, succeeding_tails):
+    """
+    Lists the text of a chunk and its neighbours, labelled by position, for its prompt.
+
+    Args:
+        chunk_id (str): The id of the chunk being asked about.
+        current_text (str): Its 'text' field, kept whole.
+        preceding_tails (list): format_context_tail() of each chunk before it.
+        succeeding_tails (list): The same for the chunks after it.
+
+    Returns:
+        list: One "Preceding/Current/Succeeding Chunk <id>: <text>" line per chunk with text.
+    """
+    context_chunks_texts = [f"Preceding Chunk {tail}" for tail in preceding_tails if tail]
+    if current_text:
+        context_chunks_texts.append(f"Current Chunk {chunk_id}: {current_text}")
+    context_chunks_texts.extend(f"Succeeding Chunk {tail}" for tail in succeeding_tails if tail)
+    return context_chunks_texts
+
+def chunk_dedup_key(current_text, preceding_chunks, succeeding_chunks):
+    """
+    Returns the key role-less chunks are deduplicated on: the chunk's text and the text of
+    each neighbour in its context window, whitespace collapsed. Chunks with equal keys get
+    the same context in their prompts, which then differ only in ids and header numbers.
+    """
+    def normalize(text):
+        return " ".join(text.split())
+    return (tuple(normalize(chunk.get("text", "")) for chunk in preceding_chunks), normalize(current_text),
+            tuple(normalize(chunk.get("text", "")) for chunk in succeeding_chunks))
+
+def build_chunk_prompt(prompt_prefix, context_chunks_texts, raw_chunk_str):
+    """
+    Builds the prompt for one chunk: the shared prefix, then its context and the chunk itself.
+    The pieces are joined in one pass, so the long prefix is copied once per prompt rather
+    than once per '+'.
+    """
+    return "".join((
+        prompt_prefix, "\n".join(context_chunks_texts), "\n"
+        "--- END CONTEXT ---\n\n"
+        "Specific JSON Chunk to Analyze:\n", raw_chunk_str, "\n"
+    ))
+
+def build_group_prompt(prompt_prefix, members):
+    """
+    Builds one prompt that asks for the roles of several chunks at once.
+
+    Args:
+        prompt_prefix (str): The shared instructions, roles list and context preamble.
+        members (list): (context lines, chunk JSON) for each chunk, in document order.
+
+    Returns:
+        str: The prompt; the answer is a JSON array of {"id", "role"} objects.
+    """
+    # The chunks' context windows overlap, so each context line is included once
+    context_lines = dict.fromkeys(
+        line for context_chunks_texts, _ in members for line in context_chunks_texts
+        if not line.startswith("Current Chunk ")
+    )
+    return "".join((
+        prompt_prefix, "\n".join(context_lines), "\n"
+        "--- END CONTEXT ---\n\n"
+        "JSON Chunks to Analyze:\n", "\n".join([raw_chunk_str for _, raw_chunk_str in members]), "\n"
+    ))
+
+def parse_group_answer(answer_text, chunk_ids, role_names=None):
+    """
+    Reads the JSON array a group prompt asks for.
+
+    Returns:
+        dict: chunk id -> role for each chunk of the group that the answer covers.
+              Empty if the answer is not a JSON array.
+    """
+    try:
+        items = loads_json(CODE_FENCE_PATTERN.sub("", answer_text))
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(items, list):
+        return {}
+    roles_by_id = {}
+    for item in items:
+        if isinstance(item, dict) and item.get("id") in chunk_ids and item.get("role") is not None:
+            roles_by_id[item["id"]] = resolve_role_answer(str(item["role"]).strip(), role_names)
+    return roles_by_id
+
+async def extract_roles_for_group(group_prompt, chunk_ids, temperature_value, role_names=None):
+    """
+    Asks Gemini for the roles of a group of chunks in one request.
+
+    Args:
+        group_prompt (str): The prompt from build_group_prompt().
+        chunk_ids (list): The ids of the chunks in the group.
+        temperature_value (float): The temperature setting for the model.
+        role_names (list): The numbered roles list, when the prompt asks for an index.
+
+    Returns:
+        dict: chunk id -> role for the chunks the model answered; the rest should be
+              asked one at a time. The raw answer is cached like a single role.
+    """
+    answer_text = get_cached_role(group_prompt, temperature_value)
+    from_cache = answer_text is not None
+    if not from_cache:
+        try:
+            answer_text = await generate_text(
+                group_prompt, temperature_value, max_output_tokens=GROUP_MAX_OUTPUT_TOKENS_PER_CHUNK * len(chunk_ids),
+                response_schema=GROUP_ANSWER_SCHEMA
+            )
+        except Exception as e:
+            print(f"Error calling Gemini API for a group of {len(chunk_ids)} chunks: {e}")
+            return {}
+    roles_by_id = parse_group_answer(answer_text, set(chunk_ids), role_names)
+    if roles_by_id and not from_cache:
+        cache_role(group_prompt, temperature_value, answer_text)
+    return roles_by_id
+
+
+def extract_roles_with_batch_mode(keyed_prompts, temperature_value, role_names=None, groups=()):
+    """
+    Submits every prompt as one Gemini Batch Mode job and waits for it to finish.
+
+    Args:
+        keyed_prompts (list): (key, prompt text) pairs; the key maps each result back.
+        temperature_value (float): The temperature setting for the model.
+        role_names (list): The numbered roles list, when the prompts ask for an index.
+        groups (list): (group prompt, [(key, chunk id), ...]) for prompts to ask together
+                       in one request; their members are not also sent on their own.
+
+    Returns:
+        dict: key -> extracted role string for every request that succeeded. Keys that
+              are missing (job failure, per-request error) should be retried synchronously.
+    """
+    try:
+        with open(BATCH_REQUESTS_PATH, 'wb') as requests_file:
+            generation_config = {
+                "temperature": temperature_value,
+                "candidate_count": 1,
+                "max_output_tokens": ROLE_MAX_OUTPUT_TOKENS
+            }
+            if THINKING_LEVEL:
+                generation_config["thinking_config"] = {"thinking_level": THINKING_LEVEL}
+            role_answer_schema = build_role_answer_schema(role_names)
+            if role_answer_schema:
+                generation_config["response_mime_type"] = "text/x.enum"
+                generation_config["response_schema"] = role_answer_schema
+            grouped_keys = {key for _, members in groups for key, _ in members}
+            batch_prompts = [(key, prompt_text, generation_config) for key, prompt_text in keyed_prompts
+                             if key not in grouped_keys]
+            for group_number, (group_prompt, members) in enumerate(groups):
+                group_config = dict(generation_config,
+                                    max_output_tokens=GROUP_MAX_OUTPUT_TOKENS_PER_CHUNK * len(members),
+                                    response_mime_type="application/json", response_schema=GROUP_ANSWER_SCHEMA)
+                batch_prompts.append((f"group-{group_number}", group_prompt, group_config))
+            for key, prompt_text, request_config in batch_prompts:
+                request = {
+                    "key": key,
+                    "request": {
+                        "contents": [{"role": "user", "parts": [{"text": prompt_text}]}],
+                        "generation_config": request_config
+                    }
+                }
+                requests_file.write(dumps_chunk(request) + b"\n")
+
+        uploaded_file = genai_client.files.upload(
+            file=BATCH_REQUESTS_PATH,
+            config=genai_types.UploadFileConfig(display_name="role-extraction-requests", mime_type="jsonl")
+        )
+        batch_job = genai_client.batches.create(
+            model=MODEL_NAME, src=uploaded_file.name, config={"display_name": "role-extraction"}
+        )
+        print(f"Submitted batch job {batch_job.name} with {len(batch_prompts)} requests "
+              f"for {len(keyed_prompts)} chunks. Waiting for results...")
+
+        while batch_job.state.name not in BATCH_DONE_STATES:
+            time.sleep(BATCH_POLL_SECONDS)
+            batch_job = genai_client.batches.get(name=batch_job.name)
+
+        if batch_job.state.name != "JOB_STATE_SUCCEEDED":
+            print(f"Batch job {batch_job.name} ended in state {batch_job.state.name}.")
+            return {}
+
+        results_jsonl = genai_client.files.download(file=batch_job.dest.file_name).decode('utf-8')
+    except Exception as e:
+        print(f"Error running Gemini batch job: {e}")
+        return {}
+    return parse_batch_results(results_jsonl, temperature_value, role_names, groups)
+
+
+def parse_batch_results(results_jsonl, temperature_value, role_names=None, groups=()):
+    """
+    Reads the roles out of a Batch Mode results file, caching each group answer.
+
+    Args:
+        results_jsonl (str): The results file, one JSON result per line.
+        temperature_value (float): The temperature the requests were sent with.
+        role_names (list): The numbered roles list, when the prompts ask for an index.
+        groups (list): The groups the job was submitted with, as for
+                       extract_roles_with_batch_mode.
+
+    Returns:
+        dict: key -> extracted role string. A line that can't be read is skipped, so
+              its keys are retried synchronously like any other missing key.
+    """
+    group_by_key = {f"group-{group_number}": group for group_number, group in enumerate(groups)}
+    roles_by_key = {}
+    for line in results_jsonl.splitlines():
+        if not line.strip():
+            continue
+        try:
+            result = loads_json(line)
+        except (json.JSONDecodeError, TypeError) as e:
+            print(f"Warning: skipping an unreadable batch result line: {e}")
+            continue
+        if not isinstance(result, dict):
+            print(f"Warning: skipping a batch result line that is not an object: {line[:80]}")
+            continue
+        try:
+            parts = result["response"]["candidates"][0]["content"]["parts"]
+            answer_text = "".join(part.get("text", "") for part in parts).strip()
+            if result["key"] not in group_by_key:
+                roles_by_key[result["key"]] = resolve_role_answer(answer_text, role_names)
+                continue
+            # Members the group answer misses are left out, so they are asked again on their
+            # own; the answer is cached like a synchronous group answer
+            group_prompt, members = group_by_key[result["key"]]
+            roles_by_id = parse_group_answer(answer_text, {chunk_id for _, chunk_id in members}, role_names)
+            if roles_by_id:
+                cache_role(group_prompt, temperature_value, answer_text)
+            for key, chunk_id in members:
+                if chunk_id in roles_by_id:
+                    roles_by_key[key] = roles_by_id[chunk_id]
+        except (KeyError, IndexError, TypeError, AttributeError):
+            print(f"Batch request {result.get('key')} returned no role: {result.get('error', 'empty response')}")
+    return roles_by_key
+
+
+def build_prompt_groups(keyed_prompts, group_parts, prompt_prefix):
+    """
+    Splits the prompts into runs of CHUNKS_PER_PROMPT chunks and builds one group prompt
+    for each run of two or more.
+
+    Args:
+        keyed_prompts (list): (chunk index, prompt text) pairs, in document order.
+        group_parts (dict): chunk index -> (chunk id, context lines, chunk JSON).
+        prompt_prefix (str): The shared instructions, roles list and context preamble.
+
+    Returns:
+        list: (group prompt, [(chunk index, chunk id), ...]) pairs.
+    """
+    if CHUNKS_PER_PROMPT < 2:
+        return []
+    # Answers are matched back by id, so chunks without a unique id are asked alone
+    id_counts = defaultdict(int)
+    for chunk_index, _ in keyed_prompts:
+        id_counts[group_parts[chunk_index][0]] += 1
+    groupable = [chunk_index for chunk_index, _ in keyed_prompts
+                 if group_parts[chunk_index][0] != "No ID" and id_counts[group_parts[chunk_index][0]] == 1]
+
+    groups = []
+    for start in range(0, len(groupable), CHUNKS_PER_PROMPT):
+        run = groupable[start:start + CHUNKS_PER_PROMPT]
+        if len(run) < 2:
+            continue
+        members = [group_parts[chunk_index][1:] for chunk_index in run]
+        groups.append((build_group_prompt(prompt_prefix, members),
+                       [(chunk_index, group_parts[chunk_index][0]) for chunk_index in run]))
+    return groups
+
+def run_async(coroutine):
+    """Runs a coroutine to completion, on uvloop when it is installed."""
+    if USE_UVLOOP:
+        return uvloop.run(coroutine)
+    return asyncio.run(coroutine)
+
+async def fill_roles_concurrently(keyed_prompts, temperature_value, outfile, set_role,
+                                  cheap_first_indexes=frozenset(), known_roles=frozenset(), role_names=None, groups=()):
+    """
+    Asks Gemini for every prompt with at most MAX_CONCURRENT_REQUESTS in flight, and
+    hands each role to set_role(chunk_index, role, outfile) as soon as it arrives.
+
+    Args:
+        keyed_prompts (list): (chunk index, prompt text) pairs.
+        temperature_value (float): The temperature setting for the model.
+        outfile (file): The output file, passed through to set_role.
+        set_role (callable): Records a role; runs on the event loop thread only.
+        cheap_first_indexes (set): Chunk indexes to try on CHEAP_MODEL_NAME first.
+        known_roles (set): Role names and abbreviations the cheap model's answer must be
+                           one of; anything else is escalated to MODEL_NAME.
+        role_names (list): The numbered roles list, when the prompts ask for an index.
+        groups (list): (group prompt, [(chunk index, chunk id), ...]) for chunks to ask
+                       together first; members the group answer misses are asked alone.
+                       Members not in keyed_prompts are already answered and are skipped.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    prompt_by_index = dict(keyed_prompts)
+    cheap_answered = 0
+    escalated = 0
+
+    async def fill_role(chunk_index, prompt_text):
+        nonlocal cheap_answered, escalated
+        identified_role = None
+        try:
+            async with semaphore:
+                if CHEAP_MODEL_NAME and chunk_index in cheap_first_indexes:
+                    identified_role = await extract_role_string_with_gemini(
+                        prompt_text, temperature_value=temperature_value, model_name=CHEAP_MODEL_NAME, role_names=role_names
+                    )
+                    if identified_role in known_roles:
+                        cheap_answered += 1
+                    else:
+                        identified_role = None
+                        escalated += 1
+                if identified_role is None:
+                    # CHANGED: Pass model_temperature to extract_role_string_with_gemini
+                    identified_role = await extract_role_string_with_gemini(
+                        prompt_text, temperature_value=temperature_value, role_names=role_names
+                    )
+        except Exception as e:
+            # One bad chunk (e.g. an unreadable cache file) must not cancel the others,
+            # and it still has to be released so the chunks after it get written.
+            print(f"Error getting the role for chunk {chunk_index}: {e}")
+            identified_role = None
+        set_role(chunk_index, identified_role if identified_role is not None else "", outfile)
+
+    async def fill_group(group_prompt, members):
+        # Groups are formed from every role-less chunk so their prompts stay the same
+        # (and cached) across runs; only members still unanswered are filled in here.
+        unanswered = [(chunk_index, chunk_id) for chunk_index, chunk_id in members if chunk_index in prompt_by_index]
+        if not unanswered:
+            return
+        try:
+            async with semaphore:
+                roles_by_id = await extract_roles_for_group(
+                    group_prompt, [chunk_id for _, chunk_id in members], temperature_value, role_names
+                )
+        except Exception as e:
+            print(f"Error getting the roles for a group of {len(members)} chunks: {e}")
+            roles_by_id = {}
+        missed = []
+        for chunk_index, chunk_id in unanswered:
+            if chunk_id in roles_by_id:
+                set_role(chunk_index, roles_by_id[chunk_id], outfile)
+            else:
+                missed.append(chunk_index)
+        # Asked alone outside the group's semaphore slot, which fill_role takes itself.
+        # The semaphore, not the worker count, caps the calls in flight here.
+        await asyncio.gather(*(fill_role(chunk_index, prompt_by_index[chunk_index]) for chunk_index in missed))
+
+    # Work is handed out through a bounded queue to a fixed set of workers, so only
+    # O(MAX_CONCURRENT_REQUESTS) coroutines exist at once instead of one per chunk;
+    # each worker takes the next item as soon as its call finishes.
+    work_queue = asyncio.Queue(maxsize=2 * MAX_CONCURRENT_REQUESTS)
+    grouped_indexes = {chunk_index for _, members in groups for chunk_index, _ in members}
+
+    async def produce():
+        for group_prompt, members in groups:
+            await work_queue.put((fill_group, group_prompt, members))
+        for chunk_index, prompt_text in keyed_prompts:
+            if chunk_index not in grouped_indexes:
+                await work_queue.put((fill_role, chunk_index, prompt_text))
+        for _ in range(MAX_CONCURRENT_REQUESTS):
+            await work_queue.put(None) # One stop marker per worker
+
+    async def consume():
+        while (item := await work_queue.get()) is not None:
+            fill, *fill_args = item
+            await fill(*fill_args)
+
+    await asyncio.gather(produce(), *(consume() for _ in range(MAX_CONCURRENT_REQUESTS)))
+    if cheap_answered or escalated:
+        print(f"{CHEAP_MODEL_NAME} answered {cheap_answered} chunks; {escalated} "
+              f"({escalated / (cheap_answered + escalated):.0%}) were escalated to {MODEL_NAME}.")
+
+
+def map_text_file(file_path):
+    """
+    Memory-maps a file read-only so it can be scanned without reading it into memory.
+    Raises FileNotFoundError like open(); an empty file gives b"" (mmap refuses those).
+    """
+    with open(file_path, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return b""
+
+def iter_json_chunks(buf):
+    """
+    Yields each JSON chunk in a chunks file with its parsed object. Chunks are objects
+    whose opening brace starts a line; anything between them ("---" separators,
+    blank lines) is skipped. Only the bytes from one chunk start to the next are
+    decoded, and each object is scanned by a C JSON decoder (orjson when installed,
+    else the stdlib's), so braces inside string values are handled correctly.
+
+    Args:
+        buf (bytes or mmap.mmap): The contents of the chunks file as UTF-8 bytes.
+
+    Yields:
+        tuple: (text of one complete JSON object, the dict it decodes to). The object is
+               the one the decoder built while finding the chunk's end, so no chunk is
+               parsed twice.
+    """
+    decoder = json.JSONDecoder()
+    starts = [match.end() - 1 for match in CHUNK_START_PATTERN.finditer(buf)]
+    starts.append(len(buf))
+    i = 0
+    while i < len(starts) - 1:
+        start = starts[i]
+        if USE_ORJSON:
+            # Usually the slice up to the next start is one object plus a separator, so
+            # it is cut at its last '}' and handed to orjson as bytes. Anything that is
+            # not exactly one object there takes the raw_decode path below.
+            object_end = buf.rfind(b"}", start, starts[i + 1]) + 1
+            object_bytes = buf[start:object_end]
+            try:
+                chunk = orjson.loads(object_bytes)
+            except orjson.JSONDecodeError:
+                pass
+            else:
+                yield object_bytes.decode('utf-8'), chunk
+                i += 1
+                continue
+        # Usually the object ends before the next line-start '{'. If it is cut short
+        # there (an inner object opening a line), the slice is widened by a doubling
+        # number of starts, so a long object is re-decoded O(log k) times, not O(k).
+        next_i, step = i + 1, 1
+        while True:
+            text = buf[start:starts[next_i]].decode('utf-8', errors='replace')
+            try:
+                chunk, end = decoder.raw_decode(text)
+            except json.JSONDecodeError as e:
+                if e.pos >= len(text.rstrip()) and next_i < len(starts) - 1:
+                    next_i, step = min(next_i + step, len(starts) - 1), step * 2
+                    continue
+                print(f"Warning: Skipping a potentially corrupted chunk ({e}).")
+                next_i = i + 1 # Resume at the next line that opens an object
+                break
+            yield text[:end], chunk
+            # Resume at the first line-start '{' after the object. Its byte offset comes
+            # from the text after it (normally an ASCII "---" separator), so the chunk is
+            # not encoded back to bytes just to measure it.
+            tail = text[end:]
+            object_end = starts[next_i] - len(tail) if tail.isascii() else start + len(text[:end].encode('utf-8'))
+            next_i = bisect_left(starts, object_end, i + 1, len(starts) - 1)
+            break
+        i = next_i
+
+def iter_chunk_windows(raw_chunks, context_window_size=CONTEXT_WINDOW_SIZE):
+    """
+    Pairs each chunk with its neighbours as the chunks stream in, holding only
+    2 * context_window_size + 1 of them at a time instead of the whole file.
+
+    Args:
+        raw_chunks (iterable): Each chunk (e.g. its text and parsed object), in file order.
+        context_window_size (int): How many chunks either side are wanted as context.
+
+    Yields:
+        tuple: (index, chunk, preceding, succeeding), where preceding and
+               succeeding are lists of (index, chunk) pairs.
+    """
+    window = deque(maxlen=2 * context_window_size + 1)
+
+    def centred(index):
+        pos = index - window[0][0]
+        items = list(window)
+        return (index, items[pos][1], items[max(0, pos - context_window_size):pos],
+                items[pos + 1:pos + 1 + context_window_size])
+
+    last_index = -1
+    for last_index, chunk in enumerate(raw_chunks):
+        window.append((last_index, chunk))
+        # The chunk context_window_size back now has all of its succeeding context
+        if last_index >= context_window_size:
+            yield centred(last_index - context_window_size)
+    for index in range(max(0, last_index - context_window_size + 1), last_index + 1):
+        yield centred(index)
+
+
+def finished_role_key(chunk_id, chunk_text):
+    """
+    Key a finished role is stored under: the chunk id and a SHA-256 of the chunk's
+    text, so a role is only reused for a chunk whose text is unchanged (not for a
+    re-chunked or different input written to the same output file).
+    """
+    return chunk_id, hashlib.sha256(chunk_text.encode('utf-8')).digest()
+
+def load_finished_roles(output_file_path):
+    """
+    Reads the roles a previous run already wrote to an output file (or to the
+    temporary file a run that stopped early left behind), so a rerun only sends the
+    chunks that are still missing one.
+
+    Args:
+        output_file_path (str): The output file of an earlier run (it may not exist).
+
+    Returns:
+        dict: finished_role_key(chunk id, chunk text) -> role, for every chunk written
+              with a real role. Chunks that came back as "Role not found" (an API error)
+              are left out so they are retried.
+    """
+    try:
+        buf = map_text_file(output_file_path)
+    except FileNotFoundError:
+        return {}
+
+    finished_roles = {}
+    for _, chunk in iter_json_chunks(buf):
+        role = chunk.get("role")
+        if "id" in chunk and role and role != "Role not found":
+            finished_roles[finished_role_key(chunk["id"], chunk.get("text", ""))] = role
+    if isinstance(buf, mmap.mmap):
+        buf.close()
+    return finished_roles
 
 
 # CHANGED: Added model_temperature parameter
-def process_file_and_extract_roles(input_file_path, output_file_path, system_prompt_path, roles_data_path, model_temperature):
+def process_file_and_extract_roles(input_file_path, output_file_path, system_prompt_path, roles_data_path, model_temperature,
+                                   pretty_output=False):
     """
     Reads the input file, extracts JSON chunks, finds roles using Gemini,
     updates the 'role' field, and writes to an output file.
@@ -106,62 +1149,36 @@ def process_file_and_extract_roles(input_file_path, output_file_path, system_pro
         system_prompt_path (str): Path to the system prompt text file.
         roles_data_path (str): Path to the roles data JSON file.
         model_temperature (float): The temperature setting for the Gemini model.
+        pretty_output (bool): Indent each chunk instead of writing NDJSON (one compact
+                              object per line).
     """
-    all_chunks_raw_str = [] # NEW: Store all raw chunk strings for context
     updated_chunks = []
     
     # Load roles data and system prompt template once
     roles_data = load_roles_data(roles_data_path)
     system_prompt_template = load_system_prompt_template(system_prompt_path)
-    formatted_roles_list = format_roles_for_prompt(roles_data) # NEW: Format roles once
+    role_names = get_role_names(roles_data) if ROLE_ANSWER_BY_INDEX else None
+    role_matcher = build_role_matcher(roles_data) if LOCAL_ROLE_MATCHING else None
+    known_roles = {term for term_and_name in iter_role_terms(roles_data) for term in term_and_name}
     
     if not roles_data or not system_prompt_template:
         print("Failed to load necessary data (roles or system prompt). Exiting.")
         return
 
-    # First pass: Read all chunks and store them. This is necessary to get preceding/succeeding context.
-    current_chunk_str_builder = [] # Use a list for efficient string building
-    brace_count = 0
-    in_chunk = False
-    try:
-        with open(input_file_path, 'r', encoding='utf-8') as infile:
-            for line_num, line in enumerate(infile, 1): # NEW: track line_num for better error messages
-                stripped_line = line.strip()
-
-                if not stripped_line or stripped_line.startswith("---"):
-                    if in_chunk: # If we were in a chunk and hit an empty line or separator, finalize the current chunk
-                        # This means a malformed chunk or unexpected separator inside
-                        print(f"Warning: At file line {line_num}: Encountered separator or empty line '{stripped_line}' inside a JSON chunk. Skipping this potentially corrupted chunk.")
-                        current_chunk_str_builder = []  # Reset current chunk string
-                        in_chunk = False
-                        brace_count = 0
-                    continue # Skip this line
-
-                # If we encounter a '{' at the start of a line and not currently in a chunk, it's a new chunk
-                if stripped_line == "{":
-                    if in_chunk: # If we see '{' but already in a chunk, previous chunk was malformed
-                         print(f"Warning: At file line {line_num}: Encountered new chunk start '{{' before previous chunk completed. Skipping previous malformed chunk.")
-                         current_chunk_str_builder = []
-                         brace_count = 0 # Reset brace count for the new chunk
-                    
-                    in_chunk = True
-                    brace_count += 1
-                    current_chunk_str_builder.append(stripped_line)
-                elif in_chunk:
-                    current_chunk_str_builder.append(stripped_line)
-                    if stripped_line == "}":
-                        brace_count -= 1
-                        if brace_count == 0:
-                            # End of a chunk detected
-                            full_chunk_str = "\n".join(current_chunk_str_builder)
-                            all_chunks_raw_str.append(full_chunk_str) # Store raw string for later
-                            current_chunk_str_builder = [] # Reset for next chunk
-                            in_chunk = False
-                            
-                    else: # Ensure we count braces for lines that are not '{' or '}' but are part of the chunk
-                        brace_count += stripped_line.count('{')
-                        brace_count -= stripped_line.count('}')
+    # NEW: The instructions and roles list are formatted once and lead every prompt byte-for-byte
+    prompt_prefix = build_prompt_prefix(system_prompt_template, roles_data)
 
+    # Roles written by an earlier run are reused. A run that stopped early leaves its
+    # partial output in a "<output>.*.tmp" file instead of the output file, so those
+    # are read too, oldest first so newer roles win. They are kept until a run finishes.
+    leftover_tmp_paths = glob.glob(glob.escape(output_file_path) + ".*.tmp")
+    finished_roles = {}
+    for path in sorted(leftover_tmp_paths + [output_file_path],
+                       key=lambda path: os.path.getmtime(path) if os.path.exists(path) else 0):
+        finished_roles.update(load_finished_roles(path))
+
+    try:
+        buf = map_text_file(input_file_path)
     except FileNotFoundError:
         print(f"Error: Input file not found at {input_file_path}")
         return
@@ -169,106 +1186,251 @@ def process_file_and_extract_roles(input_file_path, output_file_path, system_pro
         print(f"An error occurred during initial file read: {e}")
         return
 
-    # Second pass: Process each stored chunk for role extraction
-    for i, raw_chunk_str in enumerate(all_chunks_raw_str):
+    # Build the prompt for each chunk as the file is scanned; only a window of
+    # neighbouring chunks is kept for the context. Role-less chunks are collected so
+    # they can be sent together.
+    pending_prompts = [] # (index into updated_chunks, prompt text)
+    cheap_first_indexes = set() # Short chunks, tried on CHEAP_MODEL_NAME first
+    first_index_by_text = {} # chunk_dedup_key() -> index of the chunk whose prompt is sent
+    duplicate_indexes = defaultdict(list) # That index -> later chunks with the same key
+    already_roled = 0 # Chunks whose role was already filled in the input
+    resumed = 0 # Chunks that take the role an earlier run wrote for the same text
+    local_matches = 0 # Role-less chunks that opened with their only known role
+    local_misses = 0 # Role-less chunks that named none or several, left for Gemini
+    group_parts = {} # Index -> (chunk id, context lines, compact chunk JSON), for group prompts
+    # Each neighbour's context text is shortened and formatted once, when a chunk near
+    # it first needs it, and dropped once it leaves the window.
+    context_tails = {} # Chunk index -> format_context_tail()
+
+    def context_tail(index, chunk):
+        if index not in context_tails:
+            context_tails[index] = format_context_tail(index, chunk)
+        return context_tails[index]
+
+    # Each chunk is parsed once, by the scanner; the window holds (text, dict) pairs
+    for i, (raw_chunk_str, chunk_data), preceding_chunks, succeeding_chunks in iter_chunk_windows(iter_json_chunks(buf)):
+        context_tails.pop(i - CONTEXT_WINDOW_SIZE - 1, None)
         try:
-            chunk_data = json.loads(raw_chunk_str)
             chunk_id = chunk_data.get("id", "No ID")
-
-            # NEW: Prepare context for Gemini
-            context_chunks_texts = []
-            
-            # Add preceding chunks (e.g., 2 chunks before)
-            # You can adjust `context_window_size` to control how many chunks are included for context
-            context_window_size = 2 
-            for j in range(max(0, i - context_window_size), i):
-                try:
-                    # Attempt to parse context chunk to get its 'text' field
-                    context_chunk_obj = json.loads(all_chunks_raw_str[j])
-                    context_text = context_chunk_obj.get("text", "")
-                    if context_text:
-                        context_chunks_texts.append(f"Preceding Chunk {context_chunk_obj.get('id', j)}: {context_text}")
-                except json.JSONDecodeError:
-                    context_chunks_texts.append(f"Preceding Chunk {j}: (Malformed/Unparsable)")
-            
-            # Add current chunk's text (if 'role' is empty)
             current_text = chunk_data.get("text", "")
-            if current_text:
-                context_chunks_texts.append(f"Current Chunk {chunk_id}: {current_text}")
 
-            # Add succeeding chunks (e.g., 2 chunks after)
-            for j in range(i + 1, min(len(all_chunks_raw_str), i + 1 + context_window_size)):
-                try:
-                    context_chunk_obj = json.loads(all_chunks_raw_str[j])
-                    context_text = context_chunk_obj.get("text", "")
-                    if context_text:
-                        context_chunks_texts.append(f"Succeeding Chunk {context_chunk_obj.get('id', j)}: {context_text}")
-                except json.JSONDecodeError:
-                    context_chunks_texts.append(f"Succeeding Chunk {j}: (Malformed/Unparsable)")
-            
-            # Construct the full prompt for Gemini with context
-            # CHANGED: The prompt structure to include context and then the specific chunk to analyze
-            full_gemini_prompt = f"""
-{system_prompt_template.replace("<ROLES_LIST>", formatted_roles_list)}
-
-Consider the following contextual information from surrounding document chunks:
---- START CONTEXT ---
-{"" if not context_chunks_texts else "\\n".join(context_chunks_texts)}
---- END CONTEXT ---
-
-Now, process the following specific JSON chunk to extract its role, filling the 'role' field if empty.
-Specific JSON Chunk to Analyze:
-{raw_chunk_str}
-"""
+            # A role from an earlier run, if this chunk's text is unchanged since then
+            finished_role = finished_roles.get(finished_role_key(chunk_id, current_text)) if finished_roles else None
 
-            # Check if the 'role' field is empty
-            if not chunk_data.get("role"):
-                # CHANGED: Pass model_temperature to extract_role_string_with_gemini
-                identified_role = extract_role_string_with_gemini(full_gemini_prompt, roles_data, temperature_value=model_temperature) 
-                
-                # Update the 'role' field in the dictionary
-                chunk_data["role"] = identified_role
+            # Check if the 'role' field is empty. The context and prompt are only built
+            # for chunks that are actually sent to Gemini.
+            if chunk_data.get("role"):
+                already_roled += 1 # Its role is read straight from the parsed chunk
+            elif finished_role is not None:
+                chunk_data["role"] = finished_role
+                resumed += 1
             else:
-                print(f"Chunk ID: {chunk_id} already has a role. Skipping API call.")
+                local_role = match_role_locally(role_matcher, current_text)
+                if local_role:
+                    chunk_data["role"] = local_role
+                    local_matches += 1
+                else:
+                    local_misses += 1
+                    text_key = chunk_dedup_key(
+                        current_text,
+                        [context_chunk for _, (_, context_chunk) in preceding_chunks],
+                        [context_chunk for _, (_, context_chunk) in succeeding_chunks]
+                    ) if DEDUPLICATE_CHUNK_TEXT and current_text.strip() else None
+                    if text_key in first_index_by_text:
+                        duplicate_indexes[first_index_by_text[text_key]].append(len(updated_chunks))
+                    else:
+                        if text_key is not None:
+                            first_index_by_text[text_key] = len(updated_chunks)
+                        # NEW: Prepare context for Gemini
+                        context_chunks_texts = build_context_lines(
+                            chunk_id, current_text,
+                            [context_tail(j, context_chunk) for j, (_, context_chunk) in preceding_chunks],
+                            [context_tail(j, context_chunk) for j, (_, context_chunk) in succeeding_chunks]
+                        )
+                        # The chunk goes into the prompt as compact JSON: the input file's
+                        # indentation would only add billed tokens
+                        compact_chunk_str = dumps_chunk(chunk_data).decode('utf-8')
+                        # CHANGED: The prompt structure to include context and then the specific chunk to analyze
+                        # Only the part after the shared prefix varies per chunk.
+                        full_gemini_prompt = build_chunk_prompt(prompt_prefix, context_chunks_texts, compact_chunk_str)
+                        pending_prompts.append((len(updated_chunks), full_gemini_prompt))
+                        group_parts[len(updated_chunks)] = (chunk_id, context_chunks_texts, compact_chunk_str)
+                        if len(current_text) < CHEAP_MODEL_MAX_TEXT_CHARS:
+                            cheap_first_indexes.add(len(updated_chunks))
 
             updated_chunks.append(chunk_data)
 
-        except json.JSONDecodeError as e:
-            print(f"--- JSON DECODE ERROR during processing ---")
-            print(f"Error: {e}")
-            print(f"Problematic chunk content (during 2nd pass, line {e.lineno}, char {e.pos}):\n{raw_chunk_str}")
-            print(f"--- END ERROR CHUNK ---")
-            continue 
         except Exception as e:
             print(f"An unexpected error occurred while processing chunk {chunk_id}: {e}\nChunk content:\n{raw_chunk_str}")
             continue
-    
-    # Write updated chunks to the output file
+    if isinstance(buf, mmap.mmap):
+        buf.close()
+    if already_roled:
+        print(f"{already_roled} chunks already have a role in the input. Skipping their API calls.")
+    if resumed:
+        print(f"Resuming: {resumed} chunks already have a role in '{output_file_path}' "
+              f"or its leftover temporary files.")
+    if role_matcher is not None and (local_matches or local_misses):
+        print(f"Matched {local_matches} role-less chunks to a role locally; {local_misses} "
+              f"({local_misses / (local_matches + local_misses):.0%}) are left for Gemini.")
+
+    # Third pass: Fill in the missing roles and stream each chunk to a temporary file
+    # as soon as it and every chunk before it are final, so a crash keeps the roles
+    # already paid for. The temporary file replaces the output file once every chunk
+    # is written, so the previous output survives until then. Prompts answered on an
+    # earlier run come from the role cache; with --batch, the rest go out as one batch
+    # job when there are enough of them.
+    waiting_indexes = {chunk_index for chunk_index, _ in pending_prompts}
+    waiting_indexes.update(index for indexes in duplicate_indexes.values() for index in indexes)
+    if duplicate_indexes:
+        print(f"{len(waiting_indexes) - len(pending_prompts)} chunks repeat the text and context of another chunk "
+              f"and will reuse its role.")
+    next_write_index = 0
+    written_since_sync = 0
+
+    def write_ready_chunks(outfile):
+        nonlocal next_write_index, written_since_sync
+        ready = []
+        while next_write_index < len(updated_chunks) and next_write_index not in waiting_indexes:
+            ready.append(dumps_chunk(updated_chunks[next_write_index], pretty_output))
+            updated_chunks[next_write_index] = None # Written; nothing else needs it
+            next_write_index += 1
+        if not ready:
+            return
+        # One write per run of ready chunks, into the buffered file
+        ready.append(b"")
+        outfile.write(b"\n".join(ready))
+        written_since_sync += len(ready) - 1
+        if written_since_sync >= OUTPUT_FSYNC_EVERY_CHUNKS:
+            outfile.flush()
+            os.fsync(outfile.fileno())
+            written_since_sync = 0
+
+    def set_role(chunk_index, role, outfile):
+        for index in (chunk_index, *duplicate_indexes.get(chunk_index, ())):
+            updated_chunks[index]["role"] = role
+            waiting_indexes.discard(index)
+        if outfile is not None: # None until the output file is opened
+            write_ready_chunks(outfile)
+
+    tmp_output_path = None
     try:
-        with open(output_file_path, 'w', encoding='utf-8') as outfile:
-            for chunk in updated_chunks:
-                outfile.write(json.dumps(chunk, indent=4) + "\n") 
+        # Cached roles and the Batch Mode job are settled before the temporary file is
+        # opened, so chunks only wait there on the synchronous calls.
+        uncached_prompts = []
+        for chunk_index, prompt_text in pending_prompts:
+            cached_role = None
+            # Short chunks were answered by CHEAP_MODEL_NAME, and cached under it, whenever
+            # it gave a known role; otherwise they were escalated to MODEL_NAME.
+            if CHEAP_MODEL_NAME and chunk_index in cheap_first_indexes:
+                cached_role = get_cached_role(prompt_text, model_temperature, CHEAP_MODEL_NAME)
+                if cached_role not in known_roles:
+                    cached_role = None
+            if cached_role is None:
+                cached_role = get_cached_role(prompt_text, model_temperature)
+            if cached_role is None:
+                uncached_prompts.append((chunk_index, prompt_text))
+            else:
+                set_role(chunk_index, cached_role, None)
+
+        # Groups are formed from every pending chunk, so they match across runs and paths
+        groups = build_prompt_groups(pending_prompts, group_parts, prompt_prefix)
+        batch_roles = {}
+        if USE_BATCH_MODE and len(uncached_prompts) >= BATCH_MODE_MIN_REQUESTS:
+            uncached_indexes = {chunk_index for chunk_index, _ in uncached_prompts}
+            batch_groups = [
+                (group_prompt, [(str(chunk_index), chunk_id) for chunk_index, chunk_id in members])
+                for group_prompt, members in groups
+                if all(chunk_index in uncached_indexes for chunk_index, _ in members)
+            ]
+            batch_roles = extract_roles_with_batch_mode(
+                [(str(chunk_index), prompt_text) for chunk_index, prompt_text in uncached_prompts], model_temperature,
+                role_names, batch_groups
+            )
+        unanswered_prompts = []
+        for chunk_index, prompt_text in uncached_prompts:
+            identified_role = batch_roles.get(str(chunk_index))
+            if identified_role is None:
+                unanswered_prompts.append((chunk_index, prompt_text))
+            else:
+                cache_role(prompt_text, model_temperature, identified_role)
+                # Update the 'role' field in the dictionary
+                set_role(chunk_index, identified_role, None)
+
+        tmp_output_path = f"{output_file_path}.{os.getpid()}.tmp"
+        with open(tmp_output_path, 'wb', buffering=OUTPUT_BUFFER_BYTES) as outfile:
+            write_ready_chunks(outfile)
+
+            # Synchronous path (small runs, or requests the batch did not return), with the
+            # calls overlapped as coroutines
+            if unanswered_prompts:
+                create_prefix_cache(prompt_prefix)
+                try:
+                    run_async(fill_roles_concurrently(unanswered_prompts, model_temperature, outfile, set_role,
+                                                      cheap_first_indexes, known_roles, role_names, groups))
+                finally:
+                    delete_prefix_cache()
+
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(tmp_output_path, output_file_path)
+        # Every role in the leftovers was read into this output
+        for path in leftover_tmp_paths:
+            if path != tmp_output_path:
+                os.remove(path)
         print(f"\nProcessing complete. Updated data saved to '{output_file_path}'")
     except Exception as e:
         print(f"Error writing to output file: {e}")
+        if tmp_output_path and os.path.exists(tmp_output_path):
+            print(f"The chunks written so far are in '{tmp_output_path}'; the next run reuses their roles.")
 
 
 # --- Main execution ---
 if __name__ == "__main__":
-   
-
-    input_file_path = 'parsed_document_chunks copy.txt' 
-    output_file_path = 'updated_parsed_document_chunks.txt' 
-    roles_data_path = 'roles.json' 
-    system_prompt_path = 'system_prompt.txt' 
-    
-    # NEW: Define the desired temperature
+    # NEW: Paths, model and temperature come from the command line; the defaults are
+    # the file names this script has always used.
+    parser = argparse.ArgumentParser(description="Fills in the empty 'role' field of each chunk using Gemini.")
+    parser.add_argument("--input", default='parsed_document_chunks copy.txt', help="Chunks file from 1.5buildingChunks.py")
+    parser.add_argument("--output", default='updated_parsed_document_chunks.txt', help="Where the updated chunks are written")
+    parser.add_argument("--roles", default='roles.json', help="Roles data JSON file")
+    parser.add_argument("--system-prompt", default='system_prompt.txt', help="System prompt template")
+    parser.add_argument("--model", default=MODEL_NAME, help="Gemini model for the per-chunk calls and Batch Mode")
     # For role extraction, a low temperature (e.g., 0.0 to 0.3) is usually best for precision.
-    model_temperature = 0.2 
+    parser.add_argument("--temperature", type=float, default=0.2, help="Model temperature")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENT_REQUESTS,
+                        help="Most Gemini requests in flight at once")
+    parser.add_argument("--pretty", action="store_true", help="Indent each chunk instead of writing NDJSON")
+    parser.add_argument("--batch", action="store_true",
+                        help=f"Send role-less chunks as one Gemini Batch Mode job (half price, but it can take up "
+                             f"to 24 hours) when there are at least {BATCH_MODE_MIN_REQUESTS}; needs google-genai")
+    parser.add_argument("--local-match", action="store_true",
+                        help="Give a chunk the role its text opens with (e.g. \"The CFM will ...\") when it names "
+                             "no other role, instead of asking Gemini")
+    parser.add_argument("--create-dummy", action="store_true",
+                        help="Write a small demonstration chunks file to --input if it does not exist")
+    args = parser.parse_args()
+
+    if args.model != MODEL_NAME:
+        MODEL_NAME = args.model
+        models_by_name[MODEL_NAME] = genai.GenerativeModel(MODEL_NAME)
+    if args.concurrency != MAX_CONCURRENT_REQUESTS:
+        MAX_CONCURRENT_REQUESTS = max(1, args.concurrency)
+        sync_call_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_REQUESTS, thread_name_prefix="gemini")
+
+    if args.batch:
+        if USE_GENAI_CLIENT:
+            USE_BATCH_MODE = True
+        else:
+            print("Warning: --batch needs the google-genai package; sending every chunk synchronously.")
+
+    if args.local_match:
+        LOCAL_ROLE_MATCHING = True
+
+    input_file_path = args.input
+    output_file_path = args.output
 
     # dummy data creation for demonstration purposes
-    # Check if the input file exists, if not, create a dummy file for demonstration
-    if not os.path.exists(input_file_path):
+    if args.create_dummy and not os.path.exists(input_file_path):
         print(f"Creating a dummy file '{input_file_path}' for demonstration.")
         dummy_content = """
 {
@@ -357,9 +1519,10 @@ if __name__ == "__main__":
         print("Dummy file created. You can replace its content with your actual data.")
 
 
-   # Run the processing
+    # Run the processing
     # CHANGED: Pass model_temperature to process_file_and_extract_roles
-    process_file_and_extract_roles(input_file_path, output_file_path, system_prompt_path, roles_data_path, model_temperature=model_temperature) 
+    process_file_and_extract_roles(input_file_path, output_file_path, args.system_prompt, args.roles, model_temperature=args.temperature,
+                                   pretty_output=args.pretty)
 
     
     print(f"\n--- Content of '{output_file_path}' ---")
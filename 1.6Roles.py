@@ -1,5 +1,53 @@
+import mmap
 import re
-import json
+import json # Fallback JSON encoder when orjson is not installed
+
+try:
+    import orjson
+    USE_ORJSON = True
+except ImportError:
+    USE_ORJSON = False
+
+# The chapter bounds are found on the raw bytes of the mapped file, so only Chapter 2
+# is ever decoded. The heading is "Chapter 2", whitespace, "ROLES AND RESPONSIBILITIES",
+# and the chapter runs from there to the next "Chapter 3".
+CHAPTER_2_MARKER = b"Chapter 2"
+ROLES_HEADING = b"ROLES AND RESPONSIBILITIES"
+CHAPTER_3_MARKER = b"Chapter 3"
+# Compiled once at import; extract_roles_and_responsibilities() only runs them.
+# An ASCII byte that is not whitespace, so a gap holding one can't be the heading's \s+
+# (only gaps of whitespace and non-ASCII bytes are decoded to check for Unicode spaces).
+NON_SPACE_ASCII_PATTERN = re.compile(rb"[^\s\x80-\xff]")
+# One numbered heading line ("2.2.1. Title") and the body up to the next heading, so
+# each section comes out of a single finditer pass instead of a split list. The number
+# is its own group, so the title needs no separate pass to remove it.
+SECTION_PATTERN = re.compile(r"\n(?P<number>2\.(?:\d\.)+)(?P<title>[^\n]*)(?P<body>.*?)(?=\n2\.\d\.|\Z)", re.DOTALL)
+
+def find_chapter_2(text):
+    """
+    Finds the content of Chapter 2 (after its heading, up to "Chapter 3").
+
+    Args:
+        text (bytes or mmap.mmap): The full text as UTF-8 bytes.
+
+    Returns:
+        str: The decoded chapter content, or None if the chapter was not found.
+    """
+    marker_start = text.find(CHAPTER_2_MARKER)
+    while marker_start != -1:
+        marker_end = marker_start + len(CHAPTER_2_MARKER)
+        heading_start = text.find(ROLES_HEADING, marker_end)
+        if heading_start == -1:
+            return None
+        gap = text[marker_end:heading_start]
+        if gap and not NON_SPACE_ASCII_PATTERN.search(gap) and gap.decode('utf-8').isspace():
+            heading_end = heading_start + len(ROLES_HEADING)
+            chapter_end = text.find(CHAPTER_3_MARKER, heading_end)
+            if chapter_end == -1:
+                return None
+            return text[heading_end:chapter_end].decode('utf-8')
+        marker_start = text.find(CHAPTER_2_MARKER, marker_end)
+    return None
 
 def extract_roles_and_responsibilities(input_file_path):
     """
@@ -14,46 +62,37 @@ def extract_roles_and_responsibilities(input_file_path):
     """
     roles_dict = {}
     try:
-        # Open the file with UTF-8 encoding to handle special characters
-        with open(input_file_path, 'r', encoding='utf-8') as file:
-            full_content = file.read()
-
-        # 1. Isolate the content of Chapter 2 to prevent reading into other sections
-        chapter_2_match = re.search(r"Chapter 2\s+ROLES AND RESPONSIBILITIES(.*?)(?=Chapter 3)", full_content, re.DOTALL)
-        if not chapter_2_match:
+        # Map the file instead of reading it. 1. Isolate the content of Chapter 2 to
+        # prevent reading into other sections; only that part is decoded (as UTF-8, to
+        # handle special characters).
+        with open(input_file_path, 'rb') as file, \
+                mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as full_content:
+            content = find_chapter_2(full_content)
+        if content is None:
             print("Error: Could not find the 'Chapter 2 ROLES AND RESPONSIBILITIES' section.")
             return None
-        content = chapter_2_match.group(1)
 
-        # 2. Split the chapter into sections based on the numbered headings.
-        # This pattern splits the text but keeps the heading as a separate item in the list.
-        sections = re.split(r'(\n2\.(?:\d\.)+.*)', content)
-        
-        # The resulting list is [intro_text, heading1, content1, heading2, content2, ...].
-        # We iterate through this list, pairing each heading with its content.
-        # We start from index 1 because index 0 is any text before the first heading.
-        for i in range(1, len(sections), 2):
-            role_title_raw = sections[i].strip()
-            # Check if there is corresponding content for the heading
-            if (i + 1) < len(sections):
-                responsibility_raw = sections[i+1].strip()
-
-                # Filter out section titles that are just containers for sub-roles
-                # by checking if their content immediately starts with another section number.
-                if responsibility_raw.startswith('2.'):
-                    continue
-                    
-                # Clean the role title by removing the number prefix (e.g., "2.2.1.")
-                role = re.sub(r'^2\.(?:\d\.)+\s*', '', role_title_raw).strip()
-                if role.endswith('.'):
-                    role = role[:-1]
-                    
-                # Clean up the responsibility text
-                responsibility = responsibility_raw.replace('\n', ' ').strip()
-                
-                # Add the role and its responsibilities to the dictionary
-                if role and responsibility:
-                    roles_dict[role] = responsibility
+        # 2. Walk the chapter's numbered sections; each match pairs a heading with its
+        # content. Any text before the first heading is not part of a match.
+        for section in SECTION_PATTERN.finditer(content):
+            responsibility_raw = section.group('body').strip()
+
+            # Filter out section titles that are just containers for sub-roles
+            # by checking if their content immediately starts with another section number.
+            if responsibility_raw.startswith('2.'):
+                continue
+
+            # The role title is the heading without its number prefix (e.g., "2.2.1.")
+            role = section.group('title').strip()
+            if role.endswith('.'):
+                role = role[:-1]
+
+            # Clean up the responsibility text
+            responsibility = responsibility_raw.replace('\n', ' ').strip()
+
+            # Add the role and its responsibilities to the dictionary
+            if role and responsibility:
+                roles_dict[role] = responsibility
 
     except FileNotFoundError:
         print(f"Error: The file at {input_file_path} was not found.")
@@ -62,6 +101,9 @@ def extract_roles_and_responsibilities(input_file_path):
         print(f"Error decoding file: {e}")
         print("Please ensure the input file is saved with UTF-8 encoding.")
         return None
+    except ValueError: # mmap refuses empty files
+        print(f"Error: The file at {input_file_path} is empty.")
+        return None
         
     return roles_dict
 
@@ -81,9 +123,15 @@ def save_to_files(roles_dict, text_output_path, json_output_path):
                 file.write(f"Role: {role}\n")
                 file.write(f"Responsibilities: {responsibility}\n\n")
         
-        # Save to a JSON file for easy use in other programs
-        with open(json_output_path, 'w', encoding='utf-8') as file:
-            json.dump(roles_dict, file, indent=4, ensure_ascii=False)
+        # Save to a JSON file for easy use in other programs. orjson can only indent by
+        # two spaces, so its file is laid out differently from the stdlib's 4-space one;
+        # both hold the same data.
+        if USE_ORJSON:
+            with open(json_output_path, 'wb') as file:
+                file.write(orjson.dumps(roles_dict, option=orjson.OPT_INDENT_2))
+        else:
+            with open(json_output_path, 'w', encoding='utf-8') as file:
+                json.dump(roles_dict, file, indent=4, ensure_ascii=False)
             
         print(f"Successfully saved data to {text_output_path} and {json_output_path}")
 
@@ -1,45 +1,89 @@
+import sys
 import fitz  # PyMuPDF
-from typing import Optional
+from typing import Iterable, Iterator, List
+from extract_common import (MAX_EXTRACT_WORKERS, atomic_output, expand_pdf_paths, iter_page_ranges, run_many,
+                            sibling_output_paths)
 
-def extract_text_from_pdf(pdf_filepath: str) -> Optional[str]:
+OUTPUT_BUFFER_BYTES = 65536
+
+def extract_page_range(pdf_filepath: str, start: int, end: int) -> List[str]:
+    """
+    Extracts the text of each page in [start, end) from a PDF file.
+    Runs in a worker process, so it opens its own Document (they can't be pickled
+    or shared between threads).
+    """
+    with fitz.open(pdf_filepath) as doc:
+        return [page.get_text("text") for page in doc.pages(start, end)] # "text" for plain text extraction
+
+def iter_pdf_pages(pdf_filepath: str, max_workers: int = MAX_EXTRACT_WORKERS) -> Iterator[str]:
     """
-    Extracts all text content from a PDF file.
+    Yields the text of each page of a PDF file, in page order, as soon as its page
+    range is done instead of after the whole document (see iter_page_ranges).
 
     Args:
         pdf_filepath (str): The path to the PDF file.
+        max_workers (int): The most worker processes to use for this file.
 
-    Returns:
-        str: The extracted text content from all pages, or None if an error occurs.
+    Yields:
+        str: The extracted text of one page.
+
+    Raises:
+        Exception: Whatever opening or extracting the PDF raised.
     """
-    try:
-        doc = fitz.open(pdf_filepath)
-        full_text = []
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            full_text.append(page.get_text("text")) # "text" for plain text extraction
-        doc.close()
-        return "\n".join(full_text)
-    except FileNotFoundError:
-        print(f"Error: PDF file not found at {pdf_filepath}")
-        return None
-    except Exception as e:
-        print(f"Error extracting text from PDF: {e}")
-        return None
+    for pages in iter_page_ranges(pdf_filepath, extract_page_range, max_workers):
+        yield from pages
 
-def save_text_to_file(text_content: str, output_filepath: str) -> None:
+def save_pages(pages: Iterable[str], output_filepath: str) -> int:
     """
-    Saves the given text content to a specified file.
+    Writes pages to a file as they arrive, separated by newlines.
+    The file is written through atomic_output, so an error (from the pages or the
+    writing) leaves no partial file.
 
     Args:
-        text_content (str): The text content to save.
+        pages (Iterable[str]): The page texts to save.
         output_filepath (str): The path to the output text file.
+
+    Returns:
+        int: The number of pages written.
+
+    Raises:
+        Exception: Whatever the pages or the writing raised.
     """
+    page_total = 0
+    with atomic_output(output_filepath, encoding='utf-8', buffering=OUTPUT_BUFFER_BYTES) as file:
+        for page_total, page in enumerate(pages, 1):
+            if page_total > 1:
+                file.write("\n")
+            file.write(page)
+    print(f"Successfully saved extracted text to: {output_filepath}")
+    return page_total
+
+def run_one(pdf_path: str, output_txt_path: str, max_workers: int = MAX_EXTRACT_WORKERS) -> bool:
+    """
+    Extracts one PDF to a text file.
+
+    Args:
+        pdf_path (str): The path to the PDF file.
+        output_txt_path (str): The path to the output text file.
+        max_workers (int): The most worker processes to use for this file's pages.
+
+    Returns:
+        bool: True if any pages were extracted.
+    """
+    print(f"Attempting to extract text from: {pdf_path}")
+    # Pages are written as they are extracted instead of being joined in memory first
     try:
-        with open(output_filepath, 'w', encoding='utf-8') as file:
-            file.write(text_content)
-        print(f"Successfully saved extracted text to: {output_filepath}")
+        page_total = save_pages(iter_pdf_pages(pdf_path, max_workers), output_txt_path)
     except Exception as e:
-        print(f"Error saving text to file: {e}")
+        # Nothing was written, whether reading the PDF or writing the text failed
+        print(f"Error extracting {pdf_path} to {output_txt_path}: {e}")
+        page_total = 0
+
+    if page_total:
+        print(f"Successfully extracted {page_total} pages from {pdf_path}.")
+        return True
+    print(f"Failed to extract text from {pdf_path}.")
+    return False
 
 # --- How to use this PDF extraction and saving function ---
 
@@ -47,36 +91,33 @@ def save_text_to_file(text_content: str, output_filepath: str) -> None:
 # (e.g., from your_section_parser_module import extract_sections_from_text, SectionData)
 # Make sure the 'extract_sections_from_text' function and 'SectionData' Pydantic model
 # from our previous discussion are available if you intend to use them later.
+#
+# Run with no arguments to extract pdf_path below, or pass PDF paths or glob patterns
+# (e.g. python 1Extract_To_PDF.py "pdfs/*.pdf"). Several PDFs are extracted in
+# parallel, one per process, each to "<pdf name>_extracted_Text.txt" next to it.
 
 if __name__ == "__main__":
     pdf_path = "angi36-101.pdf"  # <--- CHANGE THIS TO YOUR PDF FILE'S PATH
     output_txt_path = "extracted_Text.txt" # Name of the output file
 
-    print(f"Attempting to extract text from: {pdf_path}")
-    extracted_pdf_text = extract_text_from_pdf(pdf_path)
-
-    if extracted_pdf_text:
-        print(f"Successfully extracted text from PDF. Total characters: {len(extracted_pdf_text)}")
-
-        # Save the extracted text to extracted_Text.txt
-        save_text_to_file(extracted_pdf_text, output_txt_path)
+    pdf_paths = expand_pdf_paths(sys.argv[1:], pdf_path)
 
-        # You can still print a sample if you like:
-        print("\nFirst 500 characters of extracted text (also saved to file):\n")
-        # print(extracted_pdf_text[:500] + "...")
-        # print("-" * 50)
+    if len(pdf_paths) == 1:
+        run_one(pdf_paths[0], output_txt_path)
 
-        # Now the 'extracted_pdf_text' variable holds the full text if you want to
-        # pass it to your section extraction function, or you can read it from 'extracted_Text.txt'
-        # in another step/script.
+        # Now 'extracted_Text.txt' holds the full text; read it back in another
+        # step/script to pass it to your section extraction function.
         # For example, to then process it for sections:
         #
-        # sections = extract_sections_from_text(extracted_pdf_text) # Assuming this function is defined
+        # with open(output_txt_path, encoding='utf-8') as f:
+        #     sections = extract_sections_from_text(f.read()) # Assuming this function is defined
         # if sections:
         #     # Process sections as before
         #     print(f"\nFound {len(sections)} sections in the extracted text.")
         # else:
         #     print("\nCould not extract structured sections from the PDF text.")
 
+    elif pdf_paths:
+        run_many(run_one, pdf_paths, sibling_output_paths(pdf_paths, output_txt_path))
     else:
-        print(f"Failed to extract text from {pdf_path}.")
\ No newline at end of file
+        print(f"No PDF files matched: {' '.join(sys.argv[1:])}")
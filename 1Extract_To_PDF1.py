@@ -1,29 +1,70 @@
-import re
+import hashlib
+import json
+import os
+import sys
+from contextlib import nullcontext
 import fitz  # PyMuPDF
-from typing import Optional, List
+from typing import Iterable, Iterator, List, Optional, Tuple
+from extract_common import (MAX_EXTRACT_WORKERS, atomic_output, expand_pdf_paths, iter_page_ranges, iter_section_texts,
+                            iter_whole_lines, run_many, sibling_output_paths)
 
-def extract_text_from_pdf(pdf_filepath: str) -> Optional[str]:
+TEXT_BLOCK_TYPE = 0 # get_text("blocks") type of a text block (1 is an image)
+# Set to True for multi-column PDFs: MuPDF then orders each page's blocks top to
+# bottom, left to right. Off by default, since it moves headers, footers and
+# sidebars on single-column pages like the ones this was written for.
+SORT_TEXT_BLOCKS = False
+
+OUTPUT_BUFFER_BYTES = 65536
+FINGERPRINT_CHUNK_BYTES = 1 << 20
+
+def extract_page_range(pdf_filepath: str, start: int, end: int) -> List[List[str]]:
     """
-    Extracts all text content from a PDF file.
+    Extracts the text blocks of each page in [start, end) from a PDF file.
+    Runs in a worker process, so it opens its own Document (they can't be pickled
+    or shared between threads).
+    Blocks keep MuPDF's reading order, so joined together they are exactly the
+    page's get_text("text") output, unless SORT_TEXT_BLOCKS reorders them by position.
+    """
+    with fitz.open(pdf_filepath) as doc:
+        return [
+            [block[4] for block in page.get_text("blocks", sort=SORT_TEXT_BLOCKS) if block[6] == TEXT_BLOCK_TYPE]
+            for page in doc.pages(start, end)
+        ]
+
+def iter_pdf_page_blocks(pdf_filepath: str, max_workers: int = MAX_EXTRACT_WORKERS) -> Iterator[List[str]]:
+    """
+    Yields the text blocks of each page of a PDF file, in page order, as soon as its
+    page range is done instead of after the whole document (see iter_page_ranges).
     Args:
         pdf_filepath (str): The path to the PDF file.
-    Returns:
-        str: The extracted text content from all pages, or None if an error occurs.
+        max_workers (int): The most worker processes to use for this file.
+    Yields:
+        list: The text blocks of one page.
+    Raises:
+        Exception: Whatever opening or extracting the PDF raised.
     """
-    try:
-        doc = fitz.open(pdf_filepath)
-        full_text = []
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            full_text.append(page.get_text("text")) # "text" for plain text extraction
-        doc.close()
-        return "\n".join(full_text)
-    except FileNotFoundError:
-        print(f"Error: PDF file not found at {pdf_filepath}")
-        return None
-    except Exception as e:
-        print(f"Error extracting text from PDF: {e}")
-        return None
+    for pages in iter_page_ranges(pdf_filepath, extract_page_range, max_workers):
+        yield from pages
+
+def iter_single_line_sections(pages: Iterable[List[str]]) -> Iterator[Tuple[Optional[str], str]]:
+    """
+    Reformats extracted pages so that each logical section (header + content)
+    becomes a single line by replacing internal newlines with spaces.
+    Sections are delimited by lines starting with patterns like X.Y.Z or AX.Y.Z,
+    and may run across page breaks (see extract_common.iter_section_texts).
+    Args:
+        pages (Iterable[List[str]]): The text blocks of each page, in order.
+    Yields:
+        tuple: (section number as matched by the header, e.g. "2.1.3.", or None for the
+               text before the first header, the section as a single line).
+    """
+    for section_number, section_text in iter_section_texts(iter_whole_lines(pages)):
+        single_line_section = section_text.replace("\n", " ").strip()
+        # Text before the very first recognized section header is kept as a line of
+        # its own (if no section markers are found, the whole text is one block);
+        # empty sections after that are skipped.
+        if single_line_section or (section_text and section_number is None):
+            yield section_number, single_line_section
 
 def reformat_raw_text_to_single_line_sections(raw_text: str) -> str:
     """
@@ -33,111 +74,137 @@ def reformat_raw_text_to_single_line_sections(raw_text: str) -> str:
     """
     if not raw_text:
         return ""
+    return "\n".join(single_line_section for _, single_line_section in iter_single_line_sections([[raw_text]]))
+
 
-    # This regex identifies the start of each section line (header).
-    # It's the same pattern used by your section parser for robust identification.
-    section_header_pattern = re.compile(
-        r"^(?:A\d{1,2}(?:\.\d{1,2}){1,3}\.?|\d{1,2}(?:\.\d{1,2}){1,3}\.?)\s*.*$",
-        re.MULTILINE
-    )
-    
-    reformatted_output_lines = []
-    last_split_point = 0
-    
-    matches = list(section_header_pattern.finditer(raw_text))
-    
-    if not matches:
-        # If no section markers are found, treat the whole text as one block
-        # or return it as is, or process it line by line if desired.
-        # For "append text till it finds the next...", if none found, implies one block.
-        return raw_text.replace('\n', ' ').strip()
-
-    for i, match in enumerate(matches):
-        # Determine the start of the current section's block
-        # This includes the header line itself
-        current_block_start = match.start()
-        
-        # Text before the very first recognized section header
-        if i == 0 and current_block_start > 0:
-            pre_section_text = raw_text[0:current_block_start]
-            # Decide how to handle pre-section text. For now, let's also make it a single line.
-            # Or you could choose to prepend it to the first section, or save it separately.
-            reformatted_output_lines.append(pre_section_text.replace('\n', ' ').strip())
-
-        # Determine the end of the current section's block
-        current_block_end = len(raw_text)
-        if i + 1 < len(matches):
-            current_block_end = matches[i+1].start()
-            
-        # Get the full text for the current section (header + its content)
-        section_text_block = raw_text[current_block_start:current_block_end]
-        
-        # Replace all internal newlines in this block with a space, then strip
-        single_line_section = section_text_block.replace('\n', ' ').strip()
-        
-        if single_line_section: # Avoid empty lines if a block was just whitespace
-            reformatted_output_lines.append(single_line_section)
-            
-    return "\n".join(reformatted_output_lines)
-
-
-def save_text_to_file(text_content: str, output_filepath: str) -> None:
+def text_file_fingerprint(filepath: str) -> dict:
     """
-    Saves the given text content to a specified file.
+    Returns the size and SHA-256 of a file's bytes. It ends the records file, so
+    "2EXTRACT_Text copy.py" only trusts records that came with the text file it has.
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as file:
+        for block in iter(lambda: file.read(FINGERPRINT_CHUNK_BYTES), b""):
+            digest.update(block)
+    return {"text_size": os.path.getsize(filepath), "text_sha256": digest.hexdigest()}
+
+def save_sections(sections: Iterable[Tuple[Optional[str], str]], output_filepath: str,
+                  records_filepath: Optional[str] = None) -> int:
+    """
+    Writes sections to a file as they arrive, one per line.
+    Optionally also writes each numbered section as a JSONL record (section_number,
+    section_title, content), the same fields "2EXTRACT_Text copy.py" parses out of the
+    text file, so it can load them directly instead of rescanning the text. The last
+    line of the records is the text file's fingerprint (see text_file_fingerprint).
+    Both are written through atomic_output, so an error (from the sections or the
+    writing) leaves no partial file. The text file is replaced first, so records
+    written alongside an older text file never match it.
     Args:
-        text_content (str): The text content to save.
+        sections (Iterable[tuple]): (section number or None, single-line section) pairs.
         output_filepath (str): The path to the output text file.
+        records_filepath (str, optional): The path to the output JSONL file.
+    Returns:
+        int: The number of sections written.
+    Raises:
+        Exception: Whatever the sections or the writing raised.
+    """
+    section_total = 0
+    with (atomic_output(records_filepath, encoding='utf-8', buffering=OUTPUT_BUFFER_BYTES)
+          if records_filepath else nullcontext()) as records_file:
+        with atomic_output(output_filepath, encoding='utf-8', buffering=OUTPUT_BUFFER_BYTES) as file:
+            for section_total, (section_number, single_line_section) in enumerate(sections, 1):
+                if section_total > 1:
+                    file.write("\n")
+                file.write(single_line_section)
+                if records_file is not None and section_number is not None:
+                    # The section line starts with its number; the rest is the content
+                    record = {
+                        "section_number": section_number.rstrip('.'),
+                        "section_title": "",
+                        "content": single_line_section[len(section_number):].strip(),
+                    }
+                    records_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        if records_file is not None:
+            records_file.write(json.dumps(text_file_fingerprint(output_filepath)) + "\n")
+    print(f"Successfully saved text to: {output_filepath}")
+    if records_filepath:
+        print(f"Successfully saved section records to: {records_filepath}")
+    return section_total
+
+def run_one(pdf_path: str, output_txt_path: str, output_records_path: Optional[str] = None,
+            max_workers: int = MAX_EXTRACT_WORKERS) -> bool:
+    """
+    Extracts one PDF to a file of single-line sections (and optionally JSONL records).
+    Args:
+        pdf_path (str): The path to the PDF file.
+        output_txt_path (str): The path to the output text file.
+        output_records_path (str, optional): The path to the output JSONL file.
+        max_workers (int): The most worker processes to use for this file's pages.
+    Returns:
+        bool: True if any sections were written.
     """
+    print(f"Attempting to extract raw text from: {pdf_path}")
+    # Pages are reformatted into single-line sections and written as they are
+    # extracted, so neither the raw nor the reformatted text is joined in memory
+    print("\nReformatting text for single-line sections...")
     try:
-        with open(output_filepath, 'w', encoding='utf-8') as file:
-            file.write(text_content)
-        print(f"Successfully saved text to: {output_filepath}")
+        section_total = save_sections(iter_single_line_sections(iter_pdf_page_blocks(pdf_path, max_workers)),
+                                      output_txt_path, output_records_path)
     except Exception as e:
-        print(f"Error saving text to file: {e}")
+        # Nothing was written, whether reading the PDF or writing the text failed
+        print(f"Error extracting {pdf_path} to {output_txt_path}: {e}")
+        section_total = 0
+
+    if section_total:
+        print(f"Successfully extracted {section_total} single-line sections from {pdf_path}.")
+        return True
+    print(f"Failed to extract text from {pdf_path}.")
+    return False
 
 # --- How to use the script ---
+# Run with no arguments to extract pdf_path below, or pass PDF paths or glob patterns
+# (e.g. python 1Extract_To_PDF1.py "pdfs/*.pdf"). Several PDFs are extracted in
+# parallel, one per process, each to "<pdf name>_extracted_Text.txt" (and
+# "<pdf name>_extracted_sections.jsonl") next to it.
 
 if __name__ == "__main__":
     pdf_path = "angi36-101.pdf"  # <--- CHANGE THIS TO YOUR PDF FILE'S PATH
     output_txt_path = "extracted_Text.txt" # Name of the output file
+    output_records_path = "extracted_sections.jsonl" # Parsed sections for "2EXTRACT_Text copy.py"
+
+    pdf_paths = expand_pdf_paths(sys.argv[1:], pdf_path)
+
+    if len(pdf_paths) == 1:
+        run_one(pdf_paths[0], output_txt_path, output_records_path)
 
-    print(f"Attempting to extract raw text from: {pdf_path}")
-    raw_extracted_pdf_text = extract_text_from_pdf(pdf_path)
-
-    if raw_extracted_pdf_text:
-        print(f"Successfully extracted raw text from PDF. Total characters: {len(raw_extracted_pdf_text)}")
-
-        # Reformat the raw text into single lines per section
-        print("\nReformatting text for single-line sections...")
-        reformatted_text_for_file = reformat_raw_text_to_single_line_sections(raw_extracted_pdf_text)
-        
-        # Save the REFORMATTED text to extracted_Text.txt
-        save_text_to_file(reformatted_text_for_file, output_txt_path)
-        
         # If you want to see a sample of the reformatted text:
         # print("\nFirst 500 characters of reformatted text (saved to file):\n")
-        # print(reformatted_text_for_file[:500] + "...")
+        # with open(output_txt_path, encoding='utf-8') as f:
+        #     print(f.read(500) + "...")
         # print("-" * 50)
 
         # IMPORTANT NOTE:
-        # The 'reformatted_text_for_file' now has each section as a single long line.
+        # 'extracted_Text.txt' now has each section as a single long line.
         # If you intend to use your *original* 'extract_sections_from_text' parser
         # (which expects titles on one line and content on potentially multiple subsequent lines)
         # on THIS reformatted text, it might not work as expected.
         # That parser would need to be adapted to handle input where entire sections are on single lines.
         #
         # If you still need the structured (number, title, multi-line content) output
-        # for the CSV, you should run the original section parser on the 'raw_extracted_pdf_text'.
+        # for the CSV, you should run the original section parser on the raw text from 1Extract_To_PDF.py.
         #
         # Example (if you have the original parser defined as extract_sections_from_text_original):
         #
         # from your_original_parser import extract_sections_from_text as extract_sections_from_text_original
-        # structured_sections = extract_sections_from_text_original(raw_extracted_pdf_text)
+        # structured_sections = extract_sections_from_text_original(raw_text)
         # if structured_sections:
         #     # Save structured_sections to CSV as before
         #     print(f"\nFound {len(structured_sections)} sections for structured output.")
         # else:
         #     print("\nCould not extract structured sections from the raw PDF text.")
 
+    elif pdf_paths:
+        run_many(run_one, pdf_paths, sibling_output_paths(pdf_paths, output_txt_path),
+                 sibling_output_paths(pdf_paths, output_records_path))
     else:
-        print(f"Failed to extract text from {pdf_path}.")
\ No newline at end of file
+        print(f"No PDF files matched: {' '.join(sys.argv[1:])}")
@@ -1,5 +1,8 @@
+import csv
+import hashlib
+import json
+import os
 import re
-import pandas as pd
 from typing import List, Optional
 
 # --- Pydantic Model (Optional) ---
@@ -16,6 +19,19 @@ except ImportError:
     USE_PYDANTIC = False
 # --- End Pydantic Model ---
 
+CSV_COLUMNS = ["section_number", "section_title", "content"]
+FINGERPRINT_CHUNK_BYTES = 1 << 20
+
+PAGE_MARKER = "--- PAGE "
+PAGE_MARKER_PATTERN = re.compile(r"--- PAGE \d+ ---\n?")
+# Regex to capture number, compiled once at import. The rest of the line is part of
+# the content, which simply starts where the number ends, so the pattern stops there
+# instead of also scanning the rest of the line.
+SECTION_HEADER_LINE_PATTERN = re.compile(
+    r"^(?P<number>(?:A\d{1,2}(?:\.\d{1,2}){1,3}\.?|\d{1,2}(?:\.\d{1,2}){1,3}\.?))",
+    re.MULTILINE
+)
+
 def read_text_from_file(filepath: str) -> Optional[str]:
     """Reads content from a text file."""
     # ... (same as before) ...
@@ -30,6 +46,46 @@ def read_text_from_file(filepath: str) -> Optional[str]:
         print(f"Error reading file: {e}")
         return None
 
+def text_file_fingerprint(filepath: str) -> dict:
+    """Returns the size and SHA-256 of a file's bytes, as 1Extract_To_PDF1.py records them."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as file:
+        for block in iter(lambda: file.read(FINGERPRINT_CHUNK_BYTES), b""):
+            digest.update(block)
+    return {"text_size": os.path.getsize(filepath), "text_sha256": digest.hexdigest()}
+
+def read_section_records(filepath: str, text_filepath: str) -> Optional[List]:
+    """
+    Reads the section records 1Extract_To_PDF1.py writes next to the text file
+    (one JSON object per line), so the text doesn't have to be scanned again.
+    Their last line is the fingerprint of the text file they were written with.
+    Returns None if the file can't be read or wasn't written with text_filepath's
+    current contents.
+    """
+    sections = []
+    fingerprint = None
+    try:
+        with open(filepath, 'r', encoding='utf-8') as file:
+            for line in file:
+                record = json.loads(line)
+                if "text_sha256" in record:
+                    fingerprint = record
+                    continue
+                sections.append(SectionData(**record) if USE_PYDANTIC else record)
+        # Checked after reading, since the fingerprint comes last; the size is compared
+        # first so a different file is usually rejected without being hashed
+        if fingerprint is None or fingerprint.get("text_size") != os.path.getsize(text_filepath) \
+                or fingerprint != text_file_fingerprint(text_filepath):
+            print(f"'{filepath}' was not written with the current '{text_filepath}'; scanning the text instead.")
+            return None
+        return sections
+    except FileNotFoundError:
+        print(f"Error: File not found at {filepath}")
+        return None
+    except Exception as e:
+        print(f"Error reading section records: {e}")
+        return None
+
 def extract_sections_from_text_content_starts_on_header_line(full_content_text: str) -> List:
     """
     Extracts sections. The 'content' starts on the same line as the section number,
@@ -39,16 +95,14 @@ def extract_sections_from_text_content_starts_on_header_line(full_content_text:
     if not full_content_text:
         return sections
 
-    cleaned_text = re.sub(r"--- PAGE \d+ ---\n?", "", full_content_text)
-
-    # Regex to capture number. The rest of the line will be part of the content.
-    # We capture the number, and then separately the rest of the line.
-    section_header_line_pattern = re.compile(
-        r"^(?P<number>(?:A\d{1,2}(?:\.\d{1,2}){1,3}\.?|\d{1,2}(?:\.\d{1,2}){1,3}\.?))(?P<first_line_of_content>.*?)$",
-        re.MULTILINE
-    )
+    # Text from PyMuPDF has no page markers, so the extra copy is only made when
+    # the substring search finds one
+    if PAGE_MARKER in full_content_text:
+        cleaned_text = PAGE_MARKER_PATTERN.sub("", full_content_text)
+    else:
+        cleaned_text = full_content_text
 
-    matches = list(section_header_line_pattern.finditer(cleaned_text))
+    matches = list(SECTION_HEADER_LINE_PATTERN.finditer(cleaned_text))
 
     if not matches:
         print("No section headers matching the refined numerical pattern found.")
@@ -56,22 +110,14 @@ def extract_sections_from_text_content_starts_on_header_line(full_content_text:
 
     for i, current_match in enumerate(matches):
         section_number_raw = current_match.group("number").strip().rstrip('.')
-        # The rest of the header line is now considered the beginning of the content
-        first_line_content = current_match.group("first_line_of_content").strip()
-
         # Determine where the full content block for this section ends
         content_block_end_index = len(cleaned_text)
         if i + 1 < len(matches):
             content_block_end_index = matches[i+1].start()
 
-        # The full content starts from the beginning of 'first_line_content' within the header match
+        # The full content starts right after the number on the header line
         # and goes up to the start of the next section.
-        # We need to reconstruct the content from current_match.start('first_line_of_content')
-        # relative to cleaned_text.
-
-        # The content for this section starts from where the title *would have* started
-        # on the header line.
-        content_start_for_this_section = current_match.start('first_line_of_content')
+        content_start_for_this_section = current_match.end('number')
         full_content_for_section = cleaned_text[content_start_for_this_section:content_block_end_index].strip()
         
         # In this model, the title is effectively empty or just the number itself if you prefer
@@ -104,9 +150,17 @@ def extract_sections_from_text_content_starts_on_header_line(full_content_text:
 # --- How to use the script ---
 if __name__ == "__main__":
     file_path = "extracted_Text.txt"
-    document_text = read_text_from_file(file_path)
+    records_path = "extracted_sections.jsonl" # Written by 1Extract_To_PDF1.py alongside the text
 
-    if document_text:
+    # Fast path: when the records were written with this exact text file (their
+    # fingerprint matches it), the sections are loaded from them and the text is
+    # never read or scanned.
+    extracted_data_from_records = None
+    if os.path.exists(records_path) and os.path.exists(file_path):
+        extracted_data_from_records = read_section_records(records_path, file_path)
+    document_text = None if extracted_data_from_records is not None else read_text_from_file(file_path)
+
+    if extracted_data_from_records is not None or document_text:
         # Using the original function first to demonstrate its behavior:
         print("--- Using Original Logic (Title is the first line after number) ---")
         # To use the original extract_sections_from_text, ensure it's defined
@@ -120,7 +174,11 @@ if __name__ == "__main__":
         #         print("-" * 40)
 
         print("\n\n--- Using New Logic (Content starts on header line, minimal/no title) ---")
-        extracted_data_new_logic = extract_sections_from_text_content_starts_on_header_line(document_text)
+        if extracted_data_from_records is not None:
+            print(f"Loaded sections from '{records_path}'.")
+            extracted_data_new_logic = extracted_data_from_records
+        else:
+            extracted_data_new_logic = extract_sections_from_text_content_starts_on_header_line(document_text)
 
         if extracted_data_new_logic:
             for section_info in extracted_data_new_logic: # Show first few for brevity
@@ -138,14 +196,18 @@ if __name__ == "__main__":
 
             # Saving to CSV (using the new logic's output)
             if USE_PYDANTIC:
-                data_for_df = [s.model_dump() for s in extracted_data_new_logic if isinstance(s, SectionData)]
+                rows_for_csv = [s.model_dump() for s in extracted_data_new_logic if isinstance(s, SectionData)]
             else:
-                data_for_df = extracted_data_new_logic
+                rows_for_csv = extracted_data_new_logic
             
-            if data_for_df:
+            if rows_for_csv:
                 try:
-                    df = pd.DataFrame(data_for_df)
-                    df.to_csv("extracted_sections_content_on_header.csv", index=False, encoding='utf-8')
+                    # Rows are streamed straight out with the csv module; '\n' line endings
+                    # match the files pandas' to_csv used to write
+                    with open("extracted_sections_content_on_header.csv", 'w', encoding='utf-8', newline='', buffering=65536) as csv_file:
+                        writer = csv.DictWriter(csv_file, fieldnames=CSV_COLUMNS, lineterminator='\n')
+                        writer.writeheader()
+                        writer.writerows(rows_for_csv)
                     print(f"\nData from new logic saved to extracted_sections_content_on_header.csv")
                 except Exception as e:
                     print(f"\nCould not save new logic data to CSV: {e}.")
@@ -1,106 +1,107 @@
-import re
+import sys
+from itertools import chain
 import fitz  # PyMuPDF
-from typing import Optional, List
+from typing import Iterable, Iterator, List
+from extract_common import (MAX_EXTRACT_WORKERS, atomic_output, expand_pdf_paths, iter_page_ranges, iter_section_texts,
+                            iter_whole_lines, run_many, sibling_output_paths)
 
-# Function to extract all text from PDF (remains the same)
-def extract_text_from_pdf(pdf_filepath: str) -> Optional[str]:
+OUTPUT_BUFFER_BYTES = 65536
+
+def extract_page_range(pdf_filepath: str, start: int, end: int) -> List[str]:
     """
-    Extracts all text content from a PDF file.
+    Extracts the text of each page in [start, end) from a PDF file.
+    Runs in a worker process, so it opens its own Document (they can't be pickled
+    or shared between threads).
     """
-    try:
-        doc = fitz.open(pdf_filepath)
-        full_text = []
-        for page_num in range(len(doc)):
-            page = doc.load_page(page_num)
-            full_text.append(page.get_text("text"))
-        doc.close()
-        return "\n".join(full_text)
-    except FileNotFoundError:
-        print(f"Error: PDF file not found at {pdf_filepath}")
-        return None
-    except Exception as e:
-        print(f"Error extracting text from PDF: {e}")
-        return None
+    with fitz.open(pdf_filepath) as doc:
+        return [page.get_text("text") for page in doc.pages(start, end)]
+
+def iter_page_text(pdf_filepath: str, max_workers: int = MAX_EXTRACT_WORKERS) -> Iterator[str]:
+    """
+    Yields the text of each page of a PDF file, in order, as soon as its page range
+    is done instead of after the whole document (see iter_page_ranges).
+    Args:
+        pdf_filepath (str): The path to the PDF file.
+        max_workers (int): The most worker processes to use for this file.
+    Yields:
+        str: The text of one page.
+    Raises:
+        Exception: Whatever opening or extracting the PDF raised.
+    """
+    for pages in iter_page_ranges(pdf_filepath, extract_page_range, max_workers):
+        yield from pages
+
+def iter_single_line_sections(pages: Iterable[str]) -> Iterator[str]:
+    """
+    Reformats page text so that each section (header + content) becomes a single
+    line, with its newlines replaced by spaces. Pages are joined by a newline and
+    sections may run across them (see extract_common.iter_section_texts).
+    Args:
+        pages (Iterable[str]): The text of each page, in order.
+    Yields:
+        str: Each non-empty section as a single line. With no section headers at
+             all, the whole text is one (possibly empty) line.
+    """
+    found_header = False
+    single_line_section = ""
+    for section_number, section_text in iter_section_texts(iter_whole_lines([page_text] for page_text in pages)):
+        found_header = found_header or section_number is not None
+        single_line_section = section_text.replace("\n", " ").strip()
+        if single_line_section:
+            yield single_line_section
+    # With no headers the text before the first one is the whole text, kept even when empty
+    if not found_header and not single_line_section:
+        yield single_line_section
 
 # This is the function that reformats the text as you want for extracted_Text.txt
 def reformat_raw_text_to_single_line_sections(raw_text: str) -> str:
-    
     if not raw_text:
         return ""
-
-    # This regex identifies the start of each section line (header).
-    # It should match the numerical patterns you're interested in,
-    # e.g., "1.2.3." or "A1.1.1."
-    section_header_pattern = re.compile(
-        r"^(?:A\d{1,2}(?:\.\d{1,2}){1,3}\.?|\d{1,2}(?:\.\d{1,2}){1,3}\.?)\s*.*$",
-        re.MULTILINE
-    )
-    
-    reformatted_output_lines = []
-    matches = list(section_header_pattern.finditer(raw_text))
-    
-    if not matches:
-        # If no specific section markers are found, treat the whole text as one block
-        # and convert all its newlines to spaces.
-        return raw_text.replace('\n', ' ').strip()
-
-    last_block_end = 0
-    # Handle any text that might appear before the first recognized section header
-    if matches[0].start() > 0:
-        pre_section_text = raw_text[0:matches[0].start()]
-        cleaned_pre_section_text = pre_section_text.replace('\n', ' ').strip()
-        if cleaned_pre_section_text: # Add only if it's not just whitespace
-             reformatted_output_lines.append(cleaned_pre_section_text)
-    
-    for i, match in enumerate(matches):
-        current_block_start = match.start() # Start of the current section's header line
-        
-        current_block_end = len(raw_text)
-        if i + 1 < len(matches):
-            current_block_end = matches[i+1].start() # End is start of next section's header line
-            
-        # This block includes the header and all content lines of the current section
-        section_text_block = raw_text[current_block_start:current_block_end]
-        
-        # Replace all newlines within this block with a single space, then strip
-        single_line_section = section_text_block.replace('\n', ' ').strip()
-        
-        if single_line_section: # Avoid adding empty lines
-            reformatted_output_lines.append(single_line_section)
-            
-    return "\n".join(reformatted_output_lines) # Each reformatted section on a new line in the output string
+    return "\n".join(iter_single_line_sections([raw_text])) # Each reformatted section on a new line
 
 
-def save_text_to_file(text_content: str, output_filepath: str) -> None:
+def save_sections(sections: Iterable[str], output_filepath: str) -> int:
     """
-    Saves the given text content to a specified file.
+    Writes sections to a file as they arrive, one per line.
+    The file is written through atomic_output, so an error (from the sections or
+    the writing) leaves no partial file; the error is raised.
+    Returns:
+        int: The number of sections written.
     """
-    try:
-        with open(output_filepath, 'w', encoding='utf-8') as file:
-            file.write(text_content)
-        print(f"Successfully saved text to: {output_filepath}")
-    except Exception as e:
-        print(f"Error saving text to file: {e}")
+    section_total = 0
+    with atomic_output(output_filepath, encoding='utf-8', buffering=OUTPUT_BUFFER_BYTES) as file:
+        for section_total, single_line_section in enumerate(sections, 1):
+            if section_total > 1:
+                file.write("\n")
+            file.write(single_line_section)
+    print(f"Successfully saved text to: {output_filepath}")
+    return section_total
 
 # --- Main execution block ---
-if __name__ == "__main__":
-    pdf_path = "Copy of dafi36-2110-1.pdf"  # <--- YOUR PDF FILE
-    output_txt_path = "extracted_Text.txt" # Output file with single-line sections
-
+def run_one(pdf_path: str, output_txt_path: str, max_workers: int = MAX_EXTRACT_WORKERS) -> bool:
+    """
+    Extracts one PDF to a file of single-line sections. Returns True on success.
+    max_workers is the most worker processes to use for this file's pages.
+    """
     print(f"Attempting to extract raw text from: {pdf_path}")
-    raw_extracted_pdf_text = extract_text_from_pdf(pdf_path)
+    print("\nReformatting text so each section (header + content) is a single line...")
+    # Pages are reformatted and written as they are read, so neither the raw nor
+    # the reformatted text is joined in memory. The first section is kept as a sample.
+    try:
+        sections = iter_single_line_sections(iter_page_text(pdf_path, max_workers))
+        first_section = next(sections, "")
+        section_total = save_sections(chain([first_section], sections), output_txt_path) if first_section else 0
+    except Exception as e:
+        # Nothing was written, whether reading the PDF or writing the text failed
+        print(f"Error extracting {pdf_path} to {output_txt_path}: {e}")
+        section_total = 0
 
-    if raw_extracted_pdf_text:
-        print(f"Successfully extracted raw text from PDF.")
+    if section_total:
+        print(f"Successfully extracted {section_total} single-line sections from {pdf_path}.")
 
-        print("\nReformatting text so each section (header + content) is a single line...")
-        reformatted_text = reformat_raw_text_to_single_line_sections(raw_extracted_pdf_text)
-        
-        save_text_to_file(reformatted_text, output_txt_path)
-        
         # If you want to see a sample of what's saved to extracted_Text.txt:
         # print("\nSample of reformatted text (first few hundred characters):")
-        print(reformatted_text[:500] + "...")
+        print(first_section[:500] + "...")
 
         # NOTE: If you then use the other script ('extract_sections_from_text' which
         # identifies number, title, and multi-line content) on THIS 'extracted_Text.txt'
@@ -108,5 +109,22 @@ if __name__ == "__main__":
         # That parser would likely see the section number correctly, but the entire
         # rest of the long line might become the 'section_title', with 'content' being empty.
         # This reformatted file is specifically for the "single line per section" output you requested.
+        return True
+    print(f"Failed to extract text from {pdf_path}.")
+    return False
+
+# Run with no arguments to extract pdf_path below, or pass PDF paths or glob patterns
+# (e.g. python 2EXTRACT_Text.py "pdfs/*.pdf"). Several PDFs are extracted in parallel,
+# one per process, each to "<pdf name>_extracted_Text.txt" next to it.
+if __name__ == "__main__":
+    pdf_path = "Copy of dafi36-2110-1.pdf"  # <--- YOUR PDF FILE
+    output_txt_path = "extracted_Text.txt" # Output file with single-line sections
+
+    pdf_paths = expand_pdf_paths(sys.argv[1:], pdf_path)
+
+    if len(pdf_paths) == 1:
+        run_one(pdf_paths[0], output_txt_path)
+    elif pdf_paths:
+        run_many(run_one, pdf_paths, sibling_output_paths(pdf_paths, output_txt_path))
     else:
-        print(f"Failed to extract text from {pdf_path}.")
\ No newline at end of file
+        print(f"No PDF files matched: {' '.join(sys.argv[1:])}")
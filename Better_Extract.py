@@ -1,25 +1,30 @@
+import csv
 import re
-import pandas as pd
 import time
-from docx import Document
-from docx.document import Document as _Document
-from docx.oxml.table import CT_Tbl
+import zipfile
+from docx.oxml.ns import qn
+from docx.oxml.parser import element_class_lookup
 from docx.oxml.text.paragraph import CT_P
-from docx.table import _Cell, Table
+from docx.table import Table
 from docx.text.paragraph import Paragraph
+from lxml import etree
 import sys
 import traceback
 import os
+from regex_engine import regex_engine # regex > RE2 > re, whichever is installed
 
 # --- Configuration ---
 DOC_PATH = "Copy of dafi36-2110.docx"
 OUTPUT_FILENAME = "will_references_formatted_output_v2.csv" # Updated filename
 TARGET_WORD = "will"
 PROGRESS_UPDATE_INTERVAL_SECONDS = 15
+PROGRESS_CHECK_EVERY_ELEMENTS = 64 # The clock is only read this often
 SAVE_PARTIAL_RESULTS_ON_ERROR = True
 # Set the specific element number or a unique text snippet to trigger debug prints
 DEBUG_ELEMENT_NUMBER = 401 # Adjust if needed based on previous runs
 DEBUG_TEXT_SNIPPET = "Assignment of family members" # Adjust if needed
+# Set both to None/"" to switch the debug checks off entirely
+DEBUG_ENABLED = bool(DEBUG_ELEMENT_NUMBER or DEBUG_TEXT_SNIPPET)
 
 # --- Constants for Section Flagging ---
 NO_SECTION_FLAG_INTERNAL = None
@@ -27,55 +32,152 @@ NO_SECTION_FLAG_OUTPUT = "no section numbering"
 # --- End Configuration ---
 
 
-# Define the regex patterns
-target_word_pattern = re.compile(r"\b" + re.escape(TARGET_WORD) + r"\b", re.IGNORECASE)
+# Define the regex patterns. The case flag is inline, which every engine accepts;
+# the section pattern stays on `re`, where its anchored match is fastest.
+target_word_pattern = regex_engine.compile(r"(?i)\b" + re.escape(TARGET_WORD) + r"\b")
 
 section_pattern = re.compile(r"^\s*(?:[A-Z]\.|\d+(\.\d+)*\.)\s*")
+# Bound methods for the per-paragraph loop, so each call skips the attribute lookup
+_SECTION_MATCH = section_pattern.match
+_TARGET_FINDALL = target_word_pattern.findall
+
+# ASCII text is case-insensitively the same as its lower(), so a C-level substring
+# test rules out most paragraphs before the regex runs, and the rest are matched
+# case-sensitively on that lowered text, which every engine does faster than
+# IGNORECASE. Other text may hold letters IGNORECASE treats as ASCII ones (e.g.
+# U+0130 for 'i') and always goes to the IGNORECASE pattern.
+_TARGET_WORD_LOWER = TARGET_WORD.lower() if TARGET_WORD.isascii() else None
+if _TARGET_WORD_LOWER is not None:
+    _LOWER_TARGET_FINDALL = regex_engine.compile(r"\b" + re.escape(_TARGET_WORD_LOWER) + r"\b").findall
+
+def count_target_words(text):
+    """Returns how many times the target word appears in text as a whole word."""
+    if _TARGET_WORD_LOWER is not None and text.isascii():
+        text_lower = text.lower()
+        if _TARGET_WORD_LOWER not in text_lower:
+            return 0
+        return len(_LOWER_TARGET_FINDALL(text_lower))
+    return len(_TARGET_FINDALL(text))
+
+def table_may_contain_target(table):
+    """
+    Returns False when no paragraph in the table can contain the target word, so
+    its rows and cells need not be walked at all.
+    """
+    if _TARGET_WORD_LOWER is None:
+        return True
+    table_text = "".join(t.text or "" for t in _TABLE_TEXT_XPATH(table._tbl))
+    return not table_text.isascii() or _TARGET_WORD_LOWER in table_text.lower()
+
 def find_section_details(text):
     """
     Checks if text starts with a section pattern. Returns number and title.
     The returned 'number' should be the clearly defined section identifier.
     """
-    match = section_pattern.match(text)
+    match = _SECTION_MATCH(text)
     if match:
         number = match.group().strip() # Captures the full matched prefix (e.g., "1.2.3." or "A.")
         title = text[match.end():].strip()
         return number, title
     return None, None # Return None if the pattern doesn't match
 
-def iter_block_items(parent):
+# Paragraph.text runs a fresh xpath() query per paragraph and another per run,
+# which lxml recompiles every time. One precompiled XPath picks out the same run
+# content elements (in document order, hyperlinked runs included), and their
+# python-docx element classes turn each into its text, e.g. w:tab into "\t".
+_RUN_TEXT_ELEMENTS = ("w:br", "w:cr", "w:noBreakHyphen", "w:ptab", "w:t", "w:tab")
+_PARAGRAPH_TEXT_XPATH = etree.XPath(
+    " | ".join(f"{run}/{element}" for run in ("w:r", "w:hyperlink/w:r") for element in _RUN_TEXT_ELEMENTS),
+    namespaces={"w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main"},
+)
+
+# The w:t elements paragraph_text() reads, across every paragraph of a table. Their
+# text joined together holds every word any cell paragraph's text holds (the tabs
+# and breaks left out can only split words, never form them).
+_TABLE_TEXT_XPATH = etree.XPath(
+    ".//w:p/w:r/w:t | .//w:p/w:hyperlink/w:r/w:t",
+    namespaces={"w": "http://schemas.openxmlformats.org/wordprocessingml/2006/main"},
+)
+
+def paragraph_text(p_element):
     """
-    Yields each paragraph and table child within *parent*, in document order.
-    Handles basic error checking for unexpected element types during iteration.
+    Returns the same string as Paragraph(p_element, ...).text, from one XPath query
+    over the paragraph's XML.
     """
-    if isinstance(parent, _Document):
-        parent_elm = parent.element.body
-    elif isinstance(parent, _Cell):
-        parent_elm = parent._tc
-    else:
-        # print(f"Warning: Unsupported parent type for iteration: {type(parent)}")
-        return # Gracefully handle unsupported types
+    return "".join(str(element) for element in _PARAGRAPH_TEXT_XPATH(p_element))
 
-    if parent_elm is None: # Added check for None parent element
-         # print(f"Warning: Parent element is None for parent type {type(parent)}")
-         return
+_W_VAL = qn("w:val")
+_W_P, _W_TR, _W_TC = qn("w:p"), qn("w:tr"), qn("w:tc")
+_TR_GRID_BEFORE = f"{qn('w:trPr')}/{qn('w:gridBefore')}"
+_TC_GRID_SPAN = f"{qn('w:tcPr')}/{qn('w:gridSpan')}"
+_TC_V_MERGE = f"{qn('w:tcPr')}/{qn('w:vMerge')}"
 
-    for child in parent_elm.iterchildren():
-        try:
-            if isinstance(child, CT_P):
-                yield Paragraph(child, parent)
-            elif isinstance(child, CT_Tbl):
-                yield Table(child, parent)
-            # Add other block-level element types here if needed (e.g., CT_SdtBlock)
-        except Exception as e:
-            # This might catch issues during Paragraph/Table object instantiation
-            print(f"\n--- Error instantiating Paragraph/Table object from child element ---")
-            print(f"Child Element Tag: {child.tag}")
-            print(f"Parent Type: {type(parent)}")
-            print(f"Error: {e}")
-            # traceback.print_exc() # Uncomment for full traceback here
-            print(f"Attempting to skip this problematic element...")
-            continue # Skip this child and try the next
+def _int_val(parent, path, default):
+    """Returns the w:val of the element at path under parent as an int, or default."""
+    element = parent.find(path)
+    return default if element is None else int(element.get(_W_VAL))
+
+def iter_table_cell_paragraphs(table):
+    """
+    Yields the w:p elements directly inside each cell of the table, in the order
+    iterating row.cells and then each cell's paragraphs gives: a cell spanning
+    several grid columns comes once per column, and the continuation of a vertical
+    merge repeats the merge's first cell. Each row's cells are resolved from the
+    row above's in one pass instead of by row.cells' XPath queries per cell.
+    Raises ValueError where row.cells would, for a continuation with no cell above.
+    """
+    cells_above = None # Grid offset -> the cell whose content is shown there
+    for tr in table._tbl.iterchildren(_W_TR):
+        cells_here = {}
+        grid_offset = _int_val(tr, _TR_GRID_BEFORE, 0)
+        for tc in tr.iterchildren(_W_TC):
+            v_merge = tc.find(_TC_V_MERGE)
+            cell_tc = tc
+            if v_merge is not None and v_merge.get(_W_VAL, "continue") == "continue":
+                if cells_above is None or grid_offset not in cells_above:
+                    raise ValueError("no tc above a vertically merged cell")
+                cell_tc = cells_above[grid_offset]
+            cells_here[grid_offset] = cell_tc
+            grid_offset += _int_val(tc, _TC_GRID_SPAN, 1)
+            cell_paragraphs = list(cell_tc.iterchildren(_W_P))
+            for _ in range(_int_val(cell_tc, _TC_GRID_SPAN, 1)):
+                yield from cell_paragraphs
+        cells_above = cells_here
+
+def find_main_document_part(doc_path):
+    """
+    Returns the zip member holding a .docx file's body (normally word/document.xml),
+    as named by the package relationships. Raises like Document() does if the file
+    is missing or isn't a .docx.
+    """
+    with zipfile.ZipFile(doc_path) as docx_zip:
+        package_rels = etree.fromstring(docx_zip.read("_rels/.rels"))
+    for rel in package_rels:
+        if rel.get("Type", "").endswith("/officeDocument"):
+            return rel.get("Target").lstrip("/")
+    return "word/document.xml"
+
+def iter_document_blocks(doc_path, document_part):
+    """
+    Yields each top-level paragraph and table of a .docx file in document order,
+    the same blocks as iterating Document(doc_path)'s body, while the XML is still
+    being parsed. Each block is cleared (and earlier ones dropped) once the caller
+    moves on, so only the current block is held instead of the whole document tree.
+    Elements get python-docx's classes, so Paragraph/Table behave as usual.
+    """
+    body_tag = qn("w:body")
+    with zipfile.ZipFile(doc_path) as docx_zip, docx_zip.open(document_part) as xml_file:
+        events = etree.iterparse(xml_file, events=("end",), tag=(qn("w:p"), qn("w:tbl")))
+        events.set_element_class_lookup(element_class_lookup)
+        for _, element in events:
+            # Paragraphs inside tables, text boxes and content controls end here too
+            body = element.getparent()
+            if body is None or body.tag != body_tag:
+                continue
+            yield Paragraph(element, None) if isinstance(element, CT_P) else Table(element, None)
+            element.clear()
+            while element.getprevious() is not None:
+                del body[0]
 
 # --- Main Processing ---
 start_time = time.time()
@@ -84,14 +186,31 @@ print(f"Loading document: {DOC_PATH}")
 sys.stdout.flush()
 
 try:
-    doc = Document(DOC_PATH)
+    # The body is read as a stream in the main loop rather than loaded up front
+    document_part = find_main_document_part(DOC_PATH)
     print(f"Document '{DOC_PATH}' loaded successfully.")
 except Exception as e:
     print(f"FATAL ERROR: Could not load document: {e}")
     traceback.print_exc()
     exit()
 
-results = []
+# Matches are written to the CSV as they are found, so they are never all held in
+# memory and a crash keeps the rows already written. They go to an in-progress file
+# that is renamed once the error count (and so the final file name) is known.
+RESULT_COLUMNS = ["Paragraph", "Matches", "Section Number", "Section Title", "Text"]
+base, ext = os.path.splitext(OUTPUT_FILENAME)
+in_progress_filename = f"{base}_IN_PROGRESS{ext}"
+try:
+    # newline='' lets the csv module write its own line endings (os.linesep, as
+    # pandas' to_csv did); the file's own buffering batches the writes
+    results_file = open(in_progress_filename, 'w', newline='', encoding='utf-8-sig')
+except OSError as e:
+    print(f"FATAL ERROR: Could not create output file '{in_progress_filename}': {e}")
+    exit()
+results_writer = csv.writer(results_file, lineterminator=os.linesep)
+results_writer.writerow(RESULT_COLUMNS)
+write_result_row = results_writer.writerow # Bound once for the per-match calls
+result_count = 0
 # Initialize current_section_number with the internal flag (None)
 current_section_number = NO_SECTION_FLAG_INTERNAL
 current_section_title = "" # Title starts empty
@@ -99,42 +218,51 @@ element_counter = 0
 error_count = 0
 last_print_time = start_time
 
+def write_result(element_order, match_count, text):
+    """
+    Writes one match to the CSV under the current section. The internal flag (None)
+    is written as the output flag, with a blank title.
+    """
+    if current_section_number is NO_SECTION_FLAG_INTERNAL:
+        write_result_row((element_order, match_count, NO_SECTION_FLAG_OUTPUT, "", text))
+    else:
+        write_result_row((element_order, match_count, current_section_number, current_section_title, text))
+
 print("Iterating through document body elements...")
 sys.stdout.flush()
 
 try: # Wrap the main iteration loop
-    for block in iter_block_items(doc):
+    for block in iter_document_blocks(DOC_PATH, document_part):
         element_counter += 1
 
         # --- Check if this element should trigger Debugging ---
         # Set flag to True if conditions are met, simplifies following checks
         is_debug_target = False
-        temp_para_text_for_debug_check = "" # Avoid getting text multiple times if not needed
+        # The paragraph's text is read from its XML once per paragraph
+        para_text = ""
         if isinstance(block, Paragraph):
-            temp_para_text_for_debug_check = block.text.strip()
-            if element_counter == DEBUG_ELEMENT_NUMBER or (DEBUG_TEXT_SNIPPET and DEBUG_TEXT_SNIPPET in temp_para_text_for_debug_check):
+            para_text = paragraph_text(block._p).strip()
+            if DEBUG_ENABLED and (element_counter == DEBUG_ELEMENT_NUMBER or (DEBUG_TEXT_SNIPPET and DEBUG_TEXT_SNIPPET in para_text)):
                  is_debug_target = True
         # --- End Debug Trigger Check ---
 
-        # Print progress periodically
-        current_time = time.time()
-        if current_time - last_print_time > PROGRESS_UPDATE_INTERVAL_SECONDS:
-            elapsed_time = current_time - start_time
-            rate = element_counter / elapsed_time if elapsed_time > 0 else 0
-            # Display current section number; handle None case for printing
-            section_display = current_section_number if current_section_number is not None else "[No Section Yet]"
-            print(f"  ... Processing element {element_counter}... "
-                  f"Current section: '{section_display}'. "
-                  f"Elapsed: {elapsed_time:.1f}s ({rate:.1f} elem/s). "
-                  f"Found: {len(results)}. Errors: {error_count}")
-            sys.stdout.flush()
-            last_print_time = current_time
+        # Print progress periodically; the clock is only read every few elements
+        if element_counter % PROGRESS_CHECK_EVERY_ELEMENTS == 0:
+            current_time = time.time()
+            if current_time - last_print_time > PROGRESS_UPDATE_INTERVAL_SECONDS:
+                elapsed_time = current_time - start_time
+                rate = element_counter / elapsed_time if elapsed_time > 0 else 0
+                # Display current section number; handle None case for printing
+                section_display = current_section_number if current_section_number is not None else "[No Section Yet]"
+                print(f"  ... Processing element {element_counter}... "
+                      f"Current section: '{section_display}'. "
+                      f"Elapsed: {elapsed_time:.1f}s ({rate:.1f} elem/s). "
+                      f"Found: {result_count}. Errors: {error_count}")
+                sys.stdout.flush()
+                last_print_time = current_time
 
         try: # Add try-except around processing EACH block
             if isinstance(block, Paragraph):
-                # Use the text we might have already retrieved for the debug check
-                para_text = temp_para_text_for_debug_check if is_debug_target else block.text.strip()
-
                 if not para_text:
                     continue # Skip empty paragraphs
 
@@ -159,8 +287,8 @@ try: # Wrap the main iteration loop
 
 
                 # Check for the target word ("will") in this paragraph's text
-                matches = target_word_pattern.findall(para_text)
-                if matches:
+                match_count = count_target_words(para_text)
+                if match_count:
                     # --- >>> DEBUG PRINT 3 <<< ---
                     if is_debug_target:
                         print(f"DEBUG '{TARGET_WORD}' FOUND in this para.")
@@ -168,16 +296,8 @@ try: # Wrap the main iteration loop
                         print(f"DEBUG Recording Section Title: '{current_section_title}'")
 
                     # Append result, using the current section number (which might be None or updated)
-                    result_data = {
-                        "Element Order": element_counter,
-                        "Matches": len(matches),
-                        "Section Number": current_section_number, # Store the actual number OR the None flag
-                        "Section Title": current_section_title if current_section_number is not None else "", # Only store title if section exists
-                        "Text": para_text,
-                        "Element Type": "Paragraph", # Internal use
-                        "Location Detail": f"Top-Level Paragraph" # Internal use
-                    }
-                    results.append(result_data)
+                    write_result(element_counter, match_count, para_text)
+                    result_count += 1
 
                     if is_debug_target:
                        print(f"DEBUG Result Appended.")
@@ -186,48 +306,44 @@ try: # Wrap the main iteration loop
 
             elif isinstance(block, Table):
                 # Process table cells, associating with the current section number
-                # (No debug prints added inside table processing for now)
-                for i, row in enumerate(block.rows):
-                    for j, cell in enumerate(row.cells):
-                        cell_para_counter = 0
-                        for cell_block in iter_block_items(cell):
-                             if isinstance(cell_block, Paragraph):
-                                cell_para_counter += 1
-                                cell_para_text = cell_block.text.strip()
-                                if not cell_para_text:
-                                    continue
-
-                                matches = target_word_pattern.findall(cell_para_text)
-                                if matches:
-                                    # Append result, using the current section number (which might be None)
-                                    result_data = {
-                                        "Element Order": element_counter,
-                                        "Matches": len(matches),
-                                        "Section Number": current_section_number, # Store the actual number OR the None flag
-                                        "Section Title": current_section_title if current_section_number is not None else "", # Only store title if section exists
-                                        "Text": cell_para_text,
-                                        "Element Type": "Table Cell", # Internal use
-                                        "Location Detail": f"Table (Parent Elem {element_counter}), Row {i+1}, Col {j+1}, Cell Para {cell_para_counter}" # Internal use
-                                    }
-                                    results.append(result_data)
+                # (No debug prints added inside table processing for now).
+                # Tables without the word are skipped without walking their cells.
+                if not table_may_contain_target(block):
+                    continue
+                for cell_p in iter_table_cell_paragraphs(block):
+                    cell_para_text = paragraph_text(cell_p).strip()
+                    if not cell_para_text:
+                        continue
+
+                    match_count = count_target_words(cell_para_text)
+                    if match_count:
+                        # Append result, using the current section number (which might be None)
+                        write_result(element_counter, match_count, cell_para_text)
+                        result_count += 1
 
         except Exception as block_processing_error:
             # ... (error handling for block processing remains the same) ...
             error_count += 1
-            print(f"\n!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
-            print(f"ERROR #{error_count} processing element {element_counter}!")
-            print(f"Element Type encountered: {type(block)}")
+            # The report is built up and printed (and flushed) as one write
+            error_lines = [
+                f"\n!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!",
+                f"ERROR #{error_count} processing element {element_counter}!",
+                f"Element Type encountered: {type(block)}",
+            ]
             try:
-                context_text = block.text[:200].strip() if hasattr(block, 'text') else "[Could not get text]"
-                print(f"Context Text (up to 200 chars): '{context_text}'...")
+                if para_text:
+                    context_text = para_text[:200].strip()
+                else:
+                    context_text = block.text[:200].strip() if hasattr(block, 'text') else "[Could not get text]"
+                error_lines.append(f"Context Text (up to 200 chars): '{context_text}'...")
             except Exception as text_err:
-                print(f"[Could not retrieve text from problematic element: {text_err}]")
+                error_lines.append(f"[Could not retrieve text from problematic element: {text_err}]")
             section_display_err = current_section_number if current_section_number is not None else "[No Section Yet]"
-            print(f"Current Section when error occurred: {section_display_err} - {current_section_title}")
-            print(f"Error Details: {block_processing_error}")
-            print(f"Attempting to continue processing next element...")
-            print(f"!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!\n")
-            sys.stdout.flush()
+            error_lines.append(f"Current Section when error occurred: {section_display_err} - {current_section_title}")
+            error_lines.append(f"Error Details: {block_processing_error}")
+            error_lines.append(f"Attempting to continue processing next element...")
+            error_lines.append(f"!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!\n")
+            print("\n".join(error_lines), flush=True)
             continue
 
 except Exception as main_loop_error:
@@ -242,24 +358,24 @@ except Exception as main_loop_error:
     sys.stdout.flush()
 
 # --- Final Saving Step ---
+results_file.close()
 print("\nProcessing finished or stopped due to error.")
 print(f"Total elements processed (or attempted): {element_counter}")
-print(f"Total '{TARGET_WORD}' instances found: {len(results)}")
+print(f"Total '{TARGET_WORD}' instances found: {result_count}")
 print(f"Total errors encountered while processing elements: {error_count}")
 
 final_save_attempted = False
 output_filename_to_use = OUTPUT_FILENAME # Default filename
+proceed_with_save = False
 
-if results:
+if result_count:
     # Decide whether to save based on errors and config
-    proceed_with_save = False
     if error_count == 0:
         print("Saving results to CSV...")
         proceed_with_save = True
         output_filename_to_use = OUTPUT_FILENAME
     elif SAVE_PARTIAL_RESULTS_ON_ERROR:
         print(f"⚠️ Saving partial results as {error_count} errors were encountered during processing.")
-        base, ext = os.path.splitext(OUTPUT_FILENAME)
         output_filename_to_use = f"{base}_PARTIAL_WITH_{error_count}_ERRORS{ext}"
         proceed_with_save = True
     else:
@@ -267,33 +383,9 @@ if results:
 
     if proceed_with_save:
         try:
-            df = pd.DataFrame(results)
-
-            # --- Apply Section Number Flagging for Output ---
-            # Replace the internal flag (None) with the desired output string
-            df['Section Number'] = df['Section Number'].fillna(NO_SECTION_FLAG_OUTPUT)
-            # Also ensure Section Title is blank if Section Number was flagged
-            df.loc[df['Section Number'] == NO_SECTION_FLAG_OUTPUT, 'Section Title'] = ""
-            # --- End Section Number Flagging ---
-
-
-            # --- Define and Select Columns for the desired format ---
-            df.rename(columns={"Element Order": "Paragraph"}, inplace=True)
-            desired_columns_order = [
-                "Paragraph",
-                "Matches",
-                "Section Number", # Now contains the flag string where appropriate
-                "Section Title",
-                "Text"
-            ]
-            for col in desired_columns_order:
-                if col not in df.columns:
-                    df[col] = "" # Add missing column
-            df_final = df[desired_columns_order]
-            # ---------------------------------------------------------
-
-            df_final.to_csv(output_filename_to_use, index=False, encoding='utf-8-sig')
-            print(f"✅ Done! Saved {len(df_final)} instances to '{output_filename_to_use}'")
+            # The rows are already written; the file just gets its final name
+            os.replace(in_progress_filename, output_filename_to_use)
+            print(f"✅ Done! Saved {result_count} instances to '{output_filename_to_use}'")
             final_save_attempted = True
         except Exception as e:
             print(f"ERROR saving final CSV file ('{output_filename_to_use}'): {e}")
@@ -303,6 +395,13 @@ elif error_count > 0:
      print(f"ℹ️ No '{TARGET_WORD}' instances found, and {error_count} errors occurred during processing. No CSV file created.")
 else:
     print(f"ℹ️ No instances of '{TARGET_WORD}' found in the document. No CSV file created.")
+
+if not proceed_with_save:
+    # Nothing is saved, so the rows written while processing are dropped
+    try:
+        os.remove(in_progress_filename)
+    except OSError:
+        pass
 # --- End Final Saving ---
 
 end_time = time.time()
@@ -1,49 +1,47 @@
+import csv
+import os
 import re
-import pandas as pd
+import sys
 from docx import Document
 
+# regex_engine.py lives in the repository root, one level up
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from regex_engine import regex_engine # regex > RE2 > re, whichever is installed
+
 # Load the document
 doc = Document("Copy of dafi36-2110.docx")
 
-# Regex to find the word 'will'
-will_pattern = re.compile(r"\bwill\b", re.IGNORECASE)
+# Regex to find the word 'will' (the case flag is inline, which every engine accepts)
+will_pattern = regex_engine.compile(r"(?i)\bwill\b")
 
-# Regex to detect section numbers like 1.2, 2.1.3, etc.
+# Regex to detect section numbers like 1.2, 2.1.3, etc. It stays on `re`, where
+# its anchored match is fastest.
 section_number_pattern = re.compile(r"^\d+(\.\d+)*")
 
-results = []
-
-# Iterate through paragraphs
-for i, para in enumerate(doc.paragraphs):
-    text = para.text.strip()
-    if not text:
-        continue
-
-    matches = will_pattern.findall(text)
-    if matches:
-        section_number = ""
-        section_title = ""
-
-        # Look back for nearest heading with a number
-        for j in range(i, -1, -1):
-            heading_candidate = doc.paragraphs[j].text.strip()
-            if section_number_pattern.match(heading_candidate):
-                section_number = section_number_pattern.match(heading_candidate).group()
-                section_title = heading_candidate
-                break
-
-        results.append({
-
-
-            "Paragraph Number": i + 1,
-            "Matches": len(matches),
-            "Section Number": section_number,
-            "Section Title": section_title,
-            "Text": text
-        })
-
-# Save to CSV
-df = pd.DataFrame(results)
-df.to_csv("3Will_references_with_section_numbers.csv", index=False)
+# Matches are written to the CSV as they are found instead of being collected first.
+# newline='' lets the csv module write its own line endings (os.linesep, as pandas'
+# to_csv did)
+with open("3Will_references_with_section_numbers.csv", "w", newline="", encoding="utf-8") as output_file:
+    writer = csv.writer(output_file, lineterminator=os.linesep)
+    writer.writerow(["Paragraph Number", "Matches", "Section Number", "Section Title", "Text"])
+
+    # The nearest numbered heading so far, kept up to date in one forward pass
+    section_number = ""
+    section_title = ""
+
+    # Iterate through paragraphs
+    for i, para in enumerate(doc.paragraphs):
+        text = para.text.strip()
+        if not text:
+            continue
+
+        section_match = section_number_pattern.match(text)
+        if section_match:
+            section_number = section_match.group()
+            section_title = text
+
+        matches = will_pattern.findall(text)
+        if matches:
+            writer.writerow((i + 1, len(matches), section_number, section_title, text))
 
 print("✅ Done! Saved to 'will_references_with_section_numbers.csv'")
@@ -0,0 +1,142 @@
+# Tests for the offline helpers in 1.5rolesGemini.py (no request reaches Gemini).
+# Run from the repository root with: python -m unittest discover -s Tests
+import importlib.util
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "1.5rolesGemini.py")
+
+try:
+    # 1.5rolesGemini.py imports these at module level
+    import dotenv  # noqa: F401
+    import google.generativeai  # noqa: F401
+    from google.api_core import exceptions  # noqa: F401
+except ImportError:
+    dotenv = None
+
+
+def load_script():
+    """Imports 1.5rolesGemini.py, whose name isn't a valid module name."""
+    # The key is only read at import; nothing in these tests calls the API
+    os.environ.setdefault("GEMINI_API_KEY", "test-key")
+    spec = importlib.util.spec_from_file_location("roles_gemini", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def batch_result(key, text):
+    return json.dumps({"key": key, "response": {"candidates": [{"content": {"parts": [{"text": text}]}}]}})
+
+
+@unittest.skipIf(dotenv is None, "the Gemini SDK or python-dotenv is not installed")
+class BatchResultsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.script = load_script()
+
+    def test_bad_line_is_skipped(self):
+        results_jsonl = "\n".join([
+            batch_result("0", "Commander"),
+            '{"key": "1", "response": {"candidates": [',  # Cut off
+            batch_result("2", "Wing Staff"),
+        ])
+        roles = self.script.parse_batch_results(results_jsonl, 0.2)
+        # The unreadable line's key is missing, so it is asked again synchronously
+        self.assertEqual(roles, {"0": "Commander", "2": "Wing Staff"})
+
+    def test_result_without_a_response_is_skipped(self):
+        results_jsonl = "\n".join([
+            '{"key": "0", "error": {"code": 500}}',
+            '{"key": "1", "response": null}',
+            "[]",
+            batch_result("2", "1"),
+        ])
+        roles = self.script.parse_batch_results(results_jsonl, 0.2, role_names=["Commander", "Wing Staff"])
+        self.assertEqual(roles, {"2": "Wing Staff"})
+
+
+@unittest.skipIf(dotenv is None, "the Gemini SDK or python-dotenv is not installed")
+class FinishedRolesTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.script = load_script()
+
+    def test_roles_are_keyed_by_id_and_text(self):
+        chunks = [
+            {"id": "chunk_001", "role": "Commander", "text": "The commander approves."},
+            {"id": "chunk_002", "role": "Role not found", "text": "Retried."},
+            {"id": "chunk_003", "role": "", "text": "Not answered yet."},
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, "out.txt")
+            with open(output_path, "w", encoding="utf-8") as file:
+                file.write("\n".join(json.dumps(chunk) for chunk in chunks) + "\n")
+            finished_roles = self.script.load_finished_roles(output_path)
+
+        key = self.script.finished_role_key
+        self.assertEqual(finished_roles, {key("chunk_001", "The commander approves."): "Commander"})
+        # Same id, but the input was re-chunked: the old role must not be reused
+        self.assertNotIn(key("chunk_001", "The wing staff approves."), finished_roles)
+
+
+
+@unittest.skipIf(dotenv is None, "the Gemini SDK or python-dotenv is not installed")
+class DedupKeyTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.script = load_script()
+
+    def test_same_text_in_another_section_is_not_a_duplicate(self):
+        key = self.script.chunk_dedup_key
+        text = "Ensure minutes are prepared and distributed."
+        under_cfm = key(text, [{"id": "chunk_001", "text": "The CFM will:"}], [])
+        under_tpm = key(text, [{"id": "chunk_009", "text": "The AETC/TPM will:"}], [])
+        self.assertNotEqual(under_cfm, under_tpm)
+        # Ids and whitespace don't matter
+        self.assertEqual(under_cfm, key(" Ensure minutes are  prepared and distributed.",
+                                        [{"id": "chunk_020", "text": "The CFM\nwill:"}], []))
+
+
+@unittest.skipIf(dotenv is None, "the Gemini SDK or python-dotenv is not installed")
+class LocalRoleMatchTest(unittest.TestCase):
+    ROLES = [{"name": "Career Field Manager", "abbreviation": "CFM"},
+             {"name": "AETC Training Pipeline Manager", "abbreviation": "AETC/TPM"}]
+
+    @classmethod
+    def setUpClass(cls):
+        cls.script = load_script()
+
+    def match(self, text):
+        # Both the Aho-Corasick and the regex matcher (when pyahocorasick is installed)
+        results = set()
+        for use_ahocorasick in {self.script.USE_AHOCORASICK, False}:
+            with mock.patch.object(self.script, "USE_AHOCORASICK", use_ahocorasick):
+                results.add(self.script.match_role_locally(self.script.build_role_matcher(self.ROLES), text))
+        self.assertEqual(len(results), 1)
+        return results.pop()
+
+    def test_role_as_subject_is_matched(self):
+        self.assertEqual(self.match("The CFM will chair the STRT."), "Career Field Manager")
+        self.assertEqual(self.match("AETC/TPM publishes the minutes."), "AETC Training Pipeline Manager")
+
+    def test_role_as_object_is_left_for_gemini(self):
+        self.assertIsNone(self.match("In partnership with the AETC/TPM, identify issues; establish the agenda."))
+        self.assertIsNone(self.match("Coordinate the minutes with the CFM."))
+
+    def test_several_roles_are_left_for_gemini(self):
+        self.assertIsNone(self.match("The CFM and AETC/TPM sign and publish the minutes."))
+
+    def test_office_symbol_is_not_a_role(self):
+        # "AETC" alone is no role term, and "CFM" inside "CFM/TPM" is no whole term
+        self.assertIsNone(self.match("The CFM/TPM office signs the minutes."))
+
+    def test_off_by_default(self):
+        self.assertFalse(self.script.LOCAL_ROLE_MATCHING)
+
+
+if __name__ == "__main__":
+    unittest.main()
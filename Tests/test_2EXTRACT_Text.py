@@ -0,0 +1,79 @@
+# Tests for the page-by-page section splitter in 2EXTRACT_Text.py.
+# Run from the repository root with: python -m unittest discover -s Tests
+import importlib.util
+import os
+import unittest
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "2EXTRACT_Text.py")
+
+try:
+    import fitz  # noqa: F401 -- 2EXTRACT_Text.py imports PyMuPDF at module level
+    import extract_common
+except ImportError:
+    fitz = None
+
+
+def load_script():
+    """Imports 2EXTRACT_Text.py, whose name isn't a valid module name."""
+    spec = importlib.util.spec_from_file_location("extract_text_2", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@unittest.skipIf(fitz is None, "PyMuPDF is not installed")
+class SingleLineSectionsTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.script = load_script()
+
+    def split(self, pages):
+        return list(self.script.iter_single_line_sections(pages))
+
+    def test_many_headerless_pages_are_scanned_once(self):
+        pages = ["lorem ipsum dolor sit amet\n" * 40 + "cut line"] * 2000
+        scanned = []
+        iter_header_matches = extract_common.iter_header_matches
+
+        def counting_iter_header_matches(text, pos=0):
+            scanned.append(len(text) - pos)
+            return iter_header_matches(text, pos)
+
+        # The splitter itself is shared with 1Extract_To_PDF1.py in extract_common.py
+        extract_common.iter_header_matches = counting_iter_header_matches
+        try:
+            sections = self.split(pages)
+        finally:
+            extract_common.iter_header_matches = iter_header_matches
+
+        self.assertEqual(sections, ["\n".join(pages).replace("\n", " ").strip()])
+        # Each page is scanned once, not again with every later page
+        self.assertTrue(scanned)
+        self.assertLessEqual(sum(scanned), len("\n".join(pages)) + len(pages))
+
+    def test_sections_run_across_pages(self):
+        pages = ["Intro text\n1.1. First", "still first\n1.2. Second\nbody", "more body\n2.1.\n"]
+        self.assertEqual(self.split(pages), [
+            "Intro text",
+            "1.1. First still first",
+            "1.2. Second body more body",
+            "2.1.",
+        ])
+
+    def test_header_line_continues_onto_next_page(self):
+        # A header with nothing after its number takes the next non-blank line as
+        # its title, even when that line is on the next page
+        pages = ["1.1.\n", "\n1.2. not a header here\nbody"]
+        self.assertEqual(self.split(pages), ["1.1.   1.2. not a header here body"])
+
+    def test_matches_reformatting_the_joined_text(self):
+        pages = ["A1.1 Scope\nline", "1.2.3 Roles\n\n", "4.5\n", "text\n1.1"]
+        self.assertEqual("\n".join(self.split(pages)),
+                         self.script.reformat_raw_text_to_single_line_sections("\n".join(pages)))
+
+    def test_no_headers_gives_one_line(self):
+        self.assertEqual(self.split(["", ""]), [""])
+
+
+if __name__ == "__main__":
+    unittest.main()
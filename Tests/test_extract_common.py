@@ -0,0 +1,85 @@
+# Tests for the helpers shared by the PDF extraction scripts (extract_common.py).
+# Run from the repository root with: python -m unittest discover -s Tests
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    import fitz
+    import extract_common
+except ImportError:
+    fitz = None
+
+
+def page_texts(pdf_filepath, start, end):
+    """Module-level, so worker processes can unpickle it."""
+    with fitz.open(pdf_filepath) as doc:
+        return (start, end, [page.get_text("text").strip() for page in doc.pages(start, end)])
+
+
+@unittest.skipIf(fitz is None, "PyMuPDF is not installed")
+class PageRangesTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = tempfile.TemporaryDirectory()
+        cls.pdf_path = os.path.join(cls.tmp_dir.name, "pages.pdf")
+        with fitz.open() as doc:
+            for page_number in range(21):
+                doc.new_page().insert_text((72, 72), f"page {page_number}")
+            doc.save(cls.pdf_path)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp_dir.cleanup()
+
+    def ranges(self, max_workers, pages_per_task):
+        # The worker count is capped by the CPUs, so pretend there are enough of them
+        with mock.patch("os.cpu_count", return_value=4):
+            return list(extract_common.iter_page_ranges(self.pdf_path, page_texts, max_workers, pages_per_task))
+
+    def test_ranges_cover_the_pages_in_order(self):
+        expected_pages = [f"page {page_number}" for page_number in range(21)]
+        for max_workers in (1, 3):
+            with self.subTest(max_workers=max_workers):
+                ranges = self.ranges(max_workers, pages_per_task=8)
+                self.assertEqual([(start, end) for start, end, _ in ranges], [(0, 8), (8, 16), (16, 21)])
+                self.assertEqual([page for _, _, pages in ranges for page in pages], expected_pages)
+
+    def test_one_range_per_worker(self):
+        ranges = self.ranges(3, pages_per_task=None)
+        self.assertEqual([(start, end) for start, end, _ in ranges], [(0, 7), (7, 14), (14, 21)])
+
+
+@unittest.skipIf(fitz is None, "PyMuPDF is not installed")
+class AtomicOutputTest(unittest.TestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.tmp_dir = tmp_dir.name
+        self.output_path = os.path.join(self.tmp_dir, "out.txt")
+        with open(self.output_path, "w", encoding="utf-8") as file:
+            file.write("previous")
+
+    def read_output(self):
+        with open(self.output_path, encoding="utf-8") as file:
+            return file.read()
+
+    def test_replaces_the_output_when_the_block_finishes(self):
+        with extract_common.atomic_output(self.output_path, encoding="utf-8") as file:
+            file.write("new")
+            self.assertEqual(self.read_output(), "previous")
+        self.assertEqual(self.read_output(), "new")
+        self.assertEqual(os.listdir(self.tmp_dir), ["out.txt"])
+
+    def test_error_keeps_the_previous_output(self):
+        with self.assertRaises(RuntimeError):
+            with extract_common.atomic_output(self.output_path, encoding="utf-8") as file:
+                file.write("partial")
+                raise RuntimeError("extraction failed")
+        self.assertEqual(self.read_output(), "previous")
+        self.assertEqual(os.listdir(self.tmp_dir), ["out.txt"])
+
+
+if __name__ == "__main__":
+    unittest.main()
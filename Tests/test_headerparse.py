@@ -0,0 +1,54 @@
+# Checks the optional _headerparse extension against the pure-Python scanner it
+# replaces in 1.3section_parser.py. Skipped unless it has been built with
+#     python setup.py build_ext --inplace
+# Run from the repository root with: python -m unittest discover -s Tests
+import os
+import unittest
+
+from pipeline import scan_header_spans
+
+try:
+    from _headerparse import parse_headers
+except ImportError:
+    parse_headers = None
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+# The sample document and the pipeline's own intermediate files, where present
+SAMPLE_TEXT_PATHS = [
+    os.path.join(TESTS_DIR, "Copy of dafi36-2110.txt"),
+    os.path.join(REPO_DIR, "raw_extracted_text.txt"),
+    os.path.join(REPO_DIR, "reformatted_single_line_sections.txt"),
+]
+
+
+@unittest.skipIf(parse_headers is None, "the _headerparse extension is not built")
+class HeaderParseTest(unittest.TestCase):
+    def assert_same_spans(self, buf):
+        self.assertEqual(parse_headers(buf), scan_header_spans(buf)["section"])
+
+    def test_sample_texts(self):
+        for path in SAMPLE_TEXT_PATHS:
+            if not os.path.isfile(path):
+                continue
+            with self.subTest(path=os.path.basename(path)):
+                with open(path, "rb") as file:
+                    self.assert_same_spans(file.read())
+
+    def test_edge_cases(self):
+        for buf in [
+            b"",
+            b"1.",
+            b"1.2 Title",
+            b"A1.1.1. Appendix\ncontent\n2. Next\n",
+            b"1.\n\n\nTitle after blank lines\n1.2.\v\fTitle after \\v and \\f",
+            b"intro 1.2 not at a line start\n 3.4 indented\n12.34.56.78.90. deep\n",
+            "4.5 Café — title\n6.7. nbsp\n".encode("utf-8"),
+            b"1.2\r\n3.4\r\n",
+        ]:
+            with self.subTest(buf=buf):
+                self.assert_same_spans(buf)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+# Checks the optional numba path in 1.3section_parser.py against the per-number
+# Python code it replaces. Skipped unless numba is installed.
+# Run from the repository root with: python -m unittest discover -s Tests
+import importlib.util
+import os
+import unittest
+
+from pipeline import iter_header_spans, scan_header_spans
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(TESTS_DIR)
+SCRIPT_PATH = os.path.join(REPO_DIR, "1.3section_parser.py")
+# The sample document and the pipeline's own intermediate files, where present
+SAMPLE_TEXT_PATHS = [
+    os.path.join(TESTS_DIR, "Copy of dafi36-2110.txt"),
+    os.path.join(REPO_DIR, "raw_extracted_text.txt"),
+    os.path.join(REPO_DIR, "reformatted_single_line_sections.txt"),
+]
+
+
+def load_script():
+    """Imports 1.3section_parser.py, whose name isn't a valid module name."""
+    spec = importlib.util.spec_from_file_location("section_parser", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+section_parser = load_script()
+
+
+@unittest.skipIf(not section_parser.USE_NUMBA, "numba is not installed")
+class HierarchyBatchTest(unittest.TestCase):
+    def assert_same_hierarchy(self, section_numbers):
+        self.assertEqual(section_parser.get_hierarchy_info_batch(section_numbers),
+                         [section_parser.get_hierarchy_info(number) for number in section_numbers])
+
+    def test_sample_texts(self):
+        for path in SAMPLE_TEXT_PATHS:
+            if not os.path.isfile(path):
+                continue
+            with self.subTest(path=os.path.basename(path)):
+                with open(path, "rb") as file:
+                    buf = file.read()
+                # The section numbers as iter_sections_with_hierarchy() captures them
+                self.assert_same_hierarchy([
+                    buf[number_start:number_end].decode("utf-8").strip().rstrip(".")
+                    for _, _, number_start, number_end, _, _ in iter_header_spans(buf, "section", scan_header_spans(buf))
+                ])
+
+    def test_edge_cases(self):
+        for section_numbers in [
+            ["1"],
+            ["1", "1.2", "A1.1.1", "12.34.56.78.90", "2"],
+            ["A1.1.1", "1"],
+        ]:
+            with self.subTest(section_numbers=section_numbers):
+                self.assert_same_hierarchy(section_numbers)
+
+
+if __name__ == "__main__":
+    unittest.main()
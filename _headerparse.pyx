@@ -0,0 +1,77 @@
+# cython: language_level=3
+# distutils: language = c++
+# _headerparse.pyx
+# Optional C++ section-header tokenizer for 1.3section_parser.py, built on RE2.
+# Build with:  python setup.py build_ext --inplace
+from libcpp.string cimport string
+
+cdef extern from "re2/re2.h" namespace "re2":
+    cppclass StringPiece:
+        StringPiece()
+        StringPiece(const char* data, size_t size)
+        const char* data()
+        size_t size()
+
+    cdef enum Anchor "re2::RE2::Anchor":
+        UNANCHORED "re2::RE2::UNANCHORED"
+
+    cdef enum Encoding "re2::RE2::Options::Encoding":
+        EncodingLatin1 "re2::RE2::Options::EncodingLatin1"
+
+    cppclass Options "re2::RE2::Options":
+        Options()
+        void set_encoding(Encoding encoding)
+
+    cppclass RE2:
+        RE2(const StringPiece& pattern, const Options& options)
+        bint ok()
+        const string& error()
+        bint Match(const StringPiece& text, size_t startpos, size_t endpos,
+                   Anchor re_anchor, StringPiece* submatch, int nsubmatch)
+
+# Same header form as pipeline._SECTION. \s is spelled out because RE2's \s
+# leaves out \v, which Python's bytes \s includes; Latin-1 mode makes '.' match
+# any single byte except \n, like a Python bytes pattern.
+SECTION_PATTERN = rb"(?m)^(A?\d{1,2}\.(?:\d{1,2}\.?)*)[ \t\n\r\f\v]*(.*?)$"
+
+cdef bytes _pattern = SECTION_PATTERN
+cdef Options _options
+_options.set_encoding(EncodingLatin1)
+cdef RE2* _section = new RE2(StringPiece(<const char*>_pattern, len(_pattern)), _options)
+if not _section.ok():
+    raise ValueError(f"Invalid section header pattern: {_section.error().decode('utf-8')}")
+
+
+def parse_headers(const unsigned char[::1] buf):
+    """
+    Finds every section header in the buffer without copying it.
+
+    Args:
+        buf (bytes or mmap.mmap): The document text as UTF-8 bytes.
+
+    Returns:
+        list: (start, end, number_start, number_end, title_start, title_end) tuples,
+            the same as the 'section' spans from pipeline.scan_header_spans().
+    """
+    cdef size_t n = buf.shape[0]
+    cdef list spans = []
+    if n == 0:
+        return spans
+
+    cdef const char* data = <const char*>&buf[0]
+    cdef StringPiece text = StringPiece(data, n)
+    cdef StringPiece groups[3]
+    cdef size_t pos = 0
+    cdef size_t start, end
+
+    while pos < n and _section.Match(text, pos, n, UNANCHORED, groups, 3):
+        start = groups[0].data() - data
+        end = start + groups[0].size()
+        number_start = groups[1].data() - data
+        title_start = groups[2].data() - data
+        spans.append((start, end,
+                      number_start, number_start + groups[1].size(),
+                      title_start, title_start + groups[2].size()))
+        pos = end if end > start else end + 1
+
+    return spans
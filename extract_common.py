@@ -0,0 +1,197 @@
+# extract_common.py
+# Shared helpers for the PDF extraction scripts (1.1raw_extract.py, 1Extract_To_PDF.py,
+# 1Extract_To_PDF1.py and 2EXTRACT_Text.py).
+import glob
+import math
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import IO, Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar
+import fitz  # PyMuPDF
+
+MAX_EXTRACT_WORKERS = 4
+# Pages per worker task. Small ranges let the first pages be handed on while later
+# ones are still being extracted. All ranges are submitted up front, so finished
+# ones wait in memory whenever the consumer falls behind.
+PAGES_PER_TASK = 8
+
+# A section header line (e.g. "1.2.3." or "A1.1.1." and its title), as the single-line
+# section scripts split on it.
+_SECTION_HEADER = r"(?P<header>(?P<number>A\d{1,2}(?:\.\d{1,2}){1,3}\.?|\d{1,2}(?:\.\d{1,2}){1,3}\.?)\s*.*)"
+SECTION_HEADER_PATTERN = re.compile(r"^" + _SECTION_HEADER + r"$", re.MULTILINE)
+# Same, led by a literal newline: finditer can jump between newlines with its
+# literal-prefix search instead of testing '^' at every position. The greedy '.*'
+# already stops at the line end, so no '$' is needed.
+LINE_SECTION_HEADER_PATTERN = re.compile(r"\n" + _SECTION_HEADER)
+# What a header with nothing after its number still runs on to in the next run of
+# lines: any blank lines and then the first non-blank line, like the '\s*.*' above.
+HEADER_CONTINUATION_PATTERN = re.compile(r"\s*.*")
+
+PageRange = TypeVar("PageRange")
+
+
+def iter_page_ranges(pdf_filepath: str, extract_fn: Callable[[str, int, int], PageRange],
+                     max_workers: int = MAX_EXTRACT_WORKERS,
+                     pages_per_task: Optional[int] = PAGES_PER_TASK) -> Iterator[PageRange]:
+    """
+    Yields extract_fn(pdf_filepath, start, end) for consecutive page ranges covering
+    a PDF file, in page order, each as soon as it and the ranges before it are done.
+    The ranges are extracted in parallel processes, since MuPDF's parsing is CPU-bound
+    and holds the GIL; extract_fn runs in a worker, so it must be a module-level
+    function that opens its own Document (they can't be pickled).
+    Args:
+        pdf_filepath (str): The path to the PDF file.
+        extract_fn (callable): Extracts pages [start, end) of the file.
+        max_workers (int): The most worker processes to use for this file.
+        pages_per_task (int, optional): Pages per range; None splits the pages into
+            one contiguous range per worker.
+    Yields:
+        Whatever extract_fn returns for each range.
+    Raises:
+        Exception: Whatever opening or extracting the PDF raised.
+    """
+    with fitz.open(pdf_filepath) as doc:
+        page_count = len(doc)
+    num_workers = min(os.cpu_count() or 1, max_workers)
+    if pages_per_task is None:
+        pages_per_task = max(1, math.ceil(page_count / num_workers))
+    starts = range(0, page_count, pages_per_task)
+    ends = [min(start + pages_per_task, page_count) for start in starts]
+    if num_workers <= 1 or len(starts) <= 1:
+        for start, end in zip(starts, ends):
+            yield extract_fn(pdf_filepath, start, end)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(num_workers, len(starts))) as executor:
+        # map() returns results in submission order, so pages stay in order
+        yield from executor.map(extract_fn, [pdf_filepath] * len(ends), starts, ends)
+
+
+@contextmanager
+def atomic_output(output_filepath: str, mode: str = 'w', **open_kwargs) -> Iterator[IO]:
+    """
+    Opens a temporary file next to output_filepath for the with block and renames it
+    over output_filepath when the block finishes, so readers never see a partial
+    file. If the block (or the writing) raises, the temporary file is removed, the
+    previous output is left as it was, and the error is raised.
+    Args:
+        output_filepath (str): The file to write.
+        mode (str): 'w' or 'wb'.
+        **open_kwargs: Passed on to open() (encoding, buffering, ...).
+    Yields:
+        file: The open temporary file.
+    """
+    tmp_filepath = f"{output_filepath}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_filepath, mode, **open_kwargs) as file:
+            yield file
+        os.replace(tmp_filepath, output_filepath)
+    finally:
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+
+
+def expand_pdf_paths(patterns: List[str], default_path: str) -> List[str]:
+    """
+    Returns the files matched by the command-line paths or glob patterns, sorted and
+    without duplicates, or [default_path] when no patterns were given.
+    """
+    if not patterns:
+        return [default_path]
+    return sorted({path for pattern in patterns for path in glob.glob(pattern)})
+
+
+def sibling_output_paths(pdf_paths: List[str], output_name: str) -> List[str]:
+    """Returns "<pdf name>_<output_name>" next to each PDF."""
+    return [f"{os.path.splitext(path)[0]}_{output_name}" for path in pdf_paths]
+
+
+def run_many(run_one: Callable[..., bool], pdf_paths: List[str], *output_path_lists: List[str]) -> int:
+    """
+    Runs run_one(pdf_path, *output_paths, 1) for several PDFs in parallel and prints
+    how many succeeded. Each file gets one process of its own, so its pages are
+    extracted in that process (max_workers=1) instead of fanning out again.
+    Args:
+        run_one (callable): The script's module-level run_one function.
+        pdf_paths (list): The PDF files to extract.
+        *output_path_lists (list): One list of output paths per output argument of
+            run_one, each in the same order as pdf_paths.
+    Returns:
+        int: The number of PDFs extracted.
+    """
+    with ProcessPoolExecutor(max_workers=min(len(pdf_paths), os.cpu_count() or 1)) as executor:
+        extracted = sum(executor.map(run_one, pdf_paths, *output_path_lists, [1] * len(pdf_paths)))
+    print(f"\nExtracted {extracted} of {len(pdf_paths)} PDFs.")
+    return extracted
+
+
+def iter_header_matches(text: str, pos: int = 0) -> Iterator[re.Match]:
+    """
+    Yields the section header matches in text[pos:], the same headers as
+    SECTION_HEADER_PATTERN.finditer(text, pos) gives; each header line is the
+    match's "header" group.
+    """
+    # A header at pos itself has no newline in front of it inside the search
+    match = SECTION_HEADER_PATTERN.match(text, pos)
+    if match:
+        yield match
+        pos = match.end()
+    yield from LINE_SECTION_HEADER_PATTERN.finditer(text, pos)
+
+
+def iter_whole_lines(pages: Iterable[Iterable[str]]) -> Iterator[str]:
+    """
+    Yields the text of the pages as runs of whole lines, so every run starts at a
+    line start. Each page is a sequence of text pieces (e.g. its text blocks) that
+    are joined as they are; pages are joined by a newline. A line cut between
+    pieces is carried over.
+    """
+    carry = ""
+    for page_index, pieces in enumerate(pages):
+        if page_index:
+            carry += "\n"
+        for piece in pieces:
+            text = carry + piece
+            cut = text.rfind("\n") + 1
+            carry = text[cut:]
+            if cut:
+                yield text[:cut]
+    yield carry
+
+
+def iter_section_texts(lines: Iterable[str]) -> Iterator[Tuple[Optional[str], str]]:
+    """
+    Splits text into sections at the section header lines. Each run of lines is
+    scanned once; only the section being built is held between runs.
+    Args:
+        lines (Iterable[str]): The text as runs of whole lines (see iter_whole_lines).
+    Yields:
+        tuple: First (None, the text before the first header), which may be empty,
+               then (section number as matched, e.g. "2.1.3.", section text) for each
+               section, from its header line up to the next header line.
+    """
+    section_parts = [] # Raw text of the section being built (or of the text before the first one)
+    section_number = None
+    # Set when a header's \s* ran to the end of a run, so the next run's first
+    # non-blank line still belongs to that header line and can't start a section.
+    header_continues = False
+    for text in lines:
+        search_start = 0
+        if header_continues:
+            search_start = HEADER_CONTINUATION_PATTERN.match(text).end()
+            header_continues = not text[:search_start].strip()
+
+        section_start = 0
+        for match in iter_header_matches(text, search_start):
+            section_parts.append(text[section_start:match.start("header")])
+            yield section_number, "".join(section_parts)
+            section_parts = []
+            section_number = match.group("number")
+            section_start = match.start("header")
+            if match.end() == len(text):
+                header_continues = not text[match.end("number"):].strip()
+        section_parts.append(text[section_start:])
+
+    # The last section runs to the end of the text
+    yield section_number, "".join(section_parts)
@@ -0,0 +1,142 @@
+# pipeline.py
+# Shared section-header scanner for the text stages (1.2, 1.3 and 1.5).
+import re
+from itertools import chain, pairwise
+from typing import Dict, Iterator, List, Optional, Tuple
+
+try:
+    import numpy as np
+    USE_NUMPY = True
+except ImportError:
+    USE_NUMPY = False
+
+# Each stage's header form as its own named group. Every group sits inside a
+# lookahead tried at a line start, so one sweep reports all three forms for a
+# line even when they would consume different lengths of text. '.' never crosses
+# a newline, so a greedy '.*' already stops at the line end and no '$' (and no
+# re.MULTILINE) is needed.
+_REFORMAT = rb"(?:A\d{1,2}(?:\.\d{1,2}){1,3}\.?|\d{1,2}(?:\.\d{1,2}){1,3}\.?)\s*.*"  # 1.2 section lines
+_SECTION = rb"(?P<number>(?:A?\d{1,2}\.(?:\d{1,2}\.?)*))\s*(?P<title>.*)"  # 1.3 numbered sections
+_CHUNK = rb"\s*(?P<header>\d+(?:\.\d+)*\.)\s+"  # 1.5 chunk headers
+
+_HEADER_LOOKAHEADS = (
+    rb"(?=" + _REFORMAT + rb"|" + _SECTION.replace(b"?P<number>", b"").replace(b"?P<title>", b"")
+    + rb"|" + _CHUNK.replace(b"?P<header>", b"") + rb")"
+    rb"(?=(?P<reformat>" + _REFORMAT + rb")|)"
+    rb"(?=(?P<section>" + _SECTION + rb")|)"
+    rb"(?=(?P<chunk>" + _CHUNK + rb")|)"
+)
+# Matched at a known line start with PATTERN.match(buf, pos)
+PATTERN = re.compile(_HEADER_LOOKAHEADS)
+# Same, led by a literal newline: finditer can jump between newlines with its
+# literal-prefix search instead of testing a MULTILINE '^' at every position.
+# The groups are all inside lookaheads, so their spans are unaffected.
+LINE_PATTERN = re.compile(rb"\n" + _HEADER_LOOKAHEADS)
+
+SpanMap = Dict[str, List[Tuple[int, ...]]]
+
+# Bytes a header line can start with: a digit, 'A', or the whitespace allowed
+# before a 1.5 chunk header. Lines starting with anything else never match.
+_LINE_START_BYTES = b"0123456789A \t\n\r\f\v"
+
+
+def _candidate_line_starts(buf) -> List[int]:
+    """
+    Offsets of the lines that could hold a header, found with vectorized numpy ops
+    over a uint8 view of the buffer: every line start, filtered by its first byte.
+    """
+    arr = np.frombuffer(buf, dtype=np.uint8)
+    line_starts = np.flatnonzero(arr[:-1] == 0x0A) + 1
+    line_starts = np.concatenate((np.zeros(1, dtype=line_starts.dtype), line_starts))
+    allowed = np.zeros(256, dtype=bool)
+    allowed[np.frombuffer(_LINE_START_BYTES, dtype=np.uint8)] = True
+    candidates = line_starts[allowed[arr[line_starts]]].tolist()
+    del arr # Drop the view so an mmap can still be closed by the caller
+    return candidates
+
+
+def _iter_header_matches(buf):
+    # Every line start is tried: the first line directly, the rest after each newline.
+    # With numpy only the candidate lines are handed to the regex engine.
+    if not USE_NUMPY or not len(buf):
+        match = PATTERN.match(buf)
+        if match:
+            yield match
+        yield from LINE_PATTERN.finditer(buf)
+        return
+    for line_start in _candidate_line_starts(buf):
+        match = PATTERN.match(buf, line_start)
+        if match:
+            yield match
+
+
+def scan_header_spans(buf) -> SpanMap:
+    """
+    Scans the buffer once and records the header spans for every stage.
+
+    Args:
+        buf (bytes or mmap.mmap): The document text as UTF-8 bytes.
+
+    Returns:
+        dict: Span lists keyed by stage name:
+            'reformat' -> (start, end)
+            'section'  -> (start, end, number_start, number_end, title_start, title_end)
+            'chunk'    -> (start, end, header_start, header_end)
+        Spans that overlap an earlier span of the same stage are dropped, which is
+        what a standalone finditer/split over that stage's pattern would do.
+    """
+    spans: SpanMap = {"reformat": [], "section": [], "chunk": []}
+    last_end = {"reformat": -1, "section": -1, "chunk": -1}
+
+    for match in _iter_header_matches(buf):
+        for kind in ("reformat", "section", "chunk"):
+            start, end = match.span(kind)
+            if start < 0 or start < last_end[kind]:
+                continue
+            if kind == "section":
+                spans[kind].append((start, end) + match.span("number") + match.span("title"))
+            elif kind == "chunk":
+                spans[kind].append((start, end) + match.span("header"))
+            else:
+                spans[kind].append((start, end))
+            last_end[kind] = end
+
+    return spans
+
+
+def iter_header_spans(buf, kind: str, spans: Optional[SpanMap] = None) -> Iterator[Tuple[int, ...]]:
+    """Yields the precomputed spans of one stage, scanning the buffer if none were given."""
+    if spans is None:
+        spans = scan_header_spans(buf)
+    yield from spans[kind]
+
+
+def iter_header_blocks(buf, kind: str, spans: Optional[SpanMap] = None) -> Iterator[Tuple[Tuple[int, ...], int]]:
+    """
+    Yields (span, block_end) for each header of one stage, where block_end is the
+    start of the next header of that stage (or the end of the buffer). Only the
+    previous span is held, so callers can slice one block at a time.
+    """
+    # A None sentinel pairs the last header with the end of the buffer
+    for span, next_span in pairwise(chain(iter_header_spans(buf, kind, spans), [None])):
+        yield span, next_span[0] if next_span is not None else len(buf)
+
+
+def iter_lines_containing(buf, needle: bytes) -> Iterator[Tuple[int, int, int]]:
+    """
+    Yields (line_number, line_start, line_end) for every line that contains `needle`,
+    numbered from 1 like enumerate(file, 1). Jumps between occurrences with find(),
+    so lines without a match are never split out or decoded.
+    """
+    line_number = 1
+    counted_to = 0
+    pos = buf.find(needle)
+    while pos != -1:
+        line_start = buf.rfind(b"\n", 0, pos) + 1
+        line_end = buf.find(b"\n", pos)
+        if line_end == -1:
+            line_end = len(buf)
+        line_number += buf[counted_to:line_start].count(b"\n") # mmap has no count()
+        counted_to = line_start
+        yield line_number, line_start, line_end
+        pos = buf.find(needle, line_end)
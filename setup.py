@@ -0,0 +1,30 @@
+# setup.py
+# Builds the optional _headerparse extension used by 1.3section_parser.py:
+#     python setup.py build_ext --inplace
+# Needs Cython and the RE2 headers and library (e.g. libre2-dev). The scripts
+# fall back to the pure-Python scanner in pipeline.py when it is not built.
+import sys
+
+from setuptools import Extension, setup
+
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    sys.exit("Building _headerparse needs Cython (pip install cython). It is optional: "
+             "without it the scripts use the pure-Python scanner in pipeline.py.")
+
+setup(
+    name="pyextract-headerparse",
+    ext_modules=cythonize(
+        [
+            Extension(
+                "_headerparse",
+                ["_headerparse.pyx"],
+                language="c++",
+                libraries=["re2"],
+                extra_compile_args=["-std=c++17"],
+            )
+        ],
+        language_level=3,
+    ),
+)